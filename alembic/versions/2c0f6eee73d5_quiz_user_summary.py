@@ -0,0 +1,44 @@
+"""quiz user summary
+
+Revision ID: 2c0f6eee73d5
+Revises: fadd5c988f28
+Create Date: 2026-10-17 12:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '2c0f6eee73d5'
+down_revision = 'fadd5c988f28'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.create_table('quiz_user_summary',
+    sa.Column('user_id', sa.Integer(), nullable=False),
+    sa.Column('quiz_id', sa.Integer(), nullable=False),
+    sa.Column('company_id', sa.Integer(), nullable=False),
+    sa.Column('last_result_id', sa.Integer(), nullable=False),
+    sa.Column('last_questions_total', sa.Integer(), nullable=False),
+    sa.Column('last_correct_answers', sa.Integer(), nullable=False),
+    sa.Column('last_correct_answers_percentage', sa.Float(), nullable=False),
+    sa.Column('summary_questions_total', sa.Integer(), nullable=False),
+    sa.Column('summary_correct_answers', sa.Integer(), nullable=False),
+    sa.Column('summary_correct_answers_percentage', sa.Float(), nullable=False),
+    sa.Column('attempts', sa.Integer(), nullable=False),
+    sa.Column('last_date', sa.Date(), nullable=False),
+    sa.ForeignKeyConstraint(['company_id'], ['companies.id'], ondelete='CASCADE'),
+    sa.ForeignKeyConstraint(['quiz_id'], ['quizzes.id'], ondelete='CASCADE'),
+    sa.ForeignKeyConstraint(['user_id'], ['users.id'], ondelete='CASCADE'),
+    sa.PrimaryKeyConstraint('user_id', 'quiz_id')
+    )
+    op.create_index('ix_quiz_user_summary_user_id_company_id', 'quiz_user_summary', ['user_id', 'company_id'], unique=False)
+    # Existing results are moved in with 'python -m app.commands.backfill_quiz_summary'
+
+
+def downgrade() -> None:
+    op.drop_index('ix_quiz_user_summary_user_id_company_id', table_name='quiz_user_summary')
+    op.drop_table('quiz_user_summary')
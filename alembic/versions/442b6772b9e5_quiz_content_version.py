@@ -0,0 +1,24 @@
+"""quiz content version
+
+Revision ID: 442b6772b9e5
+Revises: 2c0f6eee73d5
+Create Date: 2026-10-17 13:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '442b6772b9e5'
+down_revision = '2c0f6eee73d5'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.add_column('quizzes', sa.Column('content_version', sa.Integer(), server_default='1', nullable=False))
+
+
+def downgrade() -> None:
+    op.drop_column('quizzes', 'content_version')
@@ -0,0 +1,45 @@
+"""quiz content hash
+
+Revision ID: 9d1e3c47a2b8
+Revises: 442b6772b9e5
+Create Date: 2026-10-17 15:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '9d1e3c47a2b8'
+down_revision = '442b6772b9e5'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.add_column('quizzes', sa.Column('content_hash', sa.String(), nullable=True))
+    # Same expression as QuizService.get_content_hash
+    op.execute("""
+        UPDATE quizzes SET content_hash = md5(CAST(json_build_array(
+            quizzes.company_id,
+            quizzes.name,
+            quizzes.description,
+            quizzes.cooldown_in_days,
+            (
+                SELECT coalesce(json_agg(
+                    json_build_array(
+                        quiz_questions.id,
+                        quiz_questions.name,
+                        quiz_questions.answer_variants,
+                        quiz_questions.right_answer
+                    ) ORDER BY quiz_questions.id
+                ), '[]'::json)
+                FROM quiz_questions
+                WHERE quiz_questions.quiz_id = quizzes.id
+            )
+        ) AS TEXT))
+    """)
+
+
+def downgrade() -> None:
+    op.drop_column('quizzes', 'content_hash')
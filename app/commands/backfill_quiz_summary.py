@@ -0,0 +1,68 @@
+"""
+Fills quiz_user_summary from the existing quiz_results history.
+
+Usage:
+    python -m app.commands.backfill_quiz_summary
+
+Safe to run more than once and while the app is serving submissions:
+a summary row is only overwritten by an equal or later result than the one it already holds.
+"""
+import asyncio
+
+from databases import Database
+from sqlalchemy import text
+
+from system_config import system_config
+
+BACKFILL_QUERY = text("""
+    INSERT INTO quiz_user_summary (
+        user_id, quiz_id, company_id,
+        last_result_id, last_questions_total, last_correct_answers, last_correct_answers_percentage,
+        summary_questions_total, summary_correct_answers, summary_correct_answers_percentage,
+        attempts, last_date
+    )
+    SELECT DISTINCT ON (r.user_id, r.quiz_id)
+        r.user_id, r.quiz_id, q.company_id,
+        r.id, r.quiz_questions_total, r.quiz_correct_answers, r.quiz_correct_answers_percentage,
+        r.summary_questions_total, r.summary_correct_answers, r.summary_correct_answers_percentage,
+        count(*) OVER (PARTITION BY r.user_id, r.quiz_id), r.date_of_quiz
+    FROM quiz_results r
+    JOIN quizzes q ON q.id = r.quiz_id
+    WHERE r.user_id IS NOT NULL
+    ORDER BY r.user_id, r.quiz_id, r.id DESC
+    ON CONFLICT (user_id, quiz_id) DO UPDATE SET
+        company_id = EXCLUDED.company_id,
+        last_result_id = EXCLUDED.last_result_id,
+        last_questions_total = EXCLUDED.last_questions_total,
+        last_correct_answers = EXCLUDED.last_correct_answers,
+        last_correct_answers_percentage = EXCLUDED.last_correct_answers_percentage,
+        summary_questions_total = EXCLUDED.summary_questions_total,
+        summary_correct_answers = EXCLUDED.summary_correct_answers,
+        summary_correct_answers_percentage = EXCLUDED.summary_correct_answers_percentage,
+        attempts = EXCLUDED.attempts,
+        last_date = EXCLUDED.last_date
+    WHERE quiz_user_summary.last_result_id <= EXCLUDED.last_result_id
+""")
+
+
+async def backfill_summary(db: Database) -> int:
+    await db.execute(BACKFILL_QUERY)
+    return await db.fetch_val(text('SELECT count(*) FROM quiz_user_summary'))
+
+
+async def backfill() -> int:
+    db = Database(system_config.database_url)
+    await db.connect()
+    try:
+        return await backfill_summary(db=db)
+    finally:
+        await db.disconnect()
+
+
+def main() -> None:
+    rows = asyncio.run(backfill())
+    print(f'quiz_user_summary now holds {rows} rows')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,67 @@
+"""
+Benchmarks bcrypt on this host and picks the cost factor that fits the target latency.
+
+Usage:
+    python -m app.commands.calibrate_bcrypt [--target-ms 250] [--write] [--env-file .env]
+
+With --write the chosen value is stored as BCRYPT_ROUNDS in the env file, which SystemConfig reads on start.
+Existing hashes are moved to the new cost transparently on the next login of each user.
+"""
+import argparse
+import statistics
+import time
+
+from dotenv import set_key
+
+from app.utils.password_hasher import hash_password
+from system_config import system_config
+
+MIN_SAFE_ROUNDS = 10
+MAX_ROUNDS = 20
+
+
+def measure_rounds(rounds: int, samples: int) -> float:
+    timings = []
+    for _ in range(samples):
+        started = time.perf_counter()
+        hash_password('calibration-password', rounds)
+        timings.append((time.perf_counter() - started) * 1000)
+    return statistics.median(timings)
+
+
+def calibrate(target_ms: int, min_rounds: int, samples: int) -> int:
+    chosen_rounds = min_rounds
+    # Warm up: the first hash pays for backend loading
+    hash_password('calibration-password', 4)
+
+    for rounds in range(min_rounds, MAX_ROUNDS + 1):
+        duration_ms = measure_rounds(rounds=rounds, samples=samples)
+        fits = duration_ms <= target_ms
+        print(f'rounds={rounds:<3} median={duration_ms:8.1f} ms {"ok" if fits else "over budget"}')
+
+        if not fits:
+            break
+        chosen_rounds = rounds
+
+    return chosen_rounds
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description='Pick bcrypt rounds that fit the target hashing latency.')
+    parser.add_argument('--target-ms', type=int, default=system_config.bcrypt_target_ms)
+    parser.add_argument('--min-rounds', type=int, default=MIN_SAFE_ROUNDS)
+    parser.add_argument('--samples', type=int, default=3)
+    parser.add_argument('--write', action='store_true', help='Store the result as BCRYPT_ROUNDS in the env file')
+    parser.add_argument('--env-file', default='.env')
+    args = parser.parse_args()
+
+    rounds = calibrate(target_ms=args.target_ms, min_rounds=args.min_rounds, samples=args.samples)
+    print(f'Chosen BCRYPT_ROUNDS={rounds} (currently {system_config.bcrypt_rounds})')
+
+    if args.write:
+        set_key(args.env_file, 'BCRYPT_ROUNDS', str(rounds), quote_mode='never')
+        print(f'Written to {args.env_file}')
+
+
+if __name__ == '__main__':
+    main()
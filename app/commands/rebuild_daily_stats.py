@@ -0,0 +1,62 @@
+"""
+Recomputes the daily stats rollups from the quiz_results history.
+
+Usage:
+    python -m app.commands.rebuild_daily_stats [--days N]
+
+Without --days every day since the first result is rebuilt, WINDOW_DAYS days per transaction and company.
+Safe to run while the app is serving submissions: only the company being rewritten has its submissions held,
+for the duration of one window.
+"""
+import argparse
+import asyncio
+from datetime import date, timedelta
+from typing import Optional
+
+from databases import Database
+from sqlalchemy import select, func
+
+from app.models.models import QuizResults
+from app.services.stats_rollup_service import StatsRollupService
+from system_config import system_config
+
+WINDOW_DAYS = 31
+
+
+async def rebuild(days: Optional[int]) -> tuple[Optional[date], date]:
+    db = Database(system_config.database_url)
+    await db.connect()
+    try:
+        stats_rollup_service = StatsRollupService(db=db)
+        today = date.today()
+        if days:
+            first_day = today - timedelta(days=days - 1)
+        else:
+            first_day = await db.fetch_val(select(func.min(QuizResults.date_of_quiz)))
+            if first_day is None:
+                return None, today
+
+        window_start = first_day
+        while window_start <= today:
+            window_end = min(window_start + timedelta(days=WINDOW_DAYS - 1), today)
+            await stats_rollup_service.reconcile(date_from=window_start, date_to=window_end)
+            window_start = window_end + timedelta(days=1)
+        return first_day, today
+    finally:
+        await db.disconnect()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description='Recompute daily stats rollups from quiz_results.')
+    parser.add_argument('--days', type=int, help='Only rebuild this many most recent days, today included')
+    args = parser.parse_args()
+
+    first_day, last_day = asyncio.run(rebuild(days=args.days))
+    if first_day is None:
+        print('No quiz results to roll up')
+    else:
+        print(f'Daily stats rebuilt from {first_day} to {last_day}')
+
+
+if __name__ == '__main__':
+    main()
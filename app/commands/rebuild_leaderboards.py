@@ -0,0 +1,81 @@
+"""
+Repopulates the Redis leaderboards from quiz_user_summary.
+
+Usage:
+    python -m app.commands.rebuild_leaderboards [--company-id N]
+
+Each company's boards are replaced in one MULTI, so readers never see a half-built board.
+Without --company-id boards of companies that no longer have any results are removed too.
+Safe to run while the app is serving submissions: ratings that submissions put on the boards after the summary
+was read come from later results, and are kept instead of the ratings read (see LeaderboardStore.replace_company).
+A company whose boards keep changing through REPLACE_ATTEMPTS tries is logged and left as is; run it again later.
+"""
+import argparse
+import asyncio
+from itertools import groupby
+from typing import Optional
+
+from databases import Database
+from sqlalchemy import func, select
+
+from app.db.connections import redis_conn
+from app.models.models import QuizResults, QuizUserSummary
+from app.utils.leaderboard import leaderboard_store
+from system_config import system_config
+
+
+async def rebuild_boards(db: Database, company_id: Optional[int]) -> int:
+    # Read first: every result up to this id is in the summary read below
+    read_up_to = await db.fetch_val(select(func.coalesce(func.max(QuizResults.id), 0)))
+
+    query = select(
+        QuizUserSummary.company_id,
+        QuizUserSummary.quiz_id,
+        QuizUserSummary.user_id,
+        QuizUserSummary.summary_correct_answers_percentage,
+        QuizUserSummary.last_result_id
+    ).order_by(QuizUserSummary.company_id)
+    if company_id is not None:
+        query = query.where(QuizUserSummary.company_id == company_id)
+    rows = await db.fetch_all(query)
+
+    read_company_ids = set()
+    rebuilt = 0
+    for row_company_id, company_rows in groupby(rows, key=lambda row: row.__getitem__('company_id')):
+        rebuilt += await leaderboard_store.replace_company(row_company_id, [
+            (
+                row.__getitem__('quiz_id'),
+                row.__getitem__('user_id'),
+                row.__getitem__('summary_correct_answers_percentage'),
+                row.__getitem__('last_result_id')
+            ) for row in company_rows
+        ], read_up_to=read_up_to)
+        read_company_ids.add(row_company_id)
+
+    stale_company_ids = {company_id} if company_id is not None else await leaderboard_store.get_company_ids()
+    for stale_company_id in stale_company_ids - read_company_ids:
+        await leaderboard_store.replace_company(stale_company_id, [], read_up_to=read_up_to)
+    return rebuilt
+
+
+async def rebuild(company_id: Optional[int]) -> int:
+    db = Database(system_config.database_url)
+    await db.connect()
+    try:
+        return await rebuild_boards(db=db, company_id=company_id)
+    finally:
+        await db.disconnect()
+        await redis_conn.close()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description='Repopulate Redis leaderboards from quiz_user_summary.')
+    parser.add_argument('--company-id', type=int, help='Only rebuild the boards of this company')
+    args = parser.parse_args()
+
+    companies = asyncio.run(rebuild(company_id=args.company_id))
+    print(f'Leaderboards rebuilt for {companies} companies')
+
+
+if __name__ == '__main__':
+    main()
@@ -1,24 +1,51 @@
-import redis
+from typing import Union
+
 from databases import Database
+from redis.asyncio import Redis
+
+from app.db.pool import get_pool_options, instrument_pool
+from app.db.redis_pool import InstrumentedRedisPool, get_redis_pool_options
+from app.db.replica import ReplicaRouter
 from system_config import system_config
 
-redis_conn = redis.from_url(system_config.redis_url)
+redis_pool = InstrumentedRedisPool.from_url(system_config.redis_url, **get_redis_pool_options())
+redis_conn = Redis(connection_pool=redis_pool)
 
 if system_config.environment == 'TESTING':
-    postgre_db = Database(system_config.db_url_test, force_rollback=True)
+    postgre_db = Database(system_config.db_url_test, force_rollback=True, **get_pool_options())
+else:
+    postgre_db = Database(system_config.database_url, **get_pool_options())
+
+if system_config.database_replica_url and system_config.environment != 'TESTING':
+    replica_db = Database(system_config.database_replica_url, **get_pool_options())
 else:
-    postgre_db = Database(system_config.database_url)
+    replica_db = None
+
+replica_router = ReplicaRouter(
+    primary=postgre_db,
+    replica=replica_db,
+    max_lag=system_config.db_replica_max_lag,
+    check_interval=system_config.db_replica_check_interval
+)
 
 
 async def get_db() -> Database:
     return postgre_db
 
 
+async def get_read_db() -> Union[ReplicaRouter, Database]:
+    # For read-only statistics; anything that reads its own writes must use get_db
+    return replica_router if replica_db is not None else postgre_db
+
+
 async def connect_db():
     await postgre_db.connect()
+    instrument_pool(postgre_db)
+    await replica_router.connect()
 
 
 async def close_postgre():
+    await replica_router.disconnect()
     await postgre_db.disconnect()
 
 
@@ -27,4 +54,5 @@ async def get_redis():
 
 
 async def close_redis():
-    redis_conn.close()
+    await redis_conn.close()
+    await redis_pool.disconnect()
@@ -0,0 +1,101 @@
+import asyncio
+import time
+from typing import Optional
+
+from asyncpg import Connection
+from asyncpg.pool import Pool
+from databases import Database
+from fastapi import HTTPException
+
+from app.schemas.metrics_schemas import DBPoolStats
+from app.utils.histogram import LatencyHistogram
+from system_config import system_config
+
+ACQUIRE_BUCKETS_MS = (1, 5, 10, 25, 50, 100, 250, 500, 1000, 5000)
+
+
+def get_pool_options() -> dict:
+    """asyncpg.create_pool() keyword arguments, passed through `Database(url, **options)`."""
+    return {
+        'min_size': system_config.db_pool_min_size,
+        'max_size': system_config.db_pool_max_size,
+        'max_queries': system_config.db_pool_max_queries,
+        'max_inactive_connection_lifetime': system_config.db_pool_max_inactive_lifetime,
+        'statement_cache_size': system_config.db_statement_cache_size,
+    }
+
+
+class InstrumentedPool:
+    """
+    Wraps the asyncpg pool of a `databases.Database` to time every acquire.
+
+    Acquires that wait longer than `acquire_timeout` seconds fail with 503
+    instead of hanging until the client gives up. Everything else is passed through to the pool.
+    """
+
+    def __init__(self, pool: Pool, acquire_timeout: float):
+        self._pool = pool
+        self.acquire_timeout = acquire_timeout
+
+        self.waiting = 0
+        self.timeouts = 0
+        self.acquire_latency = LatencyHistogram(ACQUIRE_BUCKETS_MS)
+
+    def __getattr__(self, name):
+        return getattr(self._pool, name)
+
+    async def acquire(self, *, timeout: Optional[float] = None) -> Connection:
+        self.waiting += 1
+        started = time.perf_counter()
+        try:
+            connection = await self._pool.acquire(timeout=timeout or self.acquire_timeout)
+        except asyncio.TimeoutError:
+            self.timeouts += 1
+            raise HTTPException(
+                status_code=503,
+                detail='Database is busy, try again later',
+                headers={'Retry-After': '1'}
+            )
+        finally:
+            self.waiting -= 1
+
+        self.acquire_latency.observe((time.perf_counter() - started) * 1000)
+        return connection
+
+    def stats(self) -> DBPoolStats:
+        size = self._pool.get_size()
+        idle = self._pool.get_idle_size()
+
+        return DBPoolStats(
+            min_size=self._pool.get_min_size(),
+            max_size=self._pool.get_max_size(),
+            size=size,
+            in_use=size - idle,
+            idle=idle,
+            waiting=self.waiting,
+            acquired=self.acquire_latency.count,
+            timeouts=self.timeouts,
+            acquire_timeout=self.acquire_timeout,
+            wait_avg_ms=self.acquire_latency.avg_ms(),
+            wait_max_ms=round(self.acquire_latency.max_ms, 2),
+            acquire_latency_buckets_ms=self.acquire_latency.as_dict()
+        )
+
+
+def instrument_pool(db: Database) -> Optional[InstrumentedPool]:
+    # `databases` keeps the asyncpg pool on its backend and only ever calls acquire/release/close on it
+    pool = getattr(db._backend, '_pool', None)
+    if pool is None:
+        return None
+
+    if not isinstance(pool, InstrumentedPool):
+        pool = InstrumentedPool(pool=pool, acquire_timeout=system_config.db_pool_acquire_timeout)
+        db._backend._pool = pool
+    return pool
+
+
+def get_pool_stats(db: Database) -> Optional[DBPoolStats]:
+    pool = getattr(db._backend, '_pool', None)
+    if not isinstance(pool, InstrumentedPool):
+        return None
+    return pool.stats()
@@ -0,0 +1,69 @@
+import time
+
+from redis.asyncio import BlockingConnectionPool
+from redis.asyncio.connection import Connection
+from redis.exceptions import ConnectionError
+
+from app.schemas.metrics_schemas import RedisPoolStats
+from app.utils.histogram import LatencyHistogram
+from system_config import system_config
+
+ACQUIRE_BUCKETS_MS = (1, 5, 10, 25, 50, 100, 250, 500, 1000, 5000)
+
+
+def get_redis_pool_options() -> dict:
+    """redis.asyncio connection pool keyword arguments, passed through `from_url(url, **options)`."""
+    return {
+        'max_connections': system_config.redis_pool_max_connections,
+        'timeout': system_config.redis_pool_timeout,
+        'socket_timeout': system_config.redis_socket_timeout,
+        'socket_connect_timeout': system_config.redis_socket_connect_timeout,
+        'health_check_interval': system_config.redis_health_check_interval,
+        'retry_on_timeout': False,
+    }
+
+
+class InstrumentedRedisPool(BlockingConnectionPool):
+    """
+    Bounded Redis pool that times every connection checkout.
+
+    When all `max_connections` are busy, a command waits up to `timeout` seconds and then fails
+    with a ConnectionError (a RedisError, so callers that tolerate Redis being down tolerate this too).
+    """
+
+    def __init__(self, **kwargs):
+        super().__init__(**kwargs)
+        self.waiting = 0
+        self.errors = 0
+        self.acquire_latency = LatencyHistogram(ACQUIRE_BUCKETS_MS)
+
+    async def get_connection(self, command_name, *keys, **options) -> Connection:
+        self.waiting += 1
+        started = time.perf_counter()
+        try:
+            return await super().get_connection(command_name, *keys, **options)
+        except ConnectionError:
+            self.errors += 1
+            raise
+        finally:
+            self.waiting -= 1
+            self.acquire_latency.observe((time.perf_counter() - started) * 1000)
+
+    def stats(self) -> RedisPoolStats:
+        size = len(self._connections)
+        # The queue holds idle connections and None placeholders for connections not created yet
+        idle = sum(1 for connection in self.pool._queue if connection is not None)
+
+        return RedisPoolStats(
+            max_size=self.max_connections,
+            size=size,
+            in_use=size - idle,
+            idle=idle,
+            waiting=self.waiting,
+            acquired=self.acquire_latency.count,
+            errors=self.errors,
+            acquire_timeout=self.timeout,
+            wait_avg_ms=self.acquire_latency.avg_ms(),
+            wait_max_ms=round(self.acquire_latency.max_ms, 2),
+            acquire_latency_buckets_ms=self.acquire_latency.as_dict()
+        )
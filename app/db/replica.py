@@ -0,0 +1,143 @@
+import asyncio
+import logging
+from typing import Any, Optional, Union
+
+from asyncpg import PostgresConnectionError, InterfaceError
+from databases import Database
+from fastapi import HTTPException
+from sqlalchemy import text
+from sqlalchemy.sql import ClauseElement
+
+from app.db.pool import instrument_pool, get_pool_stats
+from app.schemas.metrics_schemas import DBReplicaStats
+
+logger = logging.getLogger(__name__)
+
+# Lag is 0 when the replica has replayed everything it received, so an idle primary doesn't look like lag
+REPLICA_LAG_QUERY = text("""
+    SELECT CASE
+        WHEN NOT pg_is_in_recovery() OR pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn() THEN 0
+        ELSE EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp())
+    END
+""")
+
+REPLICA_ERRORS = (OSError, asyncio.TimeoutError, PostgresConnectionError, InterfaceError)
+
+Query = Union[ClauseElement, str]
+
+
+class ReplicaRouter:
+    """
+    Sends read-only queries to a replica and everything else stays with the primary.
+
+    The replica is used only while it is reachable and its replay lag is within `max_lag` seconds.
+    Lag is checked every `check_interval` seconds; a connection error on a read marks the replica down
+    until the next successful check, and the read is retried on the primary.
+    Quacks like `Database` for fetch_one/fetch_all/fetch_val, so read-only services take it as their `db`.
+    """
+
+    def __init__(self, primary: Database, replica: Optional[Database], max_lag: float, check_interval: float):
+        self.primary = primary
+        self.replica = replica
+        self.max_lag = max_lag
+        self.check_interval = check_interval
+
+        self.healthy = False
+        self.lag: Optional[float] = None
+        self.last_error: Optional[str] = None
+        self._background_task: Optional[asyncio.Task] = None
+
+        self.replica_reads = 0
+        self.primary_reads = 0
+        self.failovers = 0
+
+    # Health
+    def mark_down(self, error: Exception) -> None:
+        if self.healthy:
+            self.failovers += 1
+            logger.warning('Replica marked down, reading from primary: %r', error)
+        self.healthy = False
+        self.last_error = repr(error)
+
+    async def check(self) -> None:
+        if self.replica is None:
+            return
+
+        try:
+            if not self.replica.is_connected:
+                await self.replica.connect()
+                instrument_pool(self.replica)
+
+            lag = await asyncio.wait_for(self.replica.fetch_val(REPLICA_LAG_QUERY), timeout=self.check_interval)
+        except Exception as error:
+            self.lag = None
+            self.mark_down(error)
+            return
+
+        self.lag = float(lag or 0)
+        if self.lag > self.max_lag:
+            self.mark_down(RuntimeError(f'replica lag {self.lag:.1f}s is over {self.max_lag}s'))
+            return
+
+        self.healthy = True
+        self.last_error = None
+
+    async def _check_periodically(self) -> None:
+        while True:
+            await asyncio.sleep(self.check_interval)
+            await self.check()
+
+    async def connect(self) -> None:
+        if self.replica is None:
+            return
+
+        await self.check()
+        if self._background_task is None:
+            self._background_task = asyncio.create_task(self._check_periodically())
+
+    async def disconnect(self) -> None:
+        if self._background_task is not None:
+            self._background_task.cancel()
+            self._background_task = None
+
+        if self.replica is not None and self.replica.is_connected:
+            await self.replica.disconnect()
+
+    # Reads
+    async def _read(self, method: str, query: Query, values: Optional[dict]) -> Any:
+        if self.healthy:
+            try:
+                result = await getattr(self.replica, method)(query, values)
+                self.replica_reads += 1
+                return result
+            except REPLICA_ERRORS as error:
+                self.mark_down(error)
+            except HTTPException as error:
+                # Replica pool is exhausted; the primary takes this one read
+                if error.status_code != 503:
+                    raise
+
+        self.primary_reads += 1
+        return await getattr(self.primary, method)(query, values)
+
+    async def fetch_all(self, query: Query, values: Optional[dict] = None) -> list:
+        return await self._read('fetch_all', query, values)
+
+    async def fetch_one(self, query: Query, values: Optional[dict] = None) -> Any:
+        return await self._read('fetch_one', query, values)
+
+    async def fetch_val(self, query: Query, values: Optional[dict] = None) -> Any:
+        return await self._read('fetch_val', query, values)
+
+    def stats(self) -> DBReplicaStats:
+        return DBReplicaStats(
+            configured=self.replica is not None,
+            healthy=self.healthy,
+            lag_seconds=self.lag,
+            max_lag_seconds=self.max_lag,
+            replica_reads=self.replica_reads,
+            primary_reads=self.primary_reads,
+            failovers=self.failovers,
+            last_error=self.last_error,
+            pool=get_pool_stats(self.replica) if self.replica is not None and self.replica.is_connected else None
+        )
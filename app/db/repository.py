@@ -0,0 +1,29 @@
+from typing import Optional, Type, TypeVar
+
+from databases import Database
+from pydantic import BaseModel
+from sqlalchemy.sql import ColumnElement
+
+Schema = TypeVar('Schema', bound=BaseModel)
+
+
+class Repository:
+    """
+    Writes that return the written row in the same round trip (INSERT/UPDATE ... RETURNING).
+
+    The row is mapped straight to the response schema, so no follow-up SELECT is needed to find it.
+    """
+
+    def __init__(self, db: Database, model):
+        self.db = db
+        self.table = model.__table__
+
+    async def insert(self, values: dict, schema: Type[Schema]) -> Schema:
+        query = self.table.insert().values(**values).returning(self.table)
+        row = await self.db.fetch_one(query)
+        return schema(**dict(row))
+
+    async def update(self, where: ColumnElement, values: dict, schema: Type[Schema]) -> Optional[Schema]:
+        query = self.table.update().where(where).values(**values).returning(self.table)
+        row = await self.db.fetch_one(query)
+        return schema(**dict(row)) if row else None
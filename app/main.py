@@ -6,8 +6,13 @@ from fastapi.middleware.cors import CORSMiddleware
 
 from app.db.connections import close_postgre, get_redis, close_redis, connect_db
 from system_config import system_config
-from app.routes import users, auth, companies, company_actions, quiz_routes, quiz_statistics, notifications
+from app.routes import users, auth, companies, company_actions, quiz_routes, quiz_statistics, notifications, \
+    metrics, exports, leaderboards
+from app.services.auth0_service import jwks_key_store
 from app.tasks.tasks import scheduler
+from app.utils.export_jobs import export_runner
+from app.utils.password_hasher import password_hasher
+from app.utils.principal_cache import principal_cache
 
 app = FastAPI()
 app.include_router(users.router)
@@ -17,19 +22,28 @@ app.include_router(company_actions.router)
 app.include_router(quiz_routes.router)
 app.include_router(quiz_statistics.router)
 app.include_router(notifications.router)
+app.include_router(metrics.router)
+app.include_router(exports.router)
+app.include_router(leaderboards.router)
 
 
 @app.on_event("startup")
 async def startup():
     await connect_db()
     await get_redis()
+    await jwks_key_store.start()
+    await principal_cache.start()
     scheduler.start()
 
 
 @app.on_event("shutdown")
 async def shutdown():
+    await jwks_key_store.stop()
+    await principal_cache.stop()
+    await export_runner.shutdown()
     await close_postgre()
     await close_redis()
+    password_hasher.shutdown()
 
 
 @app.get('/')
@@ -47,6 +61,7 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["ETag"],
 )
 
 if __name__ == '__main__':
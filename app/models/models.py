@@ -1,7 +1,8 @@
 from datetime import datetime, date
 from enum import Enum
 
-from sqlalchemy import Column, Integer, String, Boolean, DateTime, ForeignKey, UniqueConstraint, ARRAY, Date, Float
+from sqlalchemy import Column, Integer, String, Boolean, DateTime, ForeignKey, UniqueConstraint, ARRAY, Date, Float, \
+    Index
 from sqlalchemy import Enum as EnumDB
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import relationship, validates
@@ -95,6 +96,10 @@ class Quizzes(Base):
     name = Column(String)
     description = Column(String)
     cooldown_in_days = Column(Integer)
+    # Bumped on every change of the quiz or its questions, see QuizContentCache
+    content_version = Column(Integer, nullable=False, server_default='1')
+    # md5 of the quiz and its questions, served as ETag, see QuizService.get_content_hash
+    content_hash = Column(String)
     quiz_questions = relationship('QuizQuestions', back_populates='quizzes', cascade='all, delete')
 
     @validates('quiz_questions')
@@ -140,6 +145,59 @@ class QuizResults(Base):
     date_of_quiz = Column(Date, default=date.today, nullable=False)
 
 
+class QuizUserSummary(Base):
+    """Latest attempt and cumulative totals of a user in a quiz, maintained on every submission."""
+    __tablename__ = 'quiz_user_summary'
+    __table_args__ = (
+        Index('ix_quiz_user_summary_user_id_company_id', 'user_id', 'company_id'),
+    )
+
+    user_id = Column(Integer, ForeignKey('users.id', ondelete='CASCADE'), primary_key=True)
+    quiz_id = Column(Integer, ForeignKey('quizzes.id', ondelete='CASCADE'), primary_key=True)
+    company_id = Column(Integer, ForeignKey('companies.id', ondelete='CASCADE'), nullable=False)
+
+    last_result_id = Column(Integer, nullable=False)
+    last_questions_total = Column(Integer, nullable=False)
+    last_correct_answers = Column(Integer, nullable=False)
+    last_correct_answers_percentage = Column(Float, nullable=False)
+
+    summary_questions_total = Column(Integer, nullable=False)
+    summary_correct_answers = Column(Integer, nullable=False)
+    summary_correct_answers_percentage = Column(Float, nullable=False)
+
+    attempts = Column(Integer, nullable=False, default=1)
+    last_date = Column(Date, nullable=False)
+
+
+class CompanyQuizDailyStats(Base):
+    """Attempts of a quiz per day, added to on every submission and recomputed nightly from quiz_results."""
+    __tablename__ = 'company_quiz_daily_stats'
+
+    company_id = Column(Integer, ForeignKey('companies.id', ondelete='CASCADE'), primary_key=True)
+    quiz_id = Column(Integer, ForeignKey('quizzes.id', ondelete='CASCADE'), primary_key=True)
+    day = Column(Date, primary_key=True)
+
+    attempts = Column(Integer, nullable=False)
+    questions_total = Column(Integer, nullable=False)
+    correct_answers = Column(Integer, nullable=False)
+    # Sum of quiz_correct_answers_percentage of the attempts: the average is this / attempts
+    percentage_sum = Column(Float, nullable=False)
+
+
+class CompanyUserDailyStats(Base):
+    """Attempts of a user in a company's quizzes per day, maintained like CompanyQuizDailyStats."""
+    __tablename__ = 'company_user_daily_stats'
+
+    company_id = Column(Integer, ForeignKey('companies.id', ondelete='CASCADE'), primary_key=True)
+    user_id = Column(Integer, ForeignKey('users.id', ondelete='CASCADE'), primary_key=True)
+    day = Column(Date, primary_key=True)
+
+    attempts = Column(Integer, nullable=False)
+    questions_total = Column(Integer, nullable=False)
+    correct_answers = Column(Integer, nullable=False)
+    percentage_sum = Column(Float, nullable=False)
+
+
 class Notifications(Base):
     __tablename__ = 'notifications'
 
@@ -4,7 +4,7 @@ from databases import Database
 from fastapi import APIRouter, Depends
 
 from app.db.connections import get_db
-from app.schemas.auth_schemas import Token
+from app.schemas.auth_schemas import Token, RefreshTokenRequest
 from app.schemas.user_schemas import UserResponse, SignInRequest, SignUpRequest
 from app.services.auth_service import AuthService, get_current_user_dependency
 from app.services.user_service import UserService
@@ -30,6 +30,16 @@ async def login_for_access_token(
     return token
 
 
+@router.post('/refresh', response_model=Token)
+async def refresh_access_token(
+        refresh: RefreshTokenRequest,
+        db: Database = Depends(get_db)
+) -> Token:
+    auth_service = AuthService(db=db)
+    token = await auth_service.refresh_tokens(refresh_token=refresh.refresh_token)
+    return token
+
+
 @router.get('/me/', response_model=UserResponse)
 async def get_current_user(
         user: UserResponse = Depends(get_current_user_dependency),
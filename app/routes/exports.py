@@ -0,0 +1,73 @@
+from databases import Database
+from fastapi import APIRouter, Depends
+from starlette.responses import FileResponse
+
+from app.db.connections import get_db
+from app.routes.auth import get_current_user
+from app.schemas.export_schemas import ExportJob, ExportJobFormat
+from app.schemas.user_schemas import UserResponse
+from app.services.auth_service import AuthService
+from app.services.export_service import ExportService
+
+router = APIRouter(
+    prefix='/exports',
+    tags=['exports'],
+    responses={
+        404: {'description': 'Not found'}
+    }
+)
+
+MEDIA_TYPES = {
+    ExportJobFormat.CSV: 'text/csv',
+    ExportJobFormat.JSON: 'application/json',
+    ExportJobFormat.NDJSON: 'application/x-ndjson',
+    ExportJobFormat.PARQUET: 'application/vnd.apache.parquet',
+}
+
+
+@router.post('/company/{company_id}/', response_model=ExportJob, status_code=202)
+async def create_company_export(
+        company_id: int,
+        export_format: ExportJobFormat = ExportJobFormat.CSV,
+        current_user: UserResponse = Depends(get_current_user),
+        db: Database = Depends(get_db)
+) -> ExportJob:
+    AuthService.check_user_or_403(user=current_user)
+    export_service = ExportService(db=db)
+
+    result = await export_service.create_company_export(
+        company_id=company_id,
+        export_format=export_format,
+        user=current_user
+    )
+    return result
+
+
+@router.get('/{job_id}/', response_model=ExportJob)
+async def get_export(
+        job_id: str,
+        current_user: UserResponse = Depends(get_current_user),
+        db: Database = Depends(get_db)
+) -> ExportJob:
+    AuthService.check_user_or_403(user=current_user)
+    export_service = ExportService(db=db)
+
+    result = await export_service.get_job(job_id=job_id, user=current_user)
+    return result
+
+
+@router.get('/{job_id}/download')
+async def download_export(
+        job_id: str,
+        current_user: UserResponse = Depends(get_current_user),
+        db: Database = Depends(get_db)
+) -> FileResponse:
+    AuthService.check_user_or_403(user=current_user)
+    export_service = ExportService(db=db)
+
+    job, path = await export_service.get_file_path(job_id=job_id, user=current_user)
+    return FileResponse(
+        path,
+        media_type=MEDIA_TYPES[job.export_format],
+        filename=f'company_{job.company_id}_results.{job.export_format.value}'
+    )
@@ -0,0 +1,66 @@
+from databases import Database
+from fastapi import APIRouter, Depends, Query
+
+from app.db.connections import get_db
+from app.routes.auth import get_current_user
+from app.schemas.leaderboard_schemas import Leaderboard, LeaderboardEntry, LeaderboardType
+from app.schemas.user_schemas import UserResponse
+from app.services.auth_service import AuthService
+from app.services.leaderboard_service import LeaderboardService
+
+router = APIRouter(
+    prefix='/leaderboards',
+    tags=['leaderboards'],
+    responses={
+        404: {'description': 'Not found'}
+    }
+)
+
+
+@router.get('/{board}/{board_id}/', response_model=Leaderboard)
+async def get_leaderboard_top(
+        board: LeaderboardType,
+        board_id: int,
+        limit: int = Query(10, ge=1, le=100),
+        current_user: UserResponse = Depends(get_current_user),
+        db: Database = Depends(get_db)
+) -> Leaderboard:
+    AuthService.check_user_or_403(user=current_user)
+    leaderboard_service = LeaderboardService(db=db)
+
+    result = await leaderboard_service.get_top(board=board, board_id=board_id, limit=limit, user=current_user)
+    return result
+
+
+@router.get('/{board}/{board_id}/me/', response_model=LeaderboardEntry)
+async def get_my_leaderboard_rank(
+        board: LeaderboardType,
+        board_id: int,
+        current_user: UserResponse = Depends(get_current_user),
+        db: Database = Depends(get_db)
+) -> LeaderboardEntry:
+    AuthService.check_user_or_403(user=current_user)
+    leaderboard_service = LeaderboardService(db=db)
+
+    result = await leaderboard_service.get_my_rank(board=board, board_id=board_id, user=current_user)
+    return result
+
+
+@router.get('/{board}/{board_id}/around_me/', response_model=Leaderboard)
+async def get_leaderboard_around_me(
+        board: LeaderboardType,
+        board_id: int,
+        radius: int = Query(5, ge=0, le=50),
+        current_user: UserResponse = Depends(get_current_user),
+        db: Database = Depends(get_db)
+) -> Leaderboard:
+    AuthService.check_user_or_403(user=current_user)
+    leaderboard_service = LeaderboardService(db=db)
+
+    result = await leaderboard_service.get_around_me(
+        board=board,
+        board_id=board_id,
+        radius=radius,
+        user=current_user
+    )
+    return result
@@ -0,0 +1,89 @@
+from databases import Database
+from fastapi import APIRouter, Depends, HTTPException
+
+from app.db.connections import get_db, replica_router, redis_pool
+from app.db.pool import get_pool_stats
+from app.routes.auth import get_current_user
+from app.schemas.metrics_schemas import PrincipalCacheStats, PasswordHasherStats, DBPoolStats, \
+    DBReplicaStats, QuizContentCacheStats, RedisPoolStats, ExportJobsStats
+from app.schemas.user_schemas import UserResponse
+from app.services.auth_service import AuthService
+from app.utils.export_jobs import export_runner
+from app.utils.password_hasher import password_hasher
+from app.utils.principal_cache import principal_cache
+from app.utils.quiz_content_cache import quiz_content_cache
+
+router = APIRouter(
+    prefix='/metrics',
+    tags=['metrics'],
+    responses={
+        403: {'description': 'For superusers only'}
+    }
+)
+
+
+@router.get('/principal_cache/', response_model=PrincipalCacheStats)
+async def get_principal_cache_stats(
+        current_user: UserResponse = Depends(get_current_user),
+) -> PrincipalCacheStats:
+    AuthService.check_superuser_or_403(user=current_user)
+
+    return principal_cache.stats()
+
+
+@router.get('/password_hasher/', response_model=PasswordHasherStats)
+async def get_password_hasher_stats(
+        current_user: UserResponse = Depends(get_current_user),
+) -> PasswordHasherStats:
+    AuthService.check_superuser_or_403(user=current_user)
+
+    return password_hasher.stats()
+
+
+@router.get('/db_pool/', response_model=DBPoolStats)
+async def get_db_pool_stats(
+        current_user: UserResponse = Depends(get_current_user),
+        db: Database = Depends(get_db)
+) -> DBPoolStats:
+    AuthService.check_superuser_or_403(user=current_user)
+
+    stats = get_pool_stats(db=db)
+    if stats is None:
+        raise HTTPException(status_code=503, detail='Database pool is not running')
+    return stats
+
+
+@router.get('/db_replica/', response_model=DBReplicaStats)
+async def get_db_replica_stats(
+        current_user: UserResponse = Depends(get_current_user),
+) -> DBReplicaStats:
+    AuthService.check_superuser_or_403(user=current_user)
+
+    return replica_router.stats()
+
+
+@router.get('/redis_pool/', response_model=RedisPoolStats)
+async def get_redis_pool_stats(
+        current_user: UserResponse = Depends(get_current_user),
+) -> RedisPoolStats:
+    AuthService.check_superuser_or_403(user=current_user)
+
+    return redis_pool.stats()
+
+
+@router.get('/quiz_content_cache/', response_model=QuizContentCacheStats)
+async def get_quiz_content_cache_stats(
+        current_user: UserResponse = Depends(get_current_user),
+) -> QuizContentCacheStats:
+    AuthService.check_superuser_or_403(user=current_user)
+
+    return quiz_content_cache.stats()
+
+
+@router.get('/export_jobs/', response_model=ExportJobsStats)
+async def get_export_jobs_stats(
+        current_user: UserResponse = Depends(get_current_user),
+) -> ExportJobsStats:
+    AuthService.check_superuser_or_403(user=current_user)
+
+    return export_runner.stats()
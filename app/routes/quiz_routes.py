@@ -1,15 +1,20 @@
+from typing import Optional
+
 from databases import Database
-from fastapi import APIRouter, Depends
-from starlette.responses import JSONResponse, FileResponse
+from fastapi import APIRouter, Depends, Header
+from starlette.responses import Response, StreamingResponse
 
-from app.db.connections import get_db
+from app.db.connections import get_db, get_read_db
 from app.routes.auth import get_current_user
 from app.schemas.quiz_schemas import QuizList, QuizResponse, QuizRequest, QuizUpdateRequest, QuestionResponseList, \
     QuestionResponse, QuestionRequest, QuestionUpdate, TakenQuizStats, Rating, QuestionUserResponseList, TestResults, \
-    RedisQuizResults, RedisQuizResult
+    RedisQuizResults, RedisQuizResult, ExportFormat
 from app.schemas.user_schemas import UserResponse
 from app.services.auth_service import AuthService
 from app.services.quiz_service import QuizService
+from app.services.quiz_submission_service import QuizSubmissionService
+from app.utils.http_cache import ConditionalGet
+from app.utils.streaming import stream_results, stream_csv
 
 router = APIRouter(
     prefix='/quizzes',
@@ -24,12 +29,17 @@ router = APIRouter(
 async def get_all_quizzes_by_company(
         company_id: int,
         current_user: UserResponse = Depends(get_current_user),
-        db: Database = Depends(get_db)
+        db: Database = Depends(get_db),
+        conditional_get: ConditionalGet = Depends()
 ) -> QuizList:
     AuthService.check_user_or_403(user=current_user)
     quiz_service = QuizService(db=db)
 
-    result = await quiz_service.get_quizzes_by_company(company_id=company_id, user=current_user)
+    result = await quiz_service.get_quizzes_by_company(
+        company_id=company_id,
+        user=current_user,
+        conditional_get=conditional_get
+    )
     return result
 
 
@@ -77,12 +87,17 @@ async def delete_quiz_by_id(
 async def get_quiz_questions(
         quiz_id: int,
         current_user: UserResponse = Depends(get_current_user),
-        db: Database = Depends(get_db)
+        db: Database = Depends(get_db),
+        conditional_get: ConditionalGet = Depends()
 ) -> QuestionResponseList:
     AuthService.check_user_or_403(user=current_user)
     quiz_service = QuizService(db=db)
 
-    result = await quiz_service.get_quiz_questions(quiz_id=quiz_id, user=current_user)
+    result = await quiz_service.get_quiz_questions(
+        quiz_id=quiz_id,
+        user=current_user,
+        conditional_get=conditional_get
+    )
     return result
 
 
@@ -134,13 +149,19 @@ async def delete_question(
 async def get_questions_list_for_user(
         quiz_id: int,
         current_user: UserResponse = Depends(get_current_user),
-        db: Database = Depends(get_db)
-) -> QuestionUserResponseList:
+        db: Database = Depends(get_db),
+        conditional_get: ConditionalGet = Depends()
+) -> Response:
     AuthService.check_user_or_403(user=current_user)
     quiz_service = QuizService(db=db)
 
-    result = await quiz_service.get_question_list_user(quiz_id=quiz_id, user=current_user)
-    return result
+    result = await quiz_service.get_question_list_user(
+        quiz_id=quiz_id,
+        user=current_user,
+        conditional_get=conditional_get
+    )
+    # Returned as is, so the validators are not merged in from the dependency's response
+    return Response(content=result, media_type='application/json', headers=conditional_get.headers)
 
 
 @router.post('/quiz/{quiz_id}/result/', response_model=TakenQuizStats)
@@ -151,9 +172,9 @@ async def save_quiz_result(
         db: Database = Depends(get_db)
 ) -> TakenQuizStats:
     AuthService.check_user_or_403(user=current_user)
-    quiz_service = QuizService(db=db)
+    quiz_submission_service = QuizSubmissionService(db=db)
 
-    result = await quiz_service.save_quiz_result(quiz_id=quiz_id, quiz_answers=quiz_answers, user=current_user)
+    result = await quiz_submission_service.submit(quiz_id=quiz_id, quiz_answers=quiz_answers, user=current_user)
     return result
 
 
@@ -162,10 +183,11 @@ async def get_quiz_rating_for_user(
         quiz_id: int,
         user_id: int,
         current_user: UserResponse = Depends(get_current_user),
-        db: Database = Depends(get_db)
+        db: Database = Depends(get_db),
+        read_db: Database = Depends(get_read_db)
 ) -> Rating:
     AuthService.check_user_or_403(user=current_user)
-    quiz_service = QuizService(db=db)
+    quiz_service = QuizService(db=db, read_db=read_db)
 
     result = await quiz_service.get_rating_by_quiz(quiz_id=quiz_id, user_id=user_id)
     return result
@@ -176,10 +198,11 @@ async def get_rating_for_company(
         company_id: int,
         user_id: int,
         current_user: UserResponse = Depends(get_current_user),
-        db: Database = Depends(get_db)
+        db: Database = Depends(get_db),
+        read_db: Database = Depends(get_read_db)
 ) -> Rating:
     AuthService.check_user_or_403(user=current_user)
-    quiz_service = QuizService(db=db)
+    quiz_service = QuizService(db=db, read_db=read_db)
 
     result = await quiz_service.get_rating_by_company(company_id=company_id, user_id=user_id)
     return result
@@ -189,10 +212,11 @@ async def get_rating_for_company(
 async def get_overall_rating_for_user(
         user_id: int,
         current_user: UserResponse = Depends(get_current_user),
-        db: Database = Depends(get_db)
+        db: Database = Depends(get_db),
+        read_db: Database = Depends(get_read_db)
 ) -> Rating:
     AuthService.check_user_or_403(user=current_user)
-    quiz_service = QuizService(db=db)
+    quiz_service = QuizService(db=db, read_db=read_db)
 
     result = await quiz_service.get_overall_rating(user_id=user_id)
     return result
@@ -200,69 +224,71 @@ async def get_overall_rating_for_user(
 
 @router.get('/quiz_rating/json_export/my/', response_model=RedisQuizResults)
 async def get_my_quizzes_results(
+        export_format: ExportFormat = ExportFormat.JSON,
         current_user: UserResponse = Depends(get_current_user),
         db: Database = Depends(get_db)
-) -> JSONResponse:
+) -> StreamingResponse:
     AuthService.check_user_or_403(user=current_user)
     quiz_service = QuizService(db=db)
 
     result = await quiz_service.get_my_stats_from_redis(user=current_user)
-    return JSONResponse(content=result.json())
+    return stream_results(results=result, export_format=export_format)
 
 
 @router.get('/quiz_rating/json_export/{company_id}/{user_id}/', response_model=RedisQuizResults)
 async def get_quiz_stats_for_user_in_the_company(
         member_id: int,
         company_id: int,
+        export_format: ExportFormat = ExportFormat.JSON,
         current_user: UserResponse = Depends(get_current_user),
         db: Database = Depends(get_db)
-) -> JSONResponse:
+) -> StreamingResponse:
     AuthService.check_user_or_403(user=current_user)
     quiz_service = QuizService(db=db)
 
     result = await quiz_service.get_quiz_results_by_user(member_id=member_id, company_id=company_id, user=current_user)
-    return JSONResponse(content=result.json())
+    return stream_results(results=result, export_format=export_format)
 
 
 @router.get('/quiz_rating/json_export_by_company/{company_id}/', response_model=RedisQuizResults)
 async def get_quiz_stats_by_company(
         company_id: int,
+        export_format: ExportFormat = ExportFormat.JSON,
         current_user: UserResponse = Depends(get_current_user),
         db: Database = Depends(get_db)
-) -> JSONResponse:
+) -> StreamingResponse:
     AuthService.check_user_or_403(user=current_user)
     quiz_service = QuizService(db=db)
 
     result = await quiz_service.get_quiz_results_by_company(company_id=company_id, user=current_user)
-    return JSONResponse(content=result.json())
+    return stream_results(results=result, export_format=export_format)
 
 
 @router.get('/quiz_rating/json_export_by_quiz_id/{quiz_id}/', response_model=RedisQuizResults)
 async def get_quiz_stats_by_quiz_in_company(
         quiz_id: int,
+        export_format: ExportFormat = ExportFormat.JSON,
         current_user: UserResponse = Depends(get_current_user),
         db: Database = Depends(get_db)
-) -> JSONResponse:
+) -> StreamingResponse:
     AuthService.check_user_or_403(user=current_user)
     quiz_service = QuizService(db=db)
 
     result = await quiz_service.get_quiz_results_by_quiz_in_company(quiz_id=quiz_id, user=current_user)
-    return JSONResponse(content=result.json())
+    return stream_results(results=result, export_format=export_format)
 
 
 @router.post('/quiz_rating/write_to_scv/me/', status_code=200)
 async def save_my_stats_to_csv(
         current_user: UserResponse = Depends(get_current_user),
-        db: Database = Depends(get_db)
-) -> FileResponse:
+        db: Database = Depends(get_db),
+        accept_encoding: Optional[str] = Header(None)
+) -> StreamingResponse:
     AuthService.check_user_or_403(user=current_user)
     quiz_service = QuizService(db=db)
 
-    await quiz_service.write_my_stats_to_csv(user=current_user)
-
-    file_name = 'my_quiz_results.csv'
-    file_path = f"/app/app/utils/{file_name}"
-    return FileResponse(file_path, media_type='text/csv', filename=file_name)
+    result = await quiz_service.get_my_stats_from_redis(user=current_user)
+    return stream_csv(results=result, filename='my_quiz_results.csv', accept_encoding=accept_encoding)
 
 
 @router.post('/quiz_rating/write_to_scv/{company_id}/{user_id}/', status_code=200)
@@ -270,45 +296,39 @@ async def save_csv_stats_for_user_in_the_company(
         member_id: int,
         company_id: int,
         current_user: UserResponse = Depends(get_current_user),
-        db: Database = Depends(get_db)
-) -> FileResponse:
+        db: Database = Depends(get_db),
+        accept_encoding: Optional[str] = Header(None)
+) -> StreamingResponse:
     AuthService.check_user_or_403(user=current_user)
     quiz_service = QuizService(db=db)
 
-    await quiz_service.write_quiz_user_stats_to_csv(member_id=member_id, company_id=company_id, user=current_user)
-
-    file_name = 'user_company_results.csv'
-    file_path = f"/app/app/utils/{file_name}"
-    return FileResponse(file_path, media_type='text/csv', filename=file_name)
+    result = await quiz_service.get_quiz_results_by_user(member_id=member_id, company_id=company_id, user=current_user)
+    return stream_csv(results=result, filename='user_company_results.csv', accept_encoding=accept_encoding)
 
 
 @router.post('/quiz_rating/write_to_csv_by_company/{company_id}/', status_code=200)
 async def save_csv_stats_for_company(
         company_id: int,
         current_user: UserResponse = Depends(get_current_user),
-        db: Database = Depends(get_db)
-) -> FileResponse:
+        db: Database = Depends(get_db),
+        accept_encoding: Optional[str] = Header(None)
+) -> StreamingResponse:
     AuthService.check_user_or_403(user=current_user)
     quiz_service = QuizService(db=db)
 
-    await quiz_service.write_quiz_results_by_company_to_csv(company_id=company_id, user=current_user)
-
-    file_name = 'company_results.csv'
-    file_path = f"/app/app/utils/{file_name}"
-    return FileResponse(file_path, media_type='text/csv', filename=file_name)
+    result = await quiz_service.get_quiz_results_by_company(company_id=company_id, user=current_user)
+    return stream_csv(results=result, filename='company_results.csv', accept_encoding=accept_encoding)
 
 
 @router.post('/quiz_rating/write_csv_by_quiz_id/{quiz_id}/', status_code=200)
 async def get_quiz_stats_by_quiz_in_company(
         quiz_id: int,
         current_user: UserResponse = Depends(get_current_user),
-        db: Database = Depends(get_db)
-) -> FileResponse:
+        db: Database = Depends(get_db),
+        accept_encoding: Optional[str] = Header(None)
+) -> StreamingResponse:
     AuthService.check_user_or_403(user=current_user)
     quiz_service = QuizService(db=db)
 
-    await quiz_service.write_quiz_results_by_quiz_id_to_csv(quiz_id=quiz_id, user=current_user)
-
-    file_name = 'quiz_id_results.csv'
-    file_path = f"/app/app/utils/{file_name}"
-    return FileResponse(file_path, media_type='text/csv', filename=file_name)
+    result = await quiz_service.get_quiz_results_by_quiz_in_company(quiz_id=quiz_id, user=current_user)
+    return stream_csv(results=result, filename='quiz_id_results.csv', accept_encoding=accept_encoding)
@@ -1,10 +1,13 @@
+from datetime import date
+from typing import Optional
+
 from databases import Database
-from fastapi import APIRouter, Depends
+from fastapi import APIRouter, Depends, Query
 
-from app.db.connections import get_db
+from app.db.connections import get_db, get_read_db
 from app.routes.auth import get_current_user
 from app.schemas.quiz_stat_schemas import QuizStatAverageRatings, QuizStatUserRating, QuizStatDateRatings, \
-    QuizStatLastDate, QuizStatDateRating, QuizStatUserProgression
+    QuizStatLastDate, QuizStatDateRating, QuizStatCompanyProgression, QuizDailyTotals, UserDailyTotals
 from app.schemas.user_schemas import UserResponse
 from app.services.auth_service import AuthService
 from app.services.quiz_stat_service import QuizStatService
@@ -21,10 +24,11 @@ router = APIRouter(
 @router.get('/my_rating/', response_model=QuizStatUserRating)
 async def get_my_rating(
         current_user: UserResponse = Depends(get_current_user),
-        db: Database = Depends(get_db)
+        db: Database = Depends(get_db),
+        read_db: Database = Depends(get_read_db)
 ) -> QuizStatUserRating:
     AuthService.check_user_or_403(user=current_user)
-    quiz_stat_service = QuizStatService(db=db)
+    quiz_stat_service = QuizStatService(db=db, read_db=read_db)
 
     result = await quiz_stat_service.get_rating(user=current_user)
     return result
@@ -33,10 +37,11 @@ async def get_my_rating(
 @router.get('/my_average_stats/', response_model=QuizStatAverageRatings)
 async def get_my_average_stats(
         current_user: UserResponse = Depends(get_current_user),
-        db: Database = Depends(get_db)
+        db: Database = Depends(get_db),
+        read_db: Database = Depends(get_read_db)
 ) -> QuizStatAverageRatings:
     AuthService.check_user_or_403(user=current_user)
-    quiz_stat_service = QuizStatService(db=db)
+    quiz_stat_service = QuizStatService(db=db, read_db=read_db)
 
     result = await quiz_stat_service.get_success_percentage_for_user(user=current_user)
     return result
@@ -45,10 +50,11 @@ async def get_my_average_stats(
 @router.get('/my_daily_stats/', response_model=list[QuizStatDateRating])
 async def get_my_stats_day_by_day(
         current_user: UserResponse = Depends(get_current_user),
-        db: Database = Depends(get_db)
+        db: Database = Depends(get_db),
+        read_db: Database = Depends(get_read_db)
 ) -> list[QuizStatDateRating]:
     AuthService.check_user_or_403(user=current_user)
-    quiz_stat_service = QuizStatService(db=db)
+    quiz_stat_service = QuizStatService(db=db, read_db=read_db)
 
     user_id = current_user.id
     result = await quiz_stat_service.get_success_rate_progression(user_id=user_id)
@@ -60,10 +66,11 @@ async def get_success_rate_progression_for_user(
         company_id: int,
         user_id: int,
         current_user: UserResponse = Depends(get_current_user),
-        db: Database = Depends(get_db)
+        db: Database = Depends(get_db),
+        read_db: Database = Depends(get_read_db)
 ) -> list[QuizStatDateRating]:
     AuthService.check_user_or_403(user=current_user)
-    quiz_stat_service = QuizStatService(db=db)
+    quiz_stat_service = QuizStatService(db=db, read_db=read_db)
 
     result = await quiz_stat_service.get_success_rate_progression_for_user(
         company_id=company_id,
@@ -73,16 +80,28 @@ async def get_success_rate_progression_for_user(
     return result
 
 
-@router.get('/company_daily_stats/{company_id}/', response_model=list[QuizStatUserProgression])
+@router.get('/company_daily_stats/{company_id}/', response_model=QuizStatCompanyProgression)
 async def get_success_rate_progression_for_company(
         company_id: int,
+        after_user_id: Optional[int] = None,
+        limit: int = Query(100, ge=1, le=1000),
+        date_from: Optional[date] = None,
+        date_to: Optional[date] = None,
         current_user: UserResponse = Depends(get_current_user),
-        db: Database = Depends(get_db)
-) -> list[QuizStatUserProgression]:
+        db: Database = Depends(get_db),
+        read_db: Database = Depends(get_read_db)
+) -> QuizStatCompanyProgression:
     AuthService.check_user_or_403(user=current_user)
-    quiz_stat_service = QuizStatService(db=db)
+    quiz_stat_service = QuizStatService(db=db, read_db=read_db)
 
-    result = await quiz_stat_service.get_success_rate_progression_for_company(company_id=company_id)
+    result = await quiz_stat_service.get_success_rate_progression_for_company(
+        company_id=company_id,
+        current_user=current_user,
+        after_user_id=after_user_id,
+        limit=limit,
+        date_from=date_from,
+        date_to=date_to
+    )
     return result
 
 
@@ -90,13 +109,56 @@ async def get_success_rate_progression_for_company(
 async def get_users_daily_stats(
         company_id: int,
         current_user: UserResponse = Depends(get_current_user),
-        db: Database = Depends(get_db)
+        db: Database = Depends(get_db),
+        read_db: Database = Depends(get_read_db)
 ) -> list[QuizStatLastDate]:
     AuthService.check_user_or_403(user=current_user)
-    quiz_stat_service = QuizStatService(db=db)
+    quiz_stat_service = QuizStatService(db=db, read_db=read_db)
 
     result = await quiz_stat_service.get_latest_time_quiz_passed_for_users(
         company_id=company_id,
         current_user=current_user
     )
     return result
+
+
+@router.get('/company_quiz_totals/{company_id}/', response_model=list[QuizDailyTotals])
+async def get_company_quiz_daily_totals(
+        company_id: int,
+        date_from: Optional[date] = None,
+        date_to: Optional[date] = None,
+        current_user: UserResponse = Depends(get_current_user),
+        db: Database = Depends(get_db),
+        read_db: Database = Depends(get_read_db)
+) -> list[QuizDailyTotals]:
+    AuthService.check_user_or_403(user=current_user)
+    quiz_stat_service = QuizStatService(db=db, read_db=read_db)
+
+    result = await quiz_stat_service.get_company_quiz_daily_totals(
+        company_id=company_id,
+        current_user=current_user,
+        date_from=date_from,
+        date_to=date_to
+    )
+    return result
+
+
+@router.get('/company_user_totals/{company_id}/', response_model=list[UserDailyTotals])
+async def get_company_user_daily_totals(
+        company_id: int,
+        date_from: Optional[date] = None,
+        date_to: Optional[date] = None,
+        current_user: UserResponse = Depends(get_current_user),
+        db: Database = Depends(get_db),
+        read_db: Database = Depends(get_read_db)
+) -> list[UserDailyTotals]:
+    AuthService.check_user_or_403(user=current_user)
+    quiz_stat_service = QuizStatService(db=db, read_db=read_db)
+
+    result = await quiz_stat_service.get_company_user_daily_totals(
+        company_id=company_id,
+        current_user=current_user,
+        date_from=date_from,
+        date_to=date_to
+    )
+    return result
@@ -1,9 +1,16 @@
+from typing import Optional
+
 from pydantic import BaseModel
 
 
 class Token(BaseModel):
     access_token: str
     token_type: str
+    refresh_token: Optional[str]
+
+
+class RefreshTokenRequest(BaseModel):
+    refresh_token: str
 
 
 class Auth0Response(BaseModel):
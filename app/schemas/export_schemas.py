@@ -0,0 +1,33 @@
+from datetime import datetime
+from enum import Enum
+from typing import Optional
+
+from pydantic import BaseModel
+
+
+class ExportJobFormat(str, Enum):
+    CSV = 'csv'
+    JSON = 'json'
+    NDJSON = 'ndjson'
+    PARQUET = 'parquet'
+
+
+class ExportJobStatus(str, Enum):
+    QUEUED = 'queued'
+    RUNNING = 'running'
+    DONE = 'done'
+    FAILED = 'failed'
+
+
+class ExportJob(BaseModel):
+    id: str
+    user_id: int
+    company_id: int
+    export_format: ExportJobFormat
+    status: ExportJobStatus
+    results_written: int
+    created_at: datetime
+    finished_at: Optional[datetime]
+    expires_at: Optional[datetime]
+    download_url: Optional[str]
+    error: Optional[str]
@@ -0,0 +1,21 @@
+from enum import Enum
+from typing import List
+
+from pydantic import BaseModel
+
+
+class LeaderboardType(str, Enum):
+    COMPANY = 'company'
+    QUIZ = 'quiz'
+
+
+class LeaderboardEntry(BaseModel):
+    rank: int
+    user_id: int
+    rating: float
+
+
+class Leaderboard(BaseModel):
+    # Users on the whole board, not only in `entries`
+    total: int
+    entries: List[LeaderboardEntry]
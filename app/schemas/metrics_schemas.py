@@ -0,0 +1,96 @@
+from typing import Dict, Optional
+
+from pydantic import BaseModel
+
+
+class PrincipalCacheStats(BaseModel):
+    size: int
+    max_size: int
+    use_redis: bool
+
+    local_hits: int
+    redis_hits: int
+    misses: int
+    invalidations: int
+    hit_ratio: float
+
+
+class PasswordHasherStats(BaseModel):
+    rounds: int
+    pool_type: str
+    max_workers: int
+    max_queue: int
+
+    in_flight: int
+    queued: int
+    completed: int
+    rejected: int
+    rehashed: int
+    latency_avg_ms: float
+    latency_buckets_ms: Dict[str, int]
+
+
+class DBPoolStats(BaseModel):
+    min_size: int
+    max_size: int
+    size: int
+    in_use: int
+    idle: int
+
+    waiting: int
+    acquired: int
+    timeouts: int
+    acquire_timeout: float
+    wait_avg_ms: float
+    wait_max_ms: float
+    acquire_latency_buckets_ms: Dict[str, int]
+
+
+class RedisPoolStats(BaseModel):
+    max_size: int
+    size: int
+    in_use: int
+    idle: int
+
+    waiting: int
+    acquired: int
+    errors: int
+    acquire_timeout: float
+    wait_avg_ms: float
+    wait_max_ms: float
+    acquire_latency_buckets_ms: Dict[str, int]
+
+
+class DBReplicaStats(BaseModel):
+    configured: bool
+    healthy: bool
+    lag_seconds: Optional[float]
+    max_lag_seconds: float
+
+    replica_reads: int
+    primary_reads: int
+    failovers: int
+    last_error: Optional[str]
+    pool: Optional[DBPoolStats]
+
+
+class QuizContentCacheStats(BaseModel):
+    size: int
+    max_size: int
+
+    local_hits: int
+    redis_hits: int
+    misses: int
+    hit_ratio: float
+
+
+class ExportJobsStats(BaseModel):
+    max_workers: int
+    max_per_company: int
+    max_queue: int
+
+    running: int
+    queued: int
+    completed: int
+    failed: int
+    rejected: int
@@ -1,4 +1,5 @@
 from datetime import date
+from enum import Enum
 from typing import List, Optional
 
 from pydantic import BaseModel
@@ -100,4 +101,9 @@ class RedisQuizResult(BaseModel):
 
 
 class RedisQuizResults(BaseModel):
-    results: List[RedisQuizResult]
\ No newline at end of file
+    results: List[RedisQuizResult]
+
+
+class ExportFormat(str, Enum):
+    JSON = 'json'
+    NDJSON = 'ndjson'
@@ -1,5 +1,5 @@
 from datetime import date
-from typing import List
+from typing import List, Optional
 
 from pydantic import BaseModel
 
@@ -41,4 +41,26 @@ class QuizStatLastDate(BaseModel):
 
 class QuizStatUserProgression(BaseModel):
     user_id: int
-    data: list[QuizStatDateRating]
\ No newline at end of file
+    data: list[QuizStatDateRating]
+
+
+class QuizStatCompanyProgression(BaseModel):
+    users: List[QuizStatUserProgression]
+    # Pass as `after_user_id` to get the next page; None on the last page
+    next_after_user_id: Optional[int]
+
+
+class DailyTotals(BaseModel):
+    date: date
+    attempts: int
+    questions_total: int
+    correct_answers: int
+    average_percentage: float
+
+
+class QuizDailyTotals(DailyTotals):
+    quiz_id: int
+
+
+class UserDailyTotals(DailyTotals):
+    user_id: int
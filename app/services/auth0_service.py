@@ -1,6 +1,18 @@
+import asyncio
+import json
+import logging
 import os
+import time
+from abc import ABC, abstractmethod
+from typing import Optional
+
+import httpx
 import jwt
 
+from system_config import system_config
+
+logger = logging.getLogger(__name__)
+
 
 def set_up():
     config = {
@@ -12,19 +24,168 @@ def set_up():
     return config
 
 
+class JWKSSource(ABC):
+    @abstractmethod
+    async def fetch(self) -> dict:
+        """The JWKS document: {'keys': [...]}."""
+
+
+class HTTPJWKSSource(JWKSSource):
+    def __init__(self, url: str, timeout: float):
+        self.url = url
+        self.timeout = timeout
+
+    async def fetch(self) -> dict:
+        async with httpx.AsyncClient(timeout=self.timeout) as client:
+            response = await client.get(self.url)
+            response.raise_for_status()
+            return response.json()
+
+
+class FileJWKSSource(JWKSSource):
+    def __init__(self, path: str):
+        self.path = path
+
+    def _read(self) -> dict:
+        with open(self.path) as jwks_file:
+            return json.load(jwks_file)
+
+    async def fetch(self) -> dict:
+        return await asyncio.to_thread(self._read)
+
+
+class JWKSKeyStore:
+    """
+    Process-wide store of Auth0 signing keys.
+
+    Keys are prefetched on startup and refreshed on a timer or when a token comes with an unknown `kid`.
+    Concurrent refreshes share one fetch, so token verification itself never does any I/O.
+    """
+
+    def __init__(self, source: Optional[JWKSSource], refresh_interval: int, min_refresh_interval: int):
+        self.source = source
+        self.refresh_interval = refresh_interval
+        self.min_refresh_interval = min_refresh_interval
+
+        self._keys: dict[str, jwt.PyJWK] = {}
+        self._last_refresh = 0.0
+        self._refresh_task: Optional[asyncio.Task] = None
+        self._background_task: Optional[asyncio.Task] = None
+
+    def set_source(self, source: Optional[JWKSSource]) -> None:
+        self.source = source
+        self._keys = {}
+        self._last_refresh = 0.0
+
+    async def _load_keys(self) -> None:
+        jwk_set = jwt.PyJWKSet.from_dict(await self.source.fetch())
+        keys = {
+            key.key_id: key for key in jwk_set.keys
+            if key.public_key_use in ['sig', None] and key.key_id
+        }
+        if not keys:
+            raise jwt.exceptions.PyJWKClientError('The JWKS endpoint did not contain any signing keys')
+
+        self._keys = keys
+
+    async def refresh(self) -> None:
+        if self.source is None:
+            return
+
+        if self._refresh_task is None or self._refresh_task.done():
+            self._last_refresh = time.monotonic()
+            self._refresh_task = asyncio.create_task(self._load_keys())
+
+        await asyncio.shield(self._refresh_task)
+
+    async def _refresh_periodically(self) -> None:
+        while True:
+            await asyncio.sleep(self.refresh_interval)
+            try:
+                await self.refresh()
+            except Exception as error:
+                logger.warning('JWKS refresh failed: %s', error)
+
+    async def start(self) -> None:
+        if self.source is None:
+            return
+
+        try:
+            await self.refresh()
+        except Exception as error:
+            logger.warning('JWKS prefetch failed: %s', error)
+
+        if self._background_task is None:
+            self._background_task = asyncio.create_task(self._refresh_periodically())
+
+    async def stop(self) -> None:
+        if self._background_task is not None:
+            self._background_task.cancel()
+            self._background_task = None
+
+    async def ensure_key_for_jwt(self, token: str) -> None:
+        try:
+            kid = jwt.get_unverified_header(token).get('kid')
+        except jwt.exceptions.DecodeError:
+            return
+
+        if kid in self._keys:
+            return
+
+        # Unknown kid: keys may have been rotated, but don't let garbage tokens hammer the JWKS endpoint
+        refreshing = self._refresh_task is not None and not self._refresh_task.done()
+        if refreshing or time.monotonic() - self._last_refresh >= self.min_refresh_interval:
+            try:
+                await self.refresh()
+            except Exception as error:
+                logger.warning('JWKS refresh failed: %s', error)
+
+    def get_signing_key_from_jwt(self, token: str) -> jwt.PyJWK:
+        kid = jwt.get_unverified_header(token).get('kid')
+        signing_key = self._keys.get(kid)
+
+        if not signing_key:
+            raise jwt.exceptions.PyJWKClientError(f'Unable to find a signing key that matches: "{kid}"')
+
+        return signing_key
+
+
+def get_jwks_source() -> Optional[JWKSSource]:
+    if system_config.auth0_jwks_file:
+        return FileJWKSSource(path=system_config.auth0_jwks_file)
+
+    domain = set_up()["DOMAIN"]
+    if domain:
+        return HTTPJWKSSource(
+            url=f'https://{domain}/.well-known/jwks.json',
+            timeout=system_config.auth0_jwks_timeout
+        )
+
+    return None
+
+
+jwks_key_store = JWKSKeyStore(
+    source=get_jwks_source(),
+    refresh_interval=system_config.auth0_jwks_refresh_interval,
+    min_refresh_interval=system_config.auth0_jwks_min_refresh_interval
+)
+
+
 class VerifyToken:
-    def __init__(self, token, permissions=None, scopes=None):
+    def __init__(self, token, permissions=None, scopes=None, key_store: JWKSKeyStore = None):
         self.token = token
         self.permissions = permissions
         self.scopes = scopes
         self.config = set_up()
+        self.key_store = key_store or jwks_key_store
 
-        jwks_url = f'https://{self.config["DOMAIN"]}/.well-known/jwks.json'
-        self.jwks_client = jwt.PyJWKClient(jwks_url)
+    async def verify_async(self):
+        await self.key_store.ensure_key_for_jwt(self.token)
+        return self.verify()
 
     def verify(self):
         try:
-            self.signing_key = self.jwks_client.get_signing_key_from_jwt(
+            self.signing_key = self.key_store.get_signing_key_from_jwt(
                 self.token
             ).key
         except jwt.exceptions.PyJWKClientError as error:
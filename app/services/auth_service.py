@@ -7,18 +7,25 @@ from fastapi import HTTPException, status, Depends
 from fastapi.security import HTTPBearer
 
 from jose import jwt, JWTError
-from passlib.context import CryptContext
-from sqlalchemy import select
+from sqlalchemy import select, update
 
 from app.models.models import Users
 from app.schemas.auth_schemas import Token
 from app.schemas.user_schemas import UserResponse
 from app.services.auth0_service import VerifyToken
 from app.db.connections import get_db
+from app.services.permission_service import PermissionService
+from app.utils.company_roles import reset_request_roles, set_request_roles
+from app.utils.password_hasher import password_hasher
+from app.utils.principal_cache import principal_cache
+from app.utils.token_epoch import get_token_epoch
 from system_config import system_config
 
 token_auth_schema = HTTPBearer()
 
+ACCESS_TOKEN_TYPE = 'access'
+REFRESH_TOKEN_TYPE = 'refresh'
+
 
 async def get_current_user_dependency(
         token: str = Depends(token_auth_schema),
@@ -32,7 +39,6 @@ async def get_current_user_dependency(
 class AuthService:
     def __init__(self, db: Database):
         self.db = db
-        self.bcrypt_context = CryptContext(schemes=['bcrypt'], deprecated='auto')
         self.secret = system_config.secret_key
         self.algorithm = system_config.algorithm
 
@@ -50,25 +56,71 @@ class AuthService:
         if user is None:
             raise HTTPException(status_code=403, detail='For authorized users only')
 
-    def get_password_hash(self, password: str) -> str:
-        return self.bcrypt_context.hash(password=password)
+    @staticmethod
+    def check_superuser_or_403(user: UserResponse) -> None:
+        if user is None or not user.is_superuser:
+            raise HTTPException(status_code=403, detail='For superusers only')
+
+    @staticmethod
+    async def get_password_hash(password: str) -> str:
+        return await password_hasher.hash(password=password)
 
-    def verify_password(self, plain_pass: str, hashed_pass: str) -> bool:
-        return self.bcrypt_context.verify(secret=plain_pass, hash=hashed_pass)
+    @staticmethod
+    async def verify_password(plain_pass: str, hashed_pass: str) -> bool:
+        return await password_hasher.verify(password=plain_pass, hashed_password=hashed_pass)
 
     def create_access_token(
             self,
             email: str,
-            expires_delta: Optional[timedelta] = None
+            expires_delta: Optional[timedelta] = None,
+            claims: Optional[dict] = None
     ) -> str:
-        encode = {"sub": email}
+        encode = {"sub": email, **(claims or {})}
         if expires_delta:
             expire = datetime.utcnow() + expires_delta
         else:
-            expire = datetime.utcnow() + timedelta(minutes=20)
+            expire = datetime.utcnow() + timedelta(minutes=system_config.access_token_expire_minutes)
         encode.update({"exp": expire})
         return jwt.encode(encode, self.secret, self.algorithm)
 
+    @staticmethod
+    def get_user_stamp(user) -> str:
+        # Changes with every update of the user, password changes included, so older refresh tokens stop working
+        return user.__getitem__('update_datetime').isoformat()
+
+    def create_refresh_token(self, user) -> str:
+        return self.create_access_token(
+            email=user.__getitem__('user_email'),
+            expires_delta=timedelta(days=system_config.refresh_token_expire_days),
+            claims={'uid': user.__getitem__('id'), 'st': self.get_user_stamp(user), 'typ': REFRESH_TOKEN_TYPE}
+        )
+
+    async def get_access_claims(self, user) -> dict:
+        user_id = user.__getitem__('id')
+        claims = {
+            'uid': user_id,
+            'typ': ACCESS_TOKEN_TYPE,
+        }
+
+        permission_service = PermissionService(db=self.db)
+        roles, epoch = await permission_service.get_company_roles_with_epoch(user_id=user_id)
+        if epoch is None:
+            return claims
+
+        if len(roles) <= system_config.token_max_company_roles:
+            claims['roles'] = {str(company_id): role for company_id, role in roles.items()}
+            claims['ep'] = epoch
+
+        return claims
+
+    async def issue_tokens(self, user) -> Token:
+        email = user.__getitem__('user_email')
+        return Token(
+            access_token=self.create_access_token(email=email, claims=await self.get_access_claims(user)),
+            refresh_token=self.create_refresh_token(user=user),
+            token_type='Bearer'
+        )
+
     def decode_access_token(self, token: str) -> dict:
         try:
             decoded_token = jwt.decode(token, self.secret, algorithms=[self.algorithm])
@@ -76,14 +128,17 @@ class AuthService:
         except:
             return {}
 
-    def get_email_from_token(self, token: Optional[str] = Depends(HTTPBearer())) -> str:
-        jwt_token = token.credentials
-        payload = self.decode_access_token(jwt_token)
+    async def get_token_claims(self, jwt_token: str) -> tuple[Optional[str], Optional[int]]:
+        payload = self.decode_access_token(jwt_token) or {}
         email: str = payload.get('sub')
         if not email:
-            payload = VerifyToken(jwt_token).verify()
+            payload = await VerifyToken(jwt_token).verify_async()
             email = payload.get('email')
 
+        return email, payload.get('exp')
+
+    async def get_email_from_token(self, token: Optional[str] = Depends(HTTPBearer())) -> str:
+        email, _ = await self.get_token_claims(jwt_token=token.credentials)
         return email
 
     async def get_user_by_email(self, email: str):
@@ -91,33 +146,98 @@ class AuthService:
         user = await self.db.fetch_one(query)
         return user
 
+    async def get_user_by_id(self, user_id: int):
+        query = select(Users).where(Users.id == user_id)
+        user = await self.db.fetch_one(query)
+        return user
+
+    async def rehash_password(self, user_id: int, password: str, old_hash: str) -> None:
+        new_hash = await self.get_password_hash(password=password)
+
+        # Don't overwrite a password that was changed in the meantime. Same password, so not an update of the user:
+        # update_datetime is kept and refresh tokens stay valid
+        query = update(Users).where(
+            Users.id == user_id,
+            Users.user_password == old_hash
+        ).values(user_password=new_hash, update_datetime=Users.update_datetime)
+        await self.db.execute(query)
+
     async def authenticate_user(self, email, password) -> Token:
         user = await self.get_user_by_email(email=email)
 
-        if not user or not self.verify_password(
+        if not user or not await self.verify_password(
                 plain_pass=password,
                 hashed_pass=user.__getitem__('user_password')
         ):
             raise self.get_user_exception()
 
-        return Token(
-            access_token=self.create_access_token(email=email),
-            token_type='Bearer'
+        if password_hasher.needs_rehash(user.__getitem__('user_password')):
+            password_hasher.run_rehash(self.rehash_password(
+                user_id=user.__getitem__('id'),
+                password=password,
+                old_hash=user.__getitem__('user_password')
+            ))
+
+        return await self.issue_tokens(user=user)
+
+    async def refresh_tokens(self, refresh_token: str) -> Token:
+        payload = self.decode_access_token(refresh_token) or {}
+        if payload.get('typ') != REFRESH_TOKEN_TYPE or not payload.get('uid'):
+            raise self.get_user_exception()
+
+        user = await self.get_user_by_id(user_id=payload['uid'])
+        if not user or payload.get('st') != self.get_user_stamp(user):
+            raise self.get_user_exception()
+
+        return await self.issue_tokens(user=user)
+
+    async def set_token_roles(self, user_id: int, payload: dict) -> None:
+        # Roles from the token spare a DB query on every permission check, but only while they are current
+        roles = payload.get('roles')
+        if roles is None or payload.get('uid') != user_id:
+            return
+
+        if await get_token_epoch(user_id=user_id) != payload.get('ep'):
+            return
+
+        set_request_roles(
+            user_id=user_id,
+            roles={int(company_id): role for company_id, role in roles.items()}
         )
 
+    async def load_token_user(self, jwt_token: str, payload: dict) -> UserResponse:
+        if payload.get('uid'):
+            user = await self.get_user_by_id(user_id=payload['uid'])
+            expires_at = payload.get('exp')
+        else:
+            email, expires_at = await self.get_token_claims(jwt_token=jwt_token)
+            if not email:
+                raise self.get_user_exception()
+            user = await self.get_user_by_email(email=email)
+
+        if not user:
+            raise self.get_user_exception()
+
+        user_response = UserResponse.from_orm(user)
+        await principal_cache.set(token=jwt_token, user=user_response, expires_at=expires_at)
+        return user_response
+
     async def get_current_user(
             self, token: Optional[str] = Depends(HTTPBearer())
     ) -> UserResponse:
         try:
-            email = self.get_email_from_token(token=token)
-            if not email:
-                raise self.get_user_exception()
+            reset_request_roles()
 
-            user = await self.get_user_by_email(email=email)
-            if not user:
+            payload = self.decode_access_token(token.credentials) or {}
+            if payload.get('typ') == REFRESH_TOKEN_TYPE:
                 raise self.get_user_exception()
 
-            return UserResponse.from_orm(user)
+            user_response = await principal_cache.get(token=token.credentials)
+            if not user_response:
+                user_response = await self.load_token_user(jwt_token=token.credentials, payload=payload)
+
+            await self.set_token_roles(user_id=user_response.id, payload=payload)
+            return user_response
 
         except JWTError:
             raise self.get_user_exception()
@@ -3,18 +3,21 @@ from datetime import datetime
 from databases import Database
 from databases.backends.postgres import Record
 from fastapi import HTTPException
-from sqlalchemy import select, update, delete
+from sqlalchemy import select, delete
 
-from app.models.models import Companies, ActionTypeEnum
+from app.db.repository import Repository
+from app.models.models import Companies, ActionTypeEnum, Members
 from app.schemas.company_actions_schemas import CompanyMember
 from app.schemas.company_schemas import CompanyListResponse, CompanyResponse, CompanyCreateRequest, CompanyUpdateRequest
 from app.schemas.user_schemas import UserResponse
 from app.services.company_actions_service import CompanyActionsService
+from app.services.permission_service import PermissionService
 
 
 class CompaniesService:
     def __init__(self, db: Database):
         self.db = db
+        self.company_repository = Repository(db=db, model=Companies)
 
     @staticmethod
     def check_404_no_company(company: Record) -> None:
@@ -71,22 +74,21 @@ class CompaniesService:
             update_datetime=datetime.now(),
         )
 
-        query = Companies.__table__.insert().values(
-            owner_id=create_company_model.owner_id,
-            company_name=create_company_model.company_name,
-            is_public=create_company_model.is_public,
-            description=create_company_model.description,
-            registration_datetime=create_company_model.registration_datetime,
-            update_datetime=create_company_model.registration_datetime
+        created_company = await self.company_repository.insert(
+            values=dict(
+                owner_id=create_company_model.owner_id,
+                company_name=create_company_model.company_name,
+                is_public=create_company_model.is_public,
+                description=create_company_model.description,
+                registration_datetime=create_company_model.registration_datetime,
+                update_datetime=create_company_model.registration_datetime
+            ),
+            schema=CompanyResponse
         )
-        await self.db.execute(query)
-
-        company_query = select(Companies).where(Companies.company_name == create_company.company_name)
-        created_company = await self.db.fetch_one(company_query)
 
         member_create_request = CompanyMember(
             user_id=user.id,
-            company_id=created_company.__getitem__('id'),
+            company_id=created_company.id,
             status=ActionTypeEnum.IS_ADMIN
         )
 
@@ -110,11 +112,13 @@ class CompaniesService:
         update_data = update_company.dict(exclude_unset=True)
         update_data['update_datetime'] = datetime.now()
 
-        update_query = update(Companies).where(Companies.id == company_id).values(**update_data)
-        await self.db.execute(update_query)
+        updated_company = await self.company_repository.update(
+            where=Companies.id == company_id,
+            values=update_data,
+            schema=CompanyResponse
+        )
 
-        company_query = select(Companies).where(Companies.id == company_id)
-        updated_company = await self.db.fetch_one(company_query)
+        self.check_404_no_company(updated_company)
         return updated_company
 
     async def delete_company(self, user: UserResponse, company_id: int) -> None:
@@ -128,5 +132,12 @@ class CompaniesService:
         if user.id != company_response.owner_id:
             raise HTTPException(status_code=403, detail="You can't delete other users companies")
 
+        members_query = select(Members.user_id).where(Members.company_id == company_id)
+        members = await self.db.fetch_all(members_query)
+
         delete_query = delete(Companies).where(Companies.id == company_id)
         await self.db.execute(delete_query)
+
+        # Everyone who had a role in the company must stop seeing it
+        for user_id in {user.id, *(member.__getitem__('user_id') for member in members)}:
+            await PermissionService.invalidate(user_id=user_id)
@@ -1,18 +1,25 @@
 from asyncpg import UniqueViolationError
 from databases import Database
 from fastapi import HTTPException
-from sqlalchemy import select, delete, update
+from sqlalchemy import select, delete, and_
 from sqlalchemy.orm import selectinload
 
+from app.db.repository import Repository
 from app.models.models import Members, ActionTypeEnum, Companies, Users
 from app.schemas.company_actions_schemas import CompanyMember, CompanyActionList, CompanyActionRequest, \
     CompanyActionResponse, CompanyMemberList, InviteRequest
 from app.schemas.user_schemas import UserResponse
+from app.services.permission_service import PermissionService
+from app.services.precheck_service import PrecheckService
+from app.utils.company_roles import is_owner
 
 
 class CompanyActionsService:
     def __init__(self, db: Database):
         self.db = db
+        self.permission_service = PermissionService(db=db)
+        self.precheck_service = PrecheckService(db=db)
+        self.member_repository = Repository(db=db, model=Members)
 
     # Helper methods
     async def create_member(self, member_create_request: CompanyMember) -> None:
@@ -28,44 +35,38 @@ class CompanyActionsService:
             status=create_member_model.status
         )
         await self.db.execute(query)
-
-    async def check_company_owned(self, company_id: int, owner_id: int) -> None:
-        company_query = select(Companies).where(
-            Companies.id == company_id,
-            Companies.owner_id == owner_id
-        )
-        company = await self.db.fetch_one(company_query)
-
-        if not company:
-            raise HTTPException(status_code=403, detail="it's not your company")
+        await self.permission_service.invalidate(user_id=create_member_model.user_id)
 
     async def delete_user(self, company_id: int, user_id: int) -> None:
         user_delete_query = Members.__table__.delete().where(
             Members.user_id == user_id,
             Members.company_id == company_id,
-        )
-        result = await self.db.execute(user_delete_query)
+        ).returning(Members.id)
+        result = await self.db.fetch_val(user_delete_query)
 
-        if result == 0:
+        if result is None:
             raise HTTPException(status_code=404, detail='User not found in this company')
 
+        await self.permission_service.invalidate(user_id=user_id)
+
     async def check_user_exists(self, user_id: int):
         check_user_query = select(Users).where(Users.id == user_id)
         existing_user = await self.db.fetch_one(check_user_query)
         if not existing_user:
             raise HTTPException(status_code=404, detail='This user not found')
 
-    async def check_company_exists(self, company_id: int):
-        check_company_query = select(Companies).where(Companies.id == company_id)
-        existing_company = await self.db.fetch_one(check_company_query)
-        if not existing_company:
-            raise HTTPException(status_code=404, detail='This company not found')
+    async def check_company_owner(self, company_id: int, user_id: int) -> None:
+        await self.precheck_service.check_company_access(
+            company_id=company_id,
+            user_id=user_id,
+            role_check=is_owner,
+            forbidden_detail="it's not your company"
+        )
 
     # Main methods
     async def invite_user(self, payload: InviteRequest, current_user: UserResponse) -> CompanyActionRequest:
         await self.check_user_exists(user_id=payload.user_id)
-        await self.check_company_exists(company_id=payload.company_id)
-        await self.check_company_owned(company_id=payload.company_id, owner_id=current_user.id)
+        await self.check_company_owner(company_id=payload.company_id, user_id=current_user.id)
 
         if payload.user_id == current_user.id:
             raise HTTPException(status_code=403, detail="You can't invite yourself to your own company.")
@@ -126,8 +127,7 @@ class CompanyActionsService:
         )
 
     async def get_created_invitations_list_by_company(self, company_id: int, user: UserResponse) -> CompanyActionList:
-        await self.check_company_exists(company_id=company_id)
-        await self.check_company_owned(company_id=company_id, owner_id=user.id)
+        await self.check_company_owner(company_id=company_id, user_id=user.id)
 
         query = select(Members).join(Companies).where(
             Companies.owner_id == user.id,
@@ -183,8 +183,7 @@ class CompanyActionsService:
             statuses: list[ActionTypeEnum],
             user: UserResponse
     ) -> CompanyMemberList:
-        await self.check_company_exists(company_id=company_id)
-        await self.check_company_owned(company_id=company_id, owner_id=user.id)
+        await self.check_company_owner(company_id=company_id, user_id=user.id)
 
         members_query = select(Members).options(
             selectinload(Members.user)
@@ -223,17 +222,16 @@ class CompanyActionsService:
         if result.__getitem__('user_id') != user.id:
             raise HTTPException(status_code=400, detail="It is not your invite")
 
-        update_query = update(Members).values(status=ActionTypeEnum.IS_ACTIVE).where(Members.id == invite_id)
-        await self.db.execute(update_query)
-
-        updated_query = select(Members).where(Members.id == invite_id)
-        updated_result = await self.db.fetch_one(updated_query)
-
-        return CompanyMember(
-            user_id=updated_result.__getitem__('user_id'),
-            company_id=updated_result.__getitem__('company_id'),
-            status=updated_result.__getitem__('status')
+        updated_member = await self.member_repository.update(
+            where=Members.id == invite_id,
+            values=dict(status=ActionTypeEnum.IS_ACTIVE),
+            schema=CompanyMember
         )
+        if not updated_member:
+            raise HTTPException(status_code=404, detail='Invite not found')
+
+        await self.permission_service.invalidate(user_id=user.id)
+        return updated_member
 
     async def invite_decline(self, invite_id: int, user: UserResponse) -> None:
         query = select(Members).where(Members.id == invite_id, Members.status == ActionTypeEnum.INVITED)
@@ -334,8 +332,7 @@ class CompanyActionsService:
         )
 
     async def get_applies_for_your_company(self, company_id: int, user: UserResponse) -> CompanyActionList:
-        await self.check_company_exists(company_id=company_id)
-        await self.check_company_owned(company_id=company_id, owner_id=user.id)
+        await self.check_company_owner(company_id=company_id, user_id=user.id)
 
         query = select(Members).where(
             Members.company_id == company_id,
@@ -366,18 +363,17 @@ class CompanyActionsService:
         if not result:
             raise HTTPException(status_code=404, detail="Request not found")
 
-        update_query = update(Members).values(status=ActionTypeEnum.IS_ACTIVE).where(Members.id == apply_id)
-        await self.db.execute(update_query)
+        updated_apply = await self.member_repository.update(
+            where=Members.id == apply_id,
+            values=dict(status=ActionTypeEnum.IS_ACTIVE),
+            schema=CompanyActionResponse
+        )
 
-        query = select(Members).where(Members.id == apply_id)
-        result = await self.db.fetch_one(query)
+        if not updated_apply:
+            raise HTTPException(status_code=404, detail="Request not found")
 
-        return CompanyActionResponse(
-            id=result.__getitem__('id'),
-            user_id=result.__getitem__('user_id'),
-            company_id=result.__getitem__('company_id'),
-            status=result.__getitem__('status')
-        )
+        await self.permission_service.invalidate(user_id=updated_apply.user_id)
+        return updated_apply
 
     async def decline_apply(self, apply_id: int, current_user: UserResponse) -> None:
         query = select(Members).join(Companies).where(
@@ -394,18 +390,18 @@ class CompanyActionsService:
         await self.db.execute(delete_query)
 
     async def kick_company_member(self, member_id: int, company_id: int, current_user: UserResponse) -> None:
-        await self.check_company_exists(company_id=company_id)
-        await self.check_company_owned(company_id=company_id, owner_id=current_user.id)
+        await self.check_company_owner(company_id=company_id, user_id=current_user.id)
 
-        query = select(Members).where(
+        query = delete(Members).where(
             Members.user_id == member_id,
+            Members.company_id == company_id,
             Members.status.in_([ActionTypeEnum.IS_ACTIVE, ActionTypeEnum.IS_ADMIN])
-        )
-        result = await self.db.fetch_one(query)
-        if not result:
+        ).returning(Members.id)
+        result = await self.db.fetch_val(query)
+        if result is None:
             raise HTTPException(status_code=404, detail='No such user in the company')
 
-        await self.delete_user(company_id=company_id, user_id=member_id)
+        await self.permission_service.invalidate(user_id=member_id)
 
     async def leave_company(self, company_id: int, current_user: UserResponse) -> None:
         await self.delete_user(company_id=company_id, user_id=current_user.id)
@@ -417,27 +413,15 @@ class CompanyActionsService:
             status: ActionTypeEnum,
             current_user: UserResponse
     ) -> CompanyMember:
-        await self.check_company_exists(company_id=company_id)
-        await self.check_company_owned(company_id=company_id, owner_id=current_user.id)
+        await self.check_company_owner(company_id=company_id, user_id=current_user.id)
 
-        query = select(Members).where(
-            Members.user_id == member_id,
-            Members.company_id == company_id
+        updated_member = await self.member_repository.update(
+            where=and_(Members.user_id == member_id, Members.company_id == company_id),
+            values=dict(status=status),
+            schema=CompanyMember
         )
-        member = await self.db.fetch_one(query)
-        if not member:
+        if not updated_member:
             raise HTTPException(status_code=404, detail='User not found')
 
-        update_query = update(Members).values(status=status).where(
-            Members.user_id == member_id,
-            Members.company_id == company_id
-        )
-        await self.db.execute(update_query)
-
-        updated_member = await self.db.fetch_one(query)
-
-        return CompanyMember(
-            user_id=updated_member.__getitem__('user_id'),
-            company_id=updated_member.__getitem__('company_id'),
-            status=updated_member.__getitem__('status')
-        )
+        await self.permission_service.invalidate(user_id=member_id)
+        return updated_member
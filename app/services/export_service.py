@@ -0,0 +1,43 @@
+import os
+
+from databases import Database
+from fastapi import HTTPException
+
+from app.schemas.export_schemas import ExportJob, ExportJobFormat, ExportJobStatus
+from app.schemas.user_schemas import UserResponse
+from app.services.precheck_service import PrecheckService
+from app.utils.export_jobs import export_runner
+
+
+class ExportService:
+    def __init__(self, db: Database):
+        self.db = db
+        self.precheck_service = PrecheckService(db=db)
+
+    async def create_company_export(
+            self,
+            company_id: int,
+            export_format: ExportJobFormat,
+            user: UserResponse
+    ) -> ExportJob:
+        await self.precheck_service.check_company_access(company_id=company_id, user_id=user.id)
+
+        return await export_runner.submit(user_id=user.id, company_id=company_id, export_format=export_format)
+
+    @staticmethod
+    async def get_job(job_id: str, user: UserResponse) -> ExportJob:
+        job = await export_runner.get(job_id)
+        # Someone else's job is reported the same way as a missing one
+        if not job or job.user_id != user.id:
+            raise HTTPException(status_code=404, detail='No such export found')
+        return job
+
+    async def get_file_path(self, job_id: str, user: UserResponse) -> tuple[ExportJob, str]:
+        job = await self.get_job(job_id=job_id, user=user)
+        if job.status != ExportJobStatus.DONE:
+            raise HTTPException(status_code=409, detail=f'Export is {job.status.value}')
+
+        path = export_runner.get_path(job)
+        if not os.path.isfile(path):
+            raise HTTPException(status_code=404, detail='Export file has expired')
+        return job, path
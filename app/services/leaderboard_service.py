@@ -0,0 +1,83 @@
+from typing import NoReturn
+
+from databases import Database
+from fastapi import HTTPException
+from redis import RedisError
+
+from app.schemas.leaderboard_schemas import Leaderboard, LeaderboardEntry, LeaderboardType
+from app.schemas.user_schemas import UserResponse
+from app.services.precheck_service import PrecheckService
+from app.utils.company_roles import is_member
+from app.utils.leaderboard import leaderboard_store
+
+
+class LeaderboardService:
+    """Leaderboards are read from Redis only; Postgres is asked just for the caller's access."""
+
+    def __init__(self, db: Database):
+        self.db = db
+        self.precheck_service = PrecheckService(db=db)
+
+    # Helper methods
+    async def get_board_key(self, board: LeaderboardType, board_id: int, user: UserResponse) -> str:
+        """Key of the board, once the caller is known to be a member of its company."""
+        if board == LeaderboardType.COMPANY:
+            await self.precheck_service.check_company_access(
+                company_id=board_id,
+                user_id=user.id,
+                role_check=is_member,
+                forbidden_detail='Not a member of the company'
+            )
+            return leaderboard_store.get_company_key(board_id)
+
+        quiz = await self.precheck_service.check_quiz_access(
+            quiz_id=board_id,
+            user_id=user.id,
+            role_check=is_member,
+            forbidden_detail='Not a member of the company'
+        )
+        return leaderboard_store.get_quiz_key(quiz.__getitem__('company_id'), board_id)
+
+    @staticmethod
+    def raise_unavailable(error: RedisError) -> NoReturn:
+        raise HTTPException(
+            status_code=503,
+            detail='Leaderboards are temporarily unavailable',
+            headers={'Retry-After': '5'}
+        ) from error
+
+    # Main methods
+    async def get_top(self, board: LeaderboardType, board_id: int, limit: int, user: UserResponse) -> Leaderboard:
+        key = await self.get_board_key(board=board, board_id=board_id, user=user)
+        try:
+            return await leaderboard_store.get_top(key=key, limit=limit)
+        except RedisError as error:
+            self.raise_unavailable(error)
+
+    async def get_my_rank(self, board: LeaderboardType, board_id: int, user: UserResponse) -> LeaderboardEntry:
+        key = await self.get_board_key(board=board, board_id=board_id, user=user)
+        try:
+            entry = await leaderboard_store.get_rank(key=key, user_id=user.id)
+        except RedisError as error:
+            self.raise_unavailable(error)
+
+        if entry is None:
+            raise HTTPException(status_code=404, detail='You have no results on this leaderboard yet')
+        return entry
+
+    async def get_around_me(
+            self,
+            board: LeaderboardType,
+            board_id: int,
+            radius: int,
+            user: UserResponse
+    ) -> Leaderboard:
+        key = await self.get_board_key(board=board, board_id=board_id, user=user)
+        try:
+            result = await leaderboard_store.get_around(key=key, user_id=user.id, radius=radius)
+        except RedisError as error:
+            self.raise_unavailable(error)
+
+        if result is None:
+            raise HTTPException(status_code=404, detail='You have no results on this leaderboard yet')
+        return result
@@ -2,25 +2,22 @@ from datetime import datetime, date
 
 from databases import Database
 from fastapi import HTTPException
-from sqlalchemy import select, insert, desc, update, delete, func
+from sqlalchemy import select, insert, desc, delete, func
 
+from app.db.repository import Repository
 from app.models.models import Members, Notifications, Users, QuizResults, Quizzes
 from app.schemas.notifications import Notification, NotificationList, NotificationCreate
 from app.schemas.user_schemas import UserResponse
+from app.services.permission_service import PermissionService
 
 
 class NotificationsService:
     def __init__(self, db: Database):
         self.db = db
+        self.permission_service = PermissionService(db=db)
+        self.notification_repository = Repository(db=db, model=Notifications)
 
     # Helper methods
-    async def check_if_admin(self, member_id: int) -> None:
-        query = select(Members).where(Members.user_id == member_id)
-        result = await self.db.fetch_one(query)
-
-        if not result:
-            raise HTTPException(status_code=403, detail='You must be an admin to do this')
-
     async def check_user_exists(self, user_id: int):
         check_user_query = select(Users).where(Users.id == user_id)
         existing_user = await self.db.fetch_one(check_user_query)
@@ -66,54 +63,45 @@ class NotificationsService:
         if not result.__getitem__('user_id') == current_user.id:
             raise HTTPException(status_code=403, detail='You can modify only your notifications')
 
-        query = update(Notifications).where(Notifications.id == notification_id).values(is_read=True)
-        await self.db.execute(query)
-
-        updated_notification = await self.db.fetch_one(select(Notifications).where(Notifications.id == notification_id))
-        return Notification(
-            id=updated_notification.__getitem__('id'),
-            user_id=updated_notification.__getitem__('user_id'),
-            message=updated_notification.__getitem__('message'),
-            is_read=updated_notification.__getitem__('is_read'),
-            created_at=updated_notification.__getitem__('created_at')
+        updated_notification = await self.notification_repository.update(
+            where=Notifications.id == notification_id,
+            values=dict(is_read=True),
+            schema=Notification
         )
 
+        if not updated_notification:
+            raise HTTPException(status_code=404, detail='No such notification found')
+        return updated_notification
+
     async def get_users_notifications(self, user_id: int, current_user: UserResponse) -> NotificationList:
-        await self.check_if_admin(member_id=current_user.id)
+        await self.permission_service.check_is_admin_anywhere(user_id=current_user.id)
         await self.check_user_exists(user_id=user_id)
 
         result = await self.get_notifications(user_id=user_id)
         return result
 
     async def create_notification(self, data: NotificationCreate) -> Notification:
-        create_query = Notifications.__table__.insert().values(
-            user_id=data.user_id,
-            message=data.message,
-            is_read=False,
-            created_at=datetime.utcnow()
+        result = await self.notification_repository.insert(
+            values=dict(
+                user_id=data.user_id,
+                message=data.message,
+                is_read=False,
+                created_at=datetime.utcnow()
+            ),
+            schema=Notification
         )
-        create_result = await self.db.execute(create_query)
-
-        query = select(Notifications).where(Notifications.id == create_result)
-        result = await self.db.fetch_one(query)
 
-        return Notification(
-            id=result.__getitem__('id'),
-            user_id=result.__getitem__('user_id'),
-            message=result.__getitem__('message'),
-            is_read=result.__getitem__('is_read'),
-            created_at=result.__getitem__('created_at')
-        )
+        return result
 
     async def create_notification_by_admin(self, data: NotificationCreate, current_user: UserResponse) -> Notification:
         await self.check_user_exists(user_id=data.user_id)
-        await self.check_if_admin(member_id=current_user.id)
+        await self.permission_service.check_is_admin_anywhere(user_id=current_user.id)
 
         result = await self.create_notification(data=data)
         return result
 
     async def delete_notification(self, notification_id: int, current_user: UserResponse) -> None:
-        await self.check_if_admin(member_id=current_user.id)
+        await self.permission_service.check_is_admin_anywhere(user_id=current_user.id)
 
         query = delete(Notifications).where(Notifications.id == notification_id)
         result = await self.db.execute(query)
@@ -156,5 +144,5 @@ class NotificationsService:
                 await self.create_notification(data=notification)
 
     async def create_notifications_for_quiz_cooldowns_by_admin(self, current_user: UserResponse):
-        await self.check_if_admin(member_id=current_user.id)
+        await self.permission_service.check_is_admin_anywhere(user_id=current_user.id)
         await self.create_notifications_for_quiz_cooldowns()
\ No newline at end of file
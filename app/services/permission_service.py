@@ -0,0 +1,121 @@
+import json
+from typing import Optional
+
+from databases import Database
+from fastapi import HTTPException
+from redis import RedisError
+from sqlalchemy import select, and_, or_
+
+from app.db.connections import redis_conn
+from app.models.models import Companies, Members
+from app.utils.company_roles import encode_role, get_request_roles, set_request_roles, drop_request_roles, is_admin
+from app.utils.token_epoch import get_token_epoch, bump_token_epoch, get_token_epoch_key
+from system_config import system_config
+
+
+class PermissionService:
+    """
+    Single place for company roles: every check of a caller's role, PrecheckService's included, goes through it.
+
+    A user's company roles are loaded once per request and shared by every check and service in it.
+    Between requests they are cached in Redis, tagged with the user's token epoch:
+    any membership change bumps the epoch, which makes the cached roles stale.
+    """
+
+    def __init__(self, db: Database):
+        self.db = db
+
+    @staticmethod
+    def get_roles_key(user_id: int) -> str:
+        return f'company_roles:{user_id}'
+
+    # Helper methods
+    async def load_company_roles(self, user_id: int) -> dict[int, str]:
+        query = select(Companies.id, Companies.owner_id, Members.status).select_from(
+            Companies.__table__.outerjoin(
+                Members.__table__,
+                and_(Members.company_id == Companies.id, Members.user_id == user_id)
+            )
+        ).where(or_(Companies.owner_id == user_id, Members.user_id == user_id))
+        rows = await self.db.fetch_all(query)
+
+        roles = {}
+        for row in rows:
+            role = encode_role(
+                is_owner=row.__getitem__('owner_id') == user_id,
+                status=row.__getitem__('status')
+            )
+            if role:
+                roles[row.__getitem__('id')] = role
+        return roles
+
+    async def get_cached_roles(self, user_id: int) -> tuple[Optional[dict[int, str]], Optional[int]]:
+        try:
+            pipe = redis_conn.pipeline(transaction=False)
+            pipe.get(get_token_epoch_key(user_id))
+            pipe.get(self.get_roles_key(user_id))
+            epoch, cached = await pipe.execute()
+        except RedisError:
+            return None, None
+
+        epoch = int(epoch) if epoch else 0
+        if not cached:
+            return None, epoch
+
+        cached = json.loads(cached)
+        if cached['epoch'] != epoch:
+            return None, epoch
+
+        return {int(company_id): role for company_id, role in cached['roles'].items()}, epoch
+
+    async def cache_roles(self, user_id: int, roles: dict[int, str], epoch: int) -> None:
+        try:
+            await redis_conn.set(
+                self.get_roles_key(user_id),
+                json.dumps({'epoch': epoch, 'roles': roles}),
+                ex=system_config.role_cache_ttl
+            )
+        except RedisError:
+            pass
+
+    # Main methods
+    async def get_company_roles_with_epoch(self, user_id: int) -> tuple[dict[int, str], Optional[int]]:
+        # The epoch is read before the roles are loaded, so cached roles can only be newer than their tag
+        roles, epoch = await self.get_cached_roles(user_id=user_id)
+
+        if roles is None:
+            roles = await self.load_company_roles(user_id=user_id)
+            if epoch is not None:
+                await self.cache_roles(user_id=user_id, roles=roles, epoch=epoch)
+
+        set_request_roles(user_id=user_id, roles=roles)
+        return roles, epoch
+
+    async def get_company_roles(self, user_id: int) -> dict[int, str]:
+        roles = get_request_roles(user_id=user_id)
+        if roles is None:
+            roles, _ = await self.get_company_roles_with_epoch(user_id=user_id)
+        return roles
+
+    async def get_company_role(self, user_id: int, company_id: int) -> str:
+        roles = await self.get_company_roles(user_id=user_id)
+        return roles.get(company_id, '')
+
+    async def check_is_admin(
+            self,
+            company_id: int,
+            user_id: int,
+            detail: str = 'You must be admin in this company to do this'
+    ) -> None:
+        if not is_admin(await self.get_company_role(user_id=user_id, company_id=company_id)):
+            raise HTTPException(status_code=403, detail=detail)
+
+    async def check_is_admin_anywhere(self, user_id: int, detail: str = 'You must be an admin to do this') -> None:
+        roles = await self.get_company_roles(user_id=user_id)
+        if not any(is_admin(role) for role in roles.values()):
+            raise HTTPException(status_code=403, detail=detail)
+
+    @staticmethod
+    async def invalidate(user_id: int) -> None:
+        drop_request_roles(user_id=user_id)
+        await bump_token_epoch(user_id=user_id)
@@ -1,25 +1,38 @@
-import json
-from datetime import date
+from datetime import date, timedelta
+from typing import AsyncIterator, Optional, Union
 
 from databases import Database
 from databases.interfaces import Record
 from fastapi import HTTPException
-from sqlalchemy import select, delete, update, insert, func, and_
+from sqlalchemy import select, delete, update, insert, func, and_, cast, literal_column, Text
+from sqlalchemy.dialects.postgresql import aggregate_order_by
 
-from app.db.connections import redis_conn
-from app.models.models import Companies, Members, ActionTypeEnum, Quizzes, QuizQuestions, QuizResults, Users
+from app.db.replica import ReplicaRouter
+from app.db.repository import Repository
+from app.models.models import Companies, Members, ActionTypeEnum, Quizzes, QuizQuestions, QuizResults, Users, \
+    QuizUserSummary
 from app.schemas.notifications import NotificationCreate
 from app.schemas.quiz_schemas import QuizResponse, QuizList, QuizRequest, QuizUpdateRequest, QuestionResponseList, \
-    QuestionResponse, QuestionRequest, QuestionUpdate, TakenQuizStats, Rating, QuestionUserResponseList, \
-    QuestionUserResponse, TestResults, RedisQuizResults
+    QuestionResponse, QuestionRequest, QuestionUpdate, Rating
 from app.schemas.user_schemas import UserResponse
 from app.services.notifications_service import NotificationsService
-from app.utils.csv_writer import write_to_csv
+from app.services.precheck_service import PrecheckService
+from app.services.quiz_submission_service import QuizSubmissionService
+from app.utils.company_roles import is_member
+from app.utils.cooldown_gate import cooldown_gate
+from app.utils.quiz_answer_store import quiz_answer_store
+from app.utils.quiz_content_cache import quiz_content_cache
+from app.utils.http_cache import ConditionalGet
 
 
 class QuizService:
-    def __init__(self, db: Database):
+    def __init__(self, db: Database, read_db: Optional[Union[ReplicaRouter, Database]] = None):
         self.db = db
+        # Ratings tolerate replica lag, everything else reads its own writes from the primary
+        self.read_db = read_db or db
+        self.precheck_service = PrecheckService(db=db)
+        self.quiz_repository = Repository(db=db, model=Quizzes)
+        self.question_repository = Repository(db=db, model=QuizQuestions)
 
     async def check_company_exists(self, company_id: int) -> None:
         check_company_query = select(Companies).where(Companies.id == company_id)
@@ -43,41 +56,63 @@ class QuizService:
 
         return result
 
-    async def check_question_exists(self, question_id: int) -> Record:
-        query = select(QuizQuestions).where(QuizQuestions.id == question_id)
-        result = await self.db.fetch_one(query)
-
-        if not result:
-            raise HTTPException(status_code=404, detail='No such question found')
-
-        return result
-
-    async def check_is_admin(self, company_id: int, member_id: int) -> None:
-        admin_query = select(Members).where(
-            Members.company_id == company_id,
-            Members.user_id == member_id,
-            Members.status == ActionTypeEnum.IS_ADMIN
-        )
-        admin = await self.db.fetch_one(admin_query)
-
-        if not admin:
-            raise HTTPException(status_code=403, detail="You must be admin in this company to do this")
-
-    async def check_is_member(self, company_id: int, member_id: int) -> None:
-        admin_query = select(Members).where(
-            Members.company_id == company_id,
-            Members.user_id == member_id,
-            Members.status.in_([ActionTypeEnum.IS_ADMIN, ActionTypeEnum.IS_ACTIVE])
-        )
-        member = await self.db.fetch_one(admin_query)
+    # Content hash
+    @staticmethod
+    def get_content_hash():
+        """md5 of everything the quiz and question endpoints render, computed in the UPDATE itself."""
+        questions = select(
+            func.coalesce(
+                func.json_agg(aggregate_order_by(
+                    func.json_build_array(
+                        QuizQuestions.id,
+                        QuizQuestions.name,
+                        QuizQuestions.answer_variants,
+                        QuizQuestions.right_answer
+                    ),
+                    QuizQuestions.id
+                )),
+                literal_column("'[]'::json")
+            )
+        ).where(QuizQuestions.quiz_id == Quizzes.id).scalar_subquery()
+
+        return func.md5(cast(
+            func.json_build_array(
+                Quizzes.company_id,
+                Quizzes.name,
+                Quizzes.description,
+                Quizzes.cooldown_in_days,
+                questions
+            ),
+            Text
+        ))
+
+    async def refresh_content(self, *quiz_ids: int, bump_version: bool = True) -> None:
+        """
+        Bumps content_version and recomputes content_hash.
+        Call after the change itself, in the same transaction: a reader that sees the new version sees the change.
+        """
+        values = {'content_hash': self.get_content_hash()}
+        if bump_version:
+            values['content_version'] = Quizzes.content_version + 1
+
+        query = update(Quizzes).where(Quizzes.id.in_(quiz_ids)).values(**values)
+        await self.db.execute(query)
 
-        if not member:
-            raise HTTPException(status_code=403, detail="Not a member of the company")
+    @staticmethod
+    def get_etag_hash(quiz: Record) -> str:
+        # Rows written before content_hash existed and not migrated yet
+        return quiz.__getitem__('content_hash') or f"{quiz.__getitem__('id')}.{quiz.__getitem__('content_version')}"
 
     # Quizzes
-    async def get_quizzes_by_company(self, company_id: int, user: UserResponse) -> QuizList:
-        await self.check_company_exists(company_id=company_id)
-        await self.check_is_admin(company_id=company_id, member_id=user.id)
+    async def get_quizzes_by_company(
+            self,
+            company_id: int,
+            user: UserResponse,
+            conditional_get: Optional[ConditionalGet] = None
+    ) -> QuizList:
+        await self.precheck_service.check_company_access(company_id=company_id, user_id=user.id)
+        if conditional_get:
+            conditional_get.check(content_hash=await self.get_company_quizzes_hash(company_id=company_id))
 
         query = select(Quizzes).where(Quizzes.company_id == company_id)
         quizzes = await self.db.fetch_all(query)
@@ -87,6 +122,17 @@ class QuizService:
             quizzes=[QuizResponse(**dict(item)) for item in quizzes]
         )
 
+    async def get_company_quizzes_hash(self, company_id: int) -> str:
+        # One row of aggregates instead of the list itself; changes whenever a quiz is added, removed or changed
+        query = select(func.md5(func.coalesce(
+            func.string_agg(
+                func.concat_ws(':', Quizzes.id, Quizzes.content_version, Quizzes.content_hash),
+                aggregate_order_by(literal_column("','"), Quizzes.id)
+            ),
+            ''
+        ))).where(Quizzes.company_id == company_id)
+        return await self.db.fetch_val(query)
+
     async def create_notifications_for_users(self, quiz_data: QuizRequest, current_user: UserResponse) -> None:
         users_query = select(Members.user_id).where(
             Members.company_id == quiz_data.company_id,
@@ -104,88 +150,123 @@ class QuizService:
             await notifications_service.create_notification(data=notification)
 
     async def create_quiz(self, quiz_data: QuizRequest, user: UserResponse) -> QuizResponse:
-        await self.check_company_exists(company_id=quiz_data.company_id)
-        await self.check_is_admin(company_id=quiz_data.company_id, member_id=user.id)
-
-        query = Quizzes.__table__.insert().values(
-            company_id=quiz_data.company_id,
-            name=quiz_data.name,
-            description=quiz_data.description,
-            cooldown_in_days=quiz_data.cooldown_in_days
-        )
-
-        await self.db.execute(query)
-
-        result_query = select(Quizzes).where(
-            Quizzes.company_id == quiz_data.company_id,
-            Quizzes.name == quiz_data.name,
-            Quizzes.description == quiz_data.description,
-        )
-        result = await self.db.fetch_one(result_query)
+        await self.precheck_service.check_company_access(company_id=quiz_data.company_id, user_id=user.id)
+
+        async with self.db.transaction():
+            result = await self.quiz_repository.insert(
+                values=dict(
+                    company_id=quiz_data.company_id,
+                    name=quiz_data.name,
+                    description=quiz_data.description,
+                    cooldown_in_days=quiz_data.cooldown_in_days
+                ),
+                schema=QuizResponse
+            )
+            await self.refresh_content(result.id, bump_version=False)
 
         await self.create_notifications_for_users(quiz_data=quiz_data, current_user=user)
 
         return result
 
     async def update_quiz(self, quiz_id: int, quiz_data: QuizUpdateRequest, user: UserResponse) -> QuizResponse:
-        quiz_check_result = await self.check_quiz_exists(quiz_id=quiz_id)
-        await self.check_company_exists(company_id=quiz_check_result.__getitem__('company_id'))
-        await self.check_is_admin(company_id=quiz_check_result.__getitem__('company_id'), member_id=user.id)
+        quiz = await self.precheck_service.check_quiz_access(quiz_id=quiz_id, user_id=user.id)
 
         update_data = quiz_data.dict(exclude_unset=True)
-        update_query = update(Quizzes).where(Quizzes.id == quiz_id).values(**update_data)
-        await self.db.execute(update_query)
+        async with self.db.transaction():
+            updated_quiz = await self.quiz_repository.update(
+                where=Quizzes.id == quiz_id,
+                values={**update_data, 'content_version': Quizzes.content_version + 1},
+                schema=QuizResponse
+            )
 
-        updated_quiz_query = select(Quizzes).where(Quizzes.id == quiz_id)
-        updated_quiz = await self.db.fetch_one(updated_quiz_query)
+            if not updated_quiz:
+                raise HTTPException(status_code=404, detail='No such quiz found')
+            # A separate statement: within the UPDATE above the hash would see the old column values
+            await self.refresh_content(quiz_id, bump_version=False)
+
+        old_cooldown = quiz.__getitem__('cooldown_in_days')
+        if updated_quiz.cooldown_in_days != old_cooldown:
+            await self.update_cooldown_gates(
+                quiz_id=quiz_id,
+                old_cooldown=old_cooldown,
+                new_cooldown=updated_quiz.cooldown_in_days
+            )
         return updated_quiz
 
+    async def update_cooldown_gates(self, quiz_id: int, old_cooldown: Optional[int], new_cooldown: Optional[int]) -> None:
+        # Only users gated under the old or the new cooldown need their gate moved
+        window = max(old_cooldown or 0, new_cooldown or 0)
+        if not window:
+            return
+
+        query = select(
+            QuizResults.user_id,
+            func.max(QuizResults.date_of_quiz).label('last_date')
+        ).where(
+            QuizResults.quiz_id == quiz_id,
+            QuizResults.date_of_quiz > date.today() - timedelta(days=window)
+        ).group_by(QuizResults.user_id)
+        rows = await self.db.fetch_all(query)
+
+        await cooldown_gate.rebuild_many(
+            quiz_id=quiz_id,
+            last_dates=[(row.__getitem__('user_id'), row.__getitem__('last_date')) for row in rows],
+            cooldown_in_days=new_cooldown or 0
+        )
+
     async def delete_company_quiz(self, quiz_id: int, company_id: int, user: UserResponse) -> None:
-        await self.check_company_exists(company_id=company_id)
-        await self.check_is_admin(company_id=company_id, member_id=user.id)
+        await self.precheck_service.check_company_access(company_id=company_id, user_id=user.id)
 
-        query = delete(Quizzes).where(Quizzes.id == quiz_id)
-        result = self.db.execute(query)
+        query = delete(Quizzes).where(
+            Quizzes.id == quiz_id,
+            Quizzes.company_id == company_id
+        ).returning(Quizzes.id)
+        result = await self.db.fetch_val(query)
 
-        if result == 0:
+        if result is None:
             raise HTTPException(status_code=404, detail='No such quiz found')
 
     # Questions
-    async def get_quiz_questions(self, quiz_id: int, user: UserResponse) -> QuestionResponseList:
-        quiz_check_result = await self.check_quiz_exists(quiz_id=quiz_id)
-        await self.check_is_admin(company_id=quiz_check_result.__getitem__('company_id'), member_id=user.id)
-
-        query = select(QuizQuestions).where(QuizQuestions.quiz_id == quiz_id)
-        result = await self.db.fetch_all(query)
+    async def get_quiz_questions(
+            self,
+            quiz_id: int,
+            user: UserResponse,
+            conditional_get: Optional[ConditionalGet] = None
+    ) -> QuestionResponseList:
+        quiz = await self.precheck_service.check_quiz_access(quiz_id=quiz_id, user_id=user.id)
+        if conditional_get:
+            conditional_get.check(content_hash=self.get_etag_hash(quiz))
+
+        content = await quiz_content_cache.get(
+            db=self.db,
+            quiz_id=quiz_id,
+            version=quiz.__getitem__('content_version')
+        )
 
         return QuestionResponseList(
-            total=len(result),
-            question_list=[QuestionResponse(**dict(question)) for question in result]
+            total=len(content.questions),
+            question_list=[QuestionResponse(**question) for question in content.questions]
         )
 
     async def create_question(self, quiz_id: int, question: QuestionRequest, user: UserResponse) -> QuestionResponse:
-        quiz_check_result = await self.check_quiz_exists(quiz_id=quiz_id)
-        await self.check_is_admin(company_id=quiz_check_result.__getitem__('company_id'), member_id=user.id)
-
-        query = QuizQuestions.__table__.insert().values(
-            quiz_id=question.quiz_id,
-            name=question.name,
-            answer_variants=question.answer_variants,
-            right_answer=question.right_answer
-        )
-        await self.db.execute(query)
-
-        result_query = select(QuizQuestions).where(QuizQuestions.quiz_id == quiz_id)
-        result = await self.db.fetch_one(result_query)
+        await self.precheck_service.check_quiz_access(quiz_id=quiz_id, user_id=user.id)
+
+        async with self.db.transaction():
+            result = await self.question_repository.insert(
+                values=dict(
+                    quiz_id=quiz_id,
+                    name=question.name,
+                    answer_variants=question.answer_variants,
+                    right_answer=question.right_answer
+                ),
+                schema=QuestionResponse
+            )
+            await self.refresh_content(quiz_id)
 
         return result
 
-    async def check_question_for_modification(self, question_id: int, user_id: int) -> None:
-        question_check_result = await self.check_question_exists(question_id)
-
-        quiz_query = select(Quizzes).where(Quizzes.id == question_check_result.__getitem__('quiz_id'))
-        quiz_result = await self.db.fetch_one(quiz_query)
-        await self.check_is_admin(company_id=quiz_result.__getitem__('company_id'), member_id=user_id)
+    async def check_question_for_modification(self, question_id: int, user_id: int) -> Record:
+        return await self.precheck_service.check_question_access(question_id=question_id, user_id=user_id)
 
     async def update_question(
             self,
@@ -193,200 +274,98 @@ class QuizService:
             question_data: QuestionUpdate,
             user: UserResponse
     ) -> QuestionResponse:
-        await self.check_question_for_modification(question_id=question_id, user_id=user.id)
+        question = await self.check_question_for_modification(question_id=question_id, user_id=user.id)
+        quiz_ids = {question.__getitem__('quiz_id')}
 
         update_data = question_data.dict(exclude_unset=True)
-        update_query = update(QuizQuestions).where(QuizQuestions.id == question_id).values(**update_data)
-        await self.db.execute(update_query)
+        if update_data.get('quiz_id') is not None and update_data['quiz_id'] not in quiz_ids:
+            # Moving a question needs admin rights in the target quiz's company too
+            await self.precheck_service.check_quiz_access(quiz_id=update_data['quiz_id'], user_id=user.id)
+            quiz_ids.add(update_data['quiz_id'])
+
+        async with self.db.transaction():
+            updated_question = await self.question_repository.update(
+                where=QuizQuestions.id == question_id,
+                values=update_data,
+                schema=QuestionResponse
+            )
 
-        updated_quiz_query = select(QuizQuestions).where(QuizQuestions.id == question_id)
-        updated_quiz = await self.db.fetch_one(updated_quiz_query)
-        return updated_quiz
+            if not updated_question:
+                raise HTTPException(status_code=404, detail='No such question found')
+            await self.refresh_content(*quiz_ids)
+
+        return updated_question
 
     async def delete_question(self, question_id: int, user: UserResponse) -> None:
         await self.check_question_for_modification(question_id=question_id, user_id=user.id)
 
-        query = delete(QuizQuestions).where(QuizQuestions.id == question_id)
-        result = await self.db.execute(query)
+        async with self.db.transaction():
+            query = delete(QuizQuestions).where(QuizQuestions.id == question_id).returning(QuizQuestions.quiz_id)
+            quiz_id = await self.db.fetch_val(query)
 
-        if result == 0:
-            raise HTTPException(status_code=404, detail='No such question found')
+            if quiz_id is None:
+                raise HTTPException(status_code=404, detail='No such question found')
+            await self.refresh_content(quiz_id)
 
     # Quiz workflow
 
-    async def get_previous_result(self, quiz_id: int, user_id: int) -> Record:
-        quiz_results_query = select(QuizResults).where(
-            QuizResults.quiz_id == quiz_id,
-            QuizResults.user_id == user_id
-        ).order_by(QuizResults.id.desc())
-        previous_quiz_result = await self.db.fetch_one(query=quiz_results_query)
-
-        return previous_quiz_result
-
-    async def check_quiz_cooldown(self, quiz_id: int, user_id: int) -> None:
-        previous_quiz_result = await self.get_previous_result(quiz_id=quiz_id, user_id=user_id)
-        quiz_cooldown_query = select(Quizzes.cooldown_in_days).where(Quizzes.id == quiz_id)
-        quiz_cooldown_query_result = await self.db.fetch_one(quiz_cooldown_query)
-        quiz_cooldown = quiz_cooldown_query_result.__getitem__('cooldown_in_days')
-
-        today = date.today()
-        if previous_quiz_result:
-            days_since_last_attempt = (today - previous_quiz_result.__getitem__('date_of_quiz')).days
-
-            if days_since_last_attempt < quiz_cooldown:
-                raise HTTPException(
-                    status_code=403,
-                    detail=f'You must wait for {quiz_cooldown} days since last attempt'
-                )
-
-    async def get_question_list_user(self, quiz_id, user: UserResponse) -> QuestionUserResponseList:
-        quiz_check_result = await self.check_quiz_exists(quiz_id=quiz_id)
-        await self.check_is_member(company_id=quiz_check_result.__getitem__('company_id'), member_id=user.id)
-        await self.check_quiz_cooldown(quiz_id=quiz_id, user_id=user.id)
-
-        query = select(QuizQuestions).where(QuizQuestions.quiz_id == quiz_id)
-        result = await self.db.fetch_all(query)
-
-        return QuestionUserResponseList(
-            total=len(result),
-            question_list=[QuestionUserResponse(**dict(question)) for question in result]
-        )
-
-    async def get_taken_quiz_statistics(self, quiz_id: int, quiz_answers: TestResults) -> TakenQuizStats:
-        query = select(QuizQuestions).where(QuizQuestions.quiz_id == quiz_id)
-        results = await self.db.fetch_all(query)
-
-        quiz_correct_answers = [question.__getitem__('right_answer') for question in results]
-        quiz_actual_answers = [answer for answer in quiz_answers.results]
-
-        total = 0
-        for item in zip(quiz_correct_answers, quiz_actual_answers):
-            if item[0] == item[1]:
-                total += 1
-
-        return TakenQuizStats(
-            questions_total=len(results),
-            right_answers=total,
-            taken_on_day=date.today()
-        )
-
-    async def redis_set_quiz_data(
+    async def get_question_list_user(
             self,
-            user_id: int,
-            company_id: int,
-            quiz_id: int,
-            quiz_answers: TestResults
-    ) -> None:
-        query = select(QuizQuestions).where(QuizQuestions.quiz_id == quiz_id)
-        results = await self.db.fetch_all(query)
-
-        quiz_correct_answers = [question.__getitem__('right_answer') for question in results]
-        quiz_actual_answers = [answer for answer in quiz_answers.results]
-
-        if len(quiz_actual_answers) != len(quiz_actual_answers):
-            raise HTTPException(status_code=422, detail='Quantity of answers must be equal to that of questions.')
-
-        redis_key = f'{user_id}-{company_id}-{quiz_id}'
-        redis_value = []
-
-        for i, question in enumerate(results):
-            question_text = question.__getitem__('name')
-            user_answer = question.__getitem__('answer_variants')[quiz_actual_answers[i]]
-            is_correct = 'correct' if quiz_actual_answers[i] == quiz_correct_answers[i] else 'incorrect'
-
-            quiz_question = {
-                'question_text': question_text,
-                'user_answer': user_answer,
-                'is_correct': is_correct
-            }
-
-            redis_value.append(quiz_question)
-
-        redis_conn.set(redis_key, json.dumps(redis_value), ex=3600 * 48)
-
-    async def save_quiz_result(self, quiz_id: int, quiz_answers: TestResults, user: UserResponse) -> TakenQuizStats:
-        # Check company
-        quiz_company_query = select(Companies).where(
-            Companies.id == select(Quizzes.company_id).where(Quizzes.id == quiz_id)
-        )
-        company = await self.db.fetch_one(query=quiz_company_query)
-
-        await self.check_company_exists(company_id=company.__getitem__('id'))
-        await self.check_is_member(company_id=company.__getitem__('id'), member_id=user.id)
-
-        # Check if previous result
-        previous_quiz_result = await self.get_previous_result(quiz_id=quiz_id, user_id=user.id)
-
-        if previous_quiz_result:
-            await self.check_quiz_cooldown(quiz_id=quiz_id, user_id=user.id)
-
-        # Main logic
-        await self.redis_set_quiz_data(
-            user_id=user.id,
-            company_id=company.__getitem__('id'),
+            quiz_id,
+            user: UserResponse,
+            conditional_get: Optional[ConditionalGet] = None
+    ) -> bytes:
+        """Returns QuestionUserResponseList already rendered to JSON."""
+        quiz = await self.precheck_service.check_quiz_access(
             quiz_id=quiz_id,
-            quiz_answers=quiz_answers
+            user_id=user.id,
+            role_check=is_member,
+            forbidden_detail='Not a member of the company'
         )
 
-        quiz_data = await self.get_taken_quiz_statistics(quiz_id=quiz_id, quiz_answers=quiz_answers)
-
-        summary_questions_total = (
-                previous_quiz_result.__getitem__('summary_questions_total') + quiz_data.questions_total
-        ) if previous_quiz_result else quiz_data.questions_total
-
-        summary_correct_answers = (
-                previous_quiz_result.__getitem__('summary_correct_answers') + quiz_data.right_answers
-        ) if previous_quiz_result else quiz_data.right_answers
-
-        quiz_result = QuizResults(
-            user_id=user.id,
-            company_id=company.__getitem__('id'),
+        quiz_submission_service = QuizSubmissionService(db=self.db)
+        await quiz_submission_service.check_cooldown_gate(
             quiz_id=quiz_id,
-
-            quiz_questions_total=quiz_data.questions_total,
-            quiz_correct_answers=quiz_data.right_answers,
-            quiz_correct_answers_percentage=round((quiz_data.right_answers / quiz_data.questions_total * 100), 2),
-
-            summary_questions_total=summary_questions_total,
-            summary_correct_answers=summary_correct_answers,
-            summary_correct_answers_percentage=round((summary_correct_answers / summary_questions_total * 100), 2),
-
-            date_of_quiz=quiz_data.taken_on_day,
+            user_id=user.id,
+            cooldown_in_days=quiz.__getitem__('cooldown_in_days')
         )
+        if conditional_get:
+            conditional_get.check(content_hash=self.get_etag_hash(quiz))
 
-        # У меня датабейзы нормально работают с явным определением полей. Поэтому так длинно :(
-        query = QuizResults.__table__.insert().values(
-            user_id=quiz_result.user_id,
-            company_id=quiz_result.company_id,
-            quiz_id=quiz_result.quiz_id,
-
-            quiz_questions_total=quiz_result.quiz_questions_total,
-            quiz_correct_answers=quiz_result.quiz_correct_answers,
-            quiz_correct_answers_percentage=quiz_result.quiz_correct_answers_percentage,
-
-            summary_questions_total=quiz_result.summary_questions_total,
-            summary_correct_answers=quiz_result.summary_correct_answers,
-            summary_correct_answers_percentage=quiz_result.summary_correct_answers_percentage,
-
-            date_of_quiz=quiz_result.date_of_quiz,
+        content = await quiz_content_cache.get(
+            db=self.db,
+            quiz_id=quiz_id,
+            version=quiz.__getitem__('content_version')
         )
-        await self.db.execute(query)
+        return content.user_payload
+
+    async def get_summary_rating(self, *where) -> Rating:
+        query = select(
+            func.count().label('quizzes'),
+            func.sum(QuizUserSummary.summary_questions_total).label('total_answers'),
+            func.sum(QuizUserSummary.summary_correct_answers).label('right_answers'),
+            func.avg(QuizUserSummary.summary_correct_answers_percentage).label('rating_percent')
+        ).where(*where)
+        result = await self.read_db.fetch_one(query)
+
+        if not result.__getitem__('quizzes'):
+            raise HTTPException(status_code=404, detail='No such quizzes found')
 
-        return TakenQuizStats(
-            questions_total=quiz_data.questions_total,
-            right_answers=quiz_data.right_answers,
-            taken_on_day=quiz_data.taken_on_day
+        return Rating(
+            total_answers=result.__getitem__('total_answers'),
+            right_answers=result.__getitem__('right_answers'),
+            rating_percent=round(result.__getitem__('rating_percent'), 2)
         )
 
     async def get_rating_by_quiz(self, quiz_id: int, user_id: int) -> Rating:
         await self.check_quiz_exists(quiz_id=quiz_id)
         await self.check_user_exists(user_id=user_id)
 
-        query = select(QuizResults).where(
-            QuizResults.quiz_id == quiz_id,
-            QuizResults.user_id == user_id
-        ).order_by(QuizResults.id.desc())
-        result = await self.db.fetch_one(query)
+        query = select(QuizUserSummary).where(
+            QuizUserSummary.user_id == user_id,
+            QuizUserSummary.quiz_id == quiz_id
+        )
+        result = await self.read_db.fetch_one(query)
 
         if not result:
             raise HTTPException(status_code=404, detail='No such quiz found')
@@ -401,137 +380,43 @@ class QuizService:
         await self.check_company_exists(company_id=company_id)
         await self.check_user_exists(user_id=user_id)
 
-        subquery = select(
-            QuizResults.quiz_id,
-            func.max(QuizResults.id).label("max_id")
-        ).where(QuizResults.company_id == company_id).group_by(QuizResults.quiz_id).alias("subquery")
-
-        query = select(QuizResults).select_from(QuizResults.__table__.join(
-            subquery,
-            and_(
-                QuizResults.quiz_id == subquery.c.quiz_id,
-                QuizResults.id == subquery.c.max_id
-            )
-        )).where(QuizResults.user_id == user_id)
-        results = await self.db.fetch_all(query)
-
-        if not results:
-            raise HTTPException(status_code=404, detail='No such quizzes found')
-
-        total_answers = 0
-        right_answers = 0
-        rating_percent_sum = 0
-
-        for result in results:
-            total_answers += result.__getitem__('summary_questions_total')
-            right_answers += result.__getitem__('summary_correct_answers')
-            rating_percent_sum += result.__getitem__('summary_correct_answers_percentage')
-
-        return Rating(
-            total_answers=total_answers,
-            right_answers=right_answers,
-            rating_percent=round(rating_percent_sum / len(results), 2)
+        return await self.get_summary_rating(
+            QuizUserSummary.user_id == user_id,
+            QuizUserSummary.company_id == company_id
         )
 
     async def get_overall_rating(self, user_id: int) -> Rating:
         await self.check_user_exists(user_id=user_id)
 
-        subquery = select(
-            QuizResults.quiz_id,
-            func.max(QuizResults.id).label("max_id")
-        ).group_by(QuizResults.quiz_id).alias("subquery")
-
-        query = select(QuizResults).select_from(QuizResults.__table__.join(
-            subquery,
-            and_(
-                QuizResults.quiz_id == subquery.c.quiz_id,
-                QuizResults.id == subquery.c.max_id
-            )
-        )).where(QuizResults.user_id == user_id)
-        results = await self.db.fetch_all(query)
-
-        if not results:
-            raise HTTPException(status_code=404, detail='No such quizzes found')
+        return await self.get_summary_rating(QuizUserSummary.user_id == user_id)
 
-        total_answers = 0
-        right_answers = 0
-        rating_percent_sum = 0
+    # Exports. Access is checked when called; the returned iterator reads Redis as it is consumed
+    async def get_my_stats_from_redis(self, user: UserResponse) -> AsyncIterator[dict]:
+        return quiz_answer_store.iter_results(quiz_answer_store.get_user_index(user.id))
 
-        for result in results:
-            total_answers += result.__getitem__('summary_questions_total')
-            right_answers += result.__getitem__('summary_correct_answers')
-            rating_percent_sum += result.__getitem__('summary_correct_answers_percentage')
+    async def get_quiz_results_by_user(
+            self,
+            member_id: int,
+            company_id: int,
+            user: UserResponse
+    ) -> AsyncIterator[dict]:
+        await self.precheck_service.check_company_access(company_id=company_id, user_id=user.id, member_id=member_id)
 
-        return Rating(
-            total_answers=total_answers,
-            right_answers=right_answers,
-            rating_percent=round(rating_percent_sum / len(results), 2)
+        return quiz_answer_store.iter_results(
+            quiz_answer_store.get_user_index(member_id),
+            quiz_answer_store.get_company_index(company_id)
         )
 
-    @staticmethod
-    def get_redis_response(pattern: str) -> RedisQuizResults:
-        keys = []
-        for key in redis_conn.scan_iter(pattern):
-            keys.append(key)
-
-        results = []
-        for key in keys:
-            user_id = key.decode().split("-")[0]
-            quiz_id = key.decode().split("-")[-1]
-            value = redis_conn.get(key)
-            if value:
-                quiz_data = {
-                    "user_id": user_id,
-                    "quiz_id": quiz_id,
-                    "questions": json.loads(value)
-                }
-                results.append(quiz_data)
-        return RedisQuizResults(results=results)
-
-    async def get_my_stats_from_redis(self, user: UserResponse) -> RedisQuizResults:
-        return self.get_redis_response(pattern=f"{user.id}-*")
-
-    async def get_quiz_results_by_user(self, member_id: int, company_id: int, user: UserResponse) -> RedisQuizResults:
-        await self.check_company_exists(company_id=company_id)
-        await self.check_is_admin(company_id=company_id, member_id=user.id)
-        await self.check_is_member(company_id=company_id, member_id=member_id)
+    async def get_quiz_results_by_company(self, company_id: int, user: UserResponse) -> AsyncIterator[dict]:
+        await self.precheck_service.check_company_access(company_id=company_id, user_id=user.id)
 
-        return self.get_redis_response(pattern=f"{member_id}-{company_id}*")
-
-    async def get_quiz_results_by_company(self, company_id: int, user: UserResponse) -> RedisQuizResults:
-        await self.check_company_exists(company_id=company_id)
-        await self.check_is_admin(company_id=company_id, member_id=user.id)
+        return quiz_answer_store.iter_results(quiz_answer_store.get_company_index(company_id))
 
-        return self.get_redis_response(pattern=f"*-{company_id}-*")
+    async def get_quiz_results_by_quiz_in_company(self, quiz_id: int, user: UserResponse) -> AsyncIterator[dict]:
+        quiz = await self.precheck_service.check_quiz_access(quiz_id=quiz_id, user_id=user.id)
+        company_id = quiz.__getitem__('company_id')
 
-    async def get_quiz_results_by_quiz_in_company(self, quiz_id: int, user: UserResponse) -> RedisQuizResults:
-        await self.check_quiz_exists(quiz_id=quiz_id)
-
-        query = select(Quizzes).where(Quizzes.id == quiz_id)
-        result = await self.db.fetch_one(query)
-        company_id = result.__getitem__('company_id')
-        print(company_id)
-
-        await self.check_is_admin(company_id=company_id, member_id=user.id)
-
-        return self.get_redis_response(pattern=f"*-{company_id}-{quiz_id}")
-
-    async def write_my_stats_to_csv(self, user: UserResponse) -> str:
-        get_redis_results = self.get_redis_response(pattern=f"{user.id}-*")
-        result = write_to_csv(results=get_redis_results, filename='my_quiz_results.csv')
-        return result
-
-    async def write_quiz_user_stats_to_csv(self, member_id: int, company_id: int, user: UserResponse) -> str:
-        get_redis_results = await self.get_quiz_results_by_user(member_id=member_id, company_id=company_id, user=user)
-        result = write_to_csv(results=get_redis_results, filename='user_company_results.csv')
-        return result
-
-    async def write_quiz_results_by_company_to_csv(self, company_id: int, user: UserResponse) -> str:
-        get_redis_results = await self.get_quiz_results_by_company(company_id=company_id, user=user)
-        result = write_to_csv(results=get_redis_results, filename='company_results.csv')
-        return result
-
-    async def write_quiz_results_by_quiz_id_to_csv(self, quiz_id: int, user: UserResponse) -> str:
-        get_redis_results = await self.get_quiz_results_by_quiz_in_company(quiz_id=quiz_id, user=user)
-        result = write_to_csv(results=get_redis_results, filename='quiz_id_results.csv')
-        return result
+        return quiz_answer_store.iter_results(
+            quiz_answer_store.get_company_index(company_id),
+            quiz_answer_store.get_quiz_index(quiz_id)
+        )
@@ -1,70 +1,49 @@
+from datetime import date, timedelta
+from typing import Optional, Union
+
 from databases import Database
+from databases.interfaces import Record
 from fastapi import HTTPException
-from sqlalchemy import select, func, and_, desc
+from sqlalchemy import select, func, desc, any_, bindparam, Integer
+from sqlalchemy.dialects.postgresql import ARRAY
 
-from app.models.models import Companies, Users, Members, ActionTypeEnum, QuizResults
+from app.models.models import Members, ActionTypeEnum, QuizResults, QuizUserSummary, CompanyQuizDailyStats, \
+    CompanyUserDailyStats
 from app.schemas.quiz_stat_schemas import QuizStatAverageRatings, QuizStatAverageRating, QuizStatUserRating, \
-    QuizStatDateRatings, QuizStatDateRating, DateRating, QuizStatLastDate, QuizStatUserProgression
+    QuizStatDateRatings, QuizStatDateRating, DateRating, QuizStatLastDate, QuizStatUserProgression, \
+    QuizStatCompanyProgression, QuizDailyTotals, UserDailyTotals
 from app.schemas.user_schemas import UserResponse
+from app.db.replica import ReplicaRouter
+from app.services.permission_service import PermissionService
+
+# Days returned by the daily totals routes when no range is given
+DAILY_TOTALS_DEFAULT_DAYS = 30
 
 
 class QuizStatService:
-    def __init__(self, db: Database):
+    def __init__(self, db: Database, read_db: Optional[Union[ReplicaRouter, Database]] = None):
         self.db = db
-
-    # Helper methods
-    async def check_is_admin(self, company_id: int, member_id: int) -> None:
-        admin_query = select(Members).where(
-            Members.company_id == company_id,
-            Members.user_id == member_id,
-            Members.status == ActionTypeEnum.IS_ADMIN
-        )
-        admin = await self.db.fetch_one(admin_query)
-
-        if not admin:
-            raise HTTPException(status_code=403, detail="You must be admin in this company to do this")
+        # Statistics tolerate replica lag, permission checks read the primary
+        self.read_db = read_db or db
+        self.permission_service = PermissionService(db=db)
 
     # Main methods
     async def get_rating(self, user: UserResponse) -> QuizStatUserRating:
-        subquery = select(
-            QuizResults.quiz_id,
-            func.max(QuizResults.id).label('max_id')
-        ).where(QuizResults.user_id == user.id).group_by(QuizResults.quiz_id).alias('subquery')
-
         query = select(
-            func.avg(QuizResults.summary_correct_answers_percentage)
-        ).select_from(
-            QuizResults.__table__.join(subquery, and_(
-                QuizResults.quiz_id == subquery.c.quiz_id,
-                QuizResults.id == subquery.c.max_id
-            ))
-        )
+            func.avg(QuizUserSummary.summary_correct_answers_percentage)
+        ).where(QuizUserSummary.user_id == user.id)
 
-        result = await self.db.fetch_val(query)
+        result = await self.read_db.fetch_val(query)
         return QuizStatUserRating(rating=round(result, 2)) if result else QuizStatUserRating(rating=0.0)
 
     async def get_success_percentage_for_user(self, user: UserResponse) -> QuizStatAverageRatings:
-        subquery = select(
-            QuizResults.quiz_id,
-            func.max(QuizResults.id).label('max_id')
-        ).where(QuizResults.user_id == user.id).group_by(QuizResults.quiz_id).alias('subquery')
-
         query = select(
-            QuizResults.quiz_id,
-            QuizResults.summary_correct_answers_percentage,
-            QuizResults.date_of_quiz.label('last_taken')
-        ).select_from(
-            QuizResults.__table__.join(subquery, and_(
-                QuizResults.quiz_id == subquery.c.quiz_id,
-                QuizResults.id == subquery.c.max_id
-            ))
-        ).group_by(
-            QuizResults.quiz_id,
-            QuizResults.summary_correct_answers_percentage,
-            QuizResults.date_of_quiz
-        )
+            QuizUserSummary.quiz_id,
+            QuizUserSummary.summary_correct_answers_percentage,
+            QuizUserSummary.last_date.label('last_taken')
+        ).where(QuizUserSummary.user_id == user.id).order_by(QuizUserSummary.quiz_id)
 
-        results = await self.db.fetch_all(query)
+        results = await self.read_db.fetch_all(query)
         if not results:
             return QuizStatAverageRatings(total=0, quizzes=[])
 
@@ -81,41 +60,61 @@ class QuizStatService:
             quizzes=quiz_ratings
         )
 
-    async def get_success_rate_progression(self, user_id: int) -> list[QuizStatDateRating]:
-        subquery = select(
-            func.max(QuizResults.id).label('max_id'),
-            QuizResults.date_of_quiz
-        ).where(QuizResults.user_id == user_id).group_by(
-            QuizResults.date_of_quiz, QuizResults.quiz_id
-        ).alias('subquery')
-
-        query = select(QuizResults).select_from(
-            QuizResults.__table__.join(
-                subquery,
-                and_(
-                    QuizResults.id == subquery.c.max_id,
-                    QuizResults.date_of_quiz == subquery.c.date_of_quiz
-                )
-            )
-        ).where(QuizResults.user_id == user_id).order_by(
+    # Helper methods
+    @staticmethod
+    def get_progression_query(
+            user_ids: list[int],
+            company_id: Optional[int] = None,
+            date_from: Optional[date] = None,
+            date_to: Optional[date] = None
+    ):
+        """The last result of each day per (user, quiz), for all `user_ids` in one statement."""
+        query = select(
+            QuizResults.user_id,
+            QuizResults.quiz_id,
+            QuizResults.date_of_quiz,
+            QuizResults.summary_correct_answers_percentage
+        ).distinct(
+            QuizResults.user_id, QuizResults.quiz_id, QuizResults.date_of_quiz
+        ).where(
+            # One array parameter however many users there are
+            QuizResults.user_id == any_(bindparam('user_ids', user_ids, type_=ARRAY(Integer)))
+        ).order_by(
+            QuizResults.user_id,
             QuizResults.quiz_id,
-            desc(QuizResults.date_of_quiz)
+            desc(QuizResults.date_of_quiz),
+            desc(QuizResults.id)
         )
-        results = await self.db.fetch_all(query)
 
-        quizzes_dict = {}
-        for result in results:
-            quiz_id = result.__getitem__('quiz_id')
-            rating = result.__getitem__('summary_correct_answers_percentage')
-            date = result.__getitem__('date_of_quiz')
+        if company_id is not None:
+            query = query.where(QuizResults.company_id == company_id)
+        if date_from is not None:
+            query = query.where(QuizResults.date_of_quiz >= date_from)
+        if date_to is not None:
+            query = query.where(QuizResults.date_of_quiz <= date_to)
+        return query
 
-            if quiz_id not in quizzes_dict:
-                quizzes_dict[quiz_id] = {'quiz_id': quiz_id, 'ratings_by_date': []}
+    @staticmethod
+    def group_progression(rows: list[Record]) -> dict[int, list[QuizStatDateRating]]:
+        """user_id -> per-quiz date series, in the order of the rows (user, quiz, newest date first)."""
+        users = {}
+        for row in rows:
+            quizzes = users.setdefault(row.__getitem__('user_id'), {})
+            quiz_id = row.__getitem__('quiz_id')
+            if quiz_id not in quizzes:
+                quizzes[quiz_id] = QuizStatDateRating(quiz_id=quiz_id, ratings_by_date=[])
 
-            quizzes_dict[quiz_id]['ratings_by_date'].append(DateRating(date=date, rating=rating))
+            quizzes[quiz_id].ratings_by_date.append(DateRating(
+                date=row.__getitem__('date_of_quiz'),
+                rating=row.__getitem__('summary_correct_answers_percentage')
+            ))
 
-        quizzes = [QuizStatDateRating(**quiz) for quiz in quizzes_dict.values()]
-        return quizzes
+        return {user_id: list(quizzes.values()) for user_id, quizzes in users.items()}
+
+    # Main methods
+    async def get_success_rate_progression(self, user_id: int) -> list[QuizStatDateRating]:
+        rows = await self.read_db.fetch_all(self.get_progression_query(user_ids=[user_id]))
+        return self.group_progression(rows).get(user_id, [])
 
     async def get_success_rate_progression_for_user(
             self,
@@ -123,46 +122,142 @@ class QuizStatService:
             user_id: int,
             current_user: UserResponse
     ) -> list[QuizStatDateRating]:
-        await self.check_is_admin(company_id=company_id, member_id=current_user.id)
+        await self.permission_service.check_is_admin(company_id=company_id, user_id=current_user.id)
 
         result = await self.get_success_rate_progression(user_id=user_id)
         return result
 
-    async def get_success_rate_progression_for_company(self, company_id: int) -> list[QuizStatUserProgression]:
-        users_query = select(Users.id).join(Members).where(Members.company_id == company_id)
-        users = await self.db.fetch_all(users_query)
-        users_ids = [user.__getitem__('id') for user in users]
+    async def get_success_rate_progression_for_company(
+            self,
+            company_id: int,
+            current_user: UserResponse,
+            after_user_id: Optional[int] = None,
+            limit: int = 100,
+            date_from: Optional[date] = None,
+            date_to: Optional[date] = None
+    ) -> QuizStatCompanyProgression:
+        """One page of members ordered by user id, with their results in this company: two queries per page."""
+        await self.permission_service.check_is_admin(company_id=company_id, user_id=current_user.id)
+
+        members_query = select(Members.user_id).where(
+            Members.company_id == company_id,
+            Members.status.in_([ActionTypeEnum.IS_ACTIVE, ActionTypeEnum.IS_ADMIN])
+        ).order_by(Members.user_id).limit(limit)
+        if after_user_id is not None:
+            members_query = members_query.where(Members.user_id > after_user_id)
 
-        success_rate_progressions = []
-        for user_id in users_ids:
-            success_rate_progression = await self.get_success_rate_progression(user_id)
+        members = await self.read_db.fetch_all(members_query)
+        user_ids = [member.__getitem__('user_id') for member in members]
+        if not user_ids:
+            return QuizStatCompanyProgression(users=[], next_after_user_id=None)
 
-            success_rate_progressions.append(
-                QuizStatUserProgression(user_id=user_id, data=success_rate_progression)
-            )
+        rows = await self.read_db.fetch_all(self.get_progression_query(
+            user_ids=user_ids,
+            company_id=company_id,
+            date_from=date_from,
+            date_to=date_to
+        ))
+        progression = self.group_progression(rows)
 
-        return success_rate_progressions
+        return QuizStatCompanyProgression(
+            users=[
+                QuizStatUserProgression(user_id=user_id, data=progression.get(user_id, []))
+                for user_id in user_ids
+            ],
+            next_after_user_id=user_ids[-1] if len(user_ids) == limit else None
+        )
 
     async def get_latest_time_quiz_passed_for_users(
             self,
             company_id: int,
             current_user: UserResponse
     ) -> list[QuizStatLastDate]:
-        await self.check_is_admin(company_id=company_id, member_id=current_user.id)
+        await self.permission_service.check_is_admin(company_id=company_id, user_id=current_user.id)
 
+        # One row per user and active day instead of one per attempt
         query = (
             select(
-                Users.id,
-                func.max(QuizResults.date_of_quiz).label('last_quiz_date')
+                CompanyUserDailyStats.user_id,
+                func.max(CompanyUserDailyStats.day).label('last_quiz_date')
             )
-            .select_from(Users.__table__.join(QuizResults.__table__).join(Companies.__table__))
-            .where(Companies.id == company_id)
-            .group_by(Users.id)
+            .where(CompanyUserDailyStats.company_id == company_id)
+            .group_by(CompanyUserDailyStats.user_id)
         )
-        rows = await self.db.fetch_all(query=query)
+        rows = await self.read_db.fetch_all(query=query)
 
         result = [
             QuizStatLastDate(user_id=row[0], date=row[1].strftime("%Y-%m-%d"))
             for row in rows
         ]
         return result
+
+    async def get_daily_totals(
+            self,
+            table,
+            column,
+            company_id: int,
+            date_from: Optional[date],
+            date_to: Optional[date]
+    ) -> list[dict]:
+        date_to = date_to or date.today()
+        date_from = date_from or date_to - timedelta(days=DAILY_TOTALS_DEFAULT_DAYS - 1)
+
+        query = select(
+            column,
+            table.day,
+            table.attempts,
+            table.questions_total,
+            table.correct_answers,
+            table.percentage_sum
+        ).where(
+            table.company_id == company_id,
+            table.day.between(date_from, date_to)
+        ).order_by(desc(table.day), column)
+        rows = await self.read_db.fetch_all(query)
+
+        return [
+            {
+                column.key: row.__getitem__(column.key),
+                'date': row.__getitem__('day'),
+                'attempts': row.__getitem__('attempts'),
+                'questions_total': row.__getitem__('questions_total'),
+                'correct_answers': row.__getitem__('correct_answers'),
+                'average_percentage': round(row.__getitem__('percentage_sum') / row.__getitem__('attempts'), 2)
+            } for row in rows
+        ]
+
+    async def get_company_quiz_daily_totals(
+            self,
+            company_id: int,
+            current_user: UserResponse,
+            date_from: Optional[date] = None,
+            date_to: Optional[date] = None
+    ) -> list[QuizDailyTotals]:
+        await self.permission_service.check_is_admin(company_id=company_id, user_id=current_user.id)
+
+        totals = await self.get_daily_totals(
+            table=CompanyQuizDailyStats,
+            column=CompanyQuizDailyStats.quiz_id,
+            company_id=company_id,
+            date_from=date_from,
+            date_to=date_to
+        )
+        return [QuizDailyTotals(**row) for row in totals]
+
+    async def get_company_user_daily_totals(
+            self,
+            company_id: int,
+            current_user: UserResponse,
+            date_from: Optional[date] = None,
+            date_to: Optional[date] = None
+    ) -> list[UserDailyTotals]:
+        await self.permission_service.check_is_admin(company_id=company_id, user_id=current_user.id)
+
+        totals = await self.get_daily_totals(
+            table=CompanyUserDailyStats,
+            column=CompanyUserDailyStats.user_id,
+            company_id=company_id,
+            date_from=date_from,
+            date_to=date_to
+        )
+        return [UserDailyTotals(**row) for row in totals]
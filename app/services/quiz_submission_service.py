@@ -0,0 +1,280 @@
+import math
+from datetime import date, datetime
+from typing import Optional
+
+from databases import Database
+from fastapi import HTTPException
+from sqlalchemy import select, func
+from sqlalchemy.dialects.postgresql import insert
+
+from app.models.models import QuizResults, QuizUserSummary
+from app.schemas.quiz_schemas import TestResults, TakenQuizStats
+from app.schemas.user_schemas import UserResponse
+from app.services.precheck_service import PrecheckService
+from app.services.stats_rollup_service import StatsRollupService
+from app.utils.company_roles import is_member
+from app.utils.cooldown_gate import cooldown_gate
+from app.utils.leaderboard import leaderboard_store
+from app.utils.quiz_answer_store import quiz_answer_store
+from app.utils.quiz_content_cache import quiz_content_cache
+
+
+class QuizSubmissionService:
+    """
+    Quiz submission in a fixed number of round trips:
+    quiz + company + membership in one query, the questions from QuizContentCache,
+    then a transaction that takes a per-(user, quiz) advisory lock, reads the user's quiz summary,
+    inserts the new result, upserts the summary and adds the attempt to the daily stats rollups.
+
+    The lock serializes concurrent submissions of the same user for the same quiz,
+    so cooldown and summary_* totals are always computed from the latest committed result.
+    """
+
+    def __init__(self, db: Database):
+        self.db = db
+        self.precheck_service = PrecheckService(db=db)
+        self.stats_rollup_service = StatsRollupService(db=db)
+
+    # Helper methods
+    async def get_previous_result(self, quiz_id: int, user_id: int) -> Optional[dict]:
+        summary_query = select(
+            QuizUserSummary.summary_questions_total,
+            QuizUserSummary.summary_correct_answers,
+            QuizUserSummary.attempts,
+            QuizUserSummary.last_date
+        ).where(QuizUserSummary.user_id == user_id, QuizUserSummary.quiz_id == quiz_id)
+        summary = await self.db.fetch_one(summary_query)
+        if summary:
+            return dict(summary)
+
+        # Results submitted before the summary table existed and not backfilled yet:
+        # the latest one, and the count of all of them (the window is computed before the LIMIT)
+        result_query = select(
+            QuizResults.summary_questions_total,
+            QuizResults.summary_correct_answers,
+            func.count().over().label('attempts'),
+            QuizResults.date_of_quiz.label('last_date')
+        ).where(
+            QuizResults.quiz_id == quiz_id,
+            QuizResults.user_id == user_id
+        ).order_by(QuizResults.id.desc()).limit(1)
+        result = await self.db.fetch_one(result_query)
+        return dict(result) if result else None
+
+    async def lock_and_get_previous_result(self, quiz_id: int, user_id: int) -> Optional[dict]:
+        # Released on commit/rollback of the surrounding transaction
+        await self.db.execute(select(func.pg_advisory_xact_lock(user_id, quiz_id)))
+        return await self.get_previous_result(quiz_id=quiz_id, user_id=user_id)
+
+    @staticmethod
+    def raise_cooldown(cooldown_in_days: int, remaining_ms: int) -> None:
+        raise HTTPException(
+            status_code=403,
+            detail=f'You must wait for {cooldown_in_days} days since last attempt',
+            headers={'Retry-After': str(math.ceil(remaining_ms / 1000))}
+        )
+
+    @classmethod
+    def check_cooldown(cls, last_date: Optional[date], cooldown_in_days: int) -> None:
+        if not last_date or not cooldown_in_days:
+            return
+
+        days_since_last_attempt = (date.today() - last_date).days
+        if days_since_last_attempt < cooldown_in_days:
+            release_at = cooldown_gate.get_release_at(last_date, cooldown_in_days)
+            cls.raise_cooldown(
+                cooldown_in_days=cooldown_in_days,
+                remaining_ms=int((release_at - datetime.now()).total_seconds() * 1000)
+            )
+
+    async def check_cooldown_gate(self, quiz_id: int, user_id: int, cooldown_in_days: Optional[int]) -> None:
+        """Cooldown check from Redis; Postgres is asked only when the gate is missing, and the gate is rebuilt."""
+        if not cooldown_in_days:
+            return
+
+        remaining_ms = await cooldown_gate.get_remaining_ms(user_id=user_id, quiz_id=quiz_id)
+        if remaining_ms is None:
+            previous_result = await self.get_previous_result(quiz_id=quiz_id, user_id=user_id)
+            remaining_ms = await cooldown_gate.rebuild(
+                user_id=user_id,
+                quiz_id=quiz_id,
+                last_date=previous_result['last_date'] if previous_result else None,
+                cooldown_in_days=cooldown_in_days
+            )
+
+        if remaining_ms > 0:
+            self.raise_cooldown(cooldown_in_days=cooldown_in_days, remaining_ms=remaining_ms)
+
+    @staticmethod
+    def check_answers(questions: list[dict], answers: list[int]) -> None:
+        if not questions:
+            raise HTTPException(status_code=422, detail='This quiz has no questions yet.')
+
+        if len(answers) != len(questions):
+            raise HTTPException(status_code=422, detail='Quantity of answers must be equal to that of questions.')
+
+        for question, answer in zip(questions, answers):
+            if not 0 <= answer < len(question['answer_variants']):
+                raise HTTPException(status_code=422, detail='Answer index is out of range of answer variants.')
+
+    @staticmethod
+    def grade(questions: list[dict], answers: list[int]) -> list[dict]:
+        graded = []
+        for question, answer in zip(questions, answers):
+            graded.append({
+                'question_text': question['name'],
+                'user_answer': question['answer_variants'][answer],
+                'is_correct': 'correct' if answer == question['right_answer'] else 'incorrect'
+            })
+        return graded
+
+    @staticmethod
+    def get_result_values(
+            previous_result: Optional[dict],
+            questions_total: int,
+            right_answers: int,
+            taken_on_day: date
+    ) -> dict:
+        summary_questions_total = questions_total
+        summary_correct_answers = right_answers
+        if previous_result:
+            summary_questions_total += previous_result['summary_questions_total']
+            summary_correct_answers += previous_result['summary_correct_answers']
+
+        return dict(
+            quiz_questions_total=questions_total,
+            quiz_correct_answers=right_answers,
+            quiz_correct_answers_percentage=round(right_answers / questions_total * 100, 2),
+
+            summary_questions_total=summary_questions_total,
+            summary_correct_answers=summary_correct_answers,
+            summary_correct_answers_percentage=round(summary_correct_answers / summary_questions_total * 100, 2),
+
+            date_of_quiz=taken_on_day,
+        )
+
+    @staticmethod
+    def get_summary_upsert(user_id: int, company_id: int, quiz_id: int, result_id: int, attempts: int, values: dict):
+        query = insert(QuizUserSummary).values(
+            user_id=user_id,
+            quiz_id=quiz_id,
+            company_id=company_id,
+
+            last_result_id=result_id,
+            last_questions_total=values['quiz_questions_total'],
+            last_correct_answers=values['quiz_correct_answers'],
+            last_correct_answers_percentage=values['quiz_correct_answers_percentage'],
+
+            summary_questions_total=values['summary_questions_total'],
+            summary_correct_answers=values['summary_correct_answers'],
+            summary_correct_answers_percentage=values['summary_correct_answers_percentage'],
+
+            attempts=attempts,
+            last_date=values['date_of_quiz'],
+        )
+        excluded = query.excluded
+        return query.on_conflict_do_update(
+            index_elements=[QuizUserSummary.user_id, QuizUserSummary.quiz_id],
+            set_={
+                'company_id': excluded.company_id,
+                'last_result_id': excluded.last_result_id,
+                'last_questions_total': excluded.last_questions_total,
+                'last_correct_answers': excluded.last_correct_answers,
+                'last_correct_answers_percentage': excluded.last_correct_answers_percentage,
+                'summary_questions_total': excluded.summary_questions_total,
+                'summary_correct_answers': excluded.summary_correct_answers,
+                'summary_correct_answers_percentage': excluded.summary_correct_answers_percentage,
+                'attempts': QuizUserSummary.attempts + 1,
+                'last_date': excluded.last_date,
+            }
+        )
+
+    # Main methods
+    async def submit(self, quiz_id: int, quiz_answers: TestResults, user: UserResponse) -> TakenQuizStats:
+        quiz = await self.precheck_service.check_quiz_access(
+            quiz_id=quiz_id,
+            user_id=user.id,
+            role_check=is_member,
+            forbidden_detail='Not a member of the company'
+        )
+        company_id = quiz.__getitem__('company_id')
+        cooldown_in_days = quiz.__getitem__('cooldown_in_days')
+        # Early reject without touching the lock; the check under the lock below is the authoritative one
+        await self.check_cooldown_gate(quiz_id=quiz_id, user_id=user.id, cooldown_in_days=cooldown_in_days)
+
+        content = await quiz_content_cache.get(
+            db=self.db,
+            quiz_id=quiz_id,
+            version=quiz.__getitem__('content_version')
+        )
+        questions = content.questions
+        answers = quiz_answers.results
+        taken_on_day = date.today()
+
+        async with self.db.transaction():
+            previous_result = await self.lock_and_get_previous_result(quiz_id=quiz_id, user_id=user.id)
+            self.check_cooldown(
+                last_date=previous_result['last_date'] if previous_result else None,
+                cooldown_in_days=cooldown_in_days
+            )
+            self.check_answers(questions=questions, answers=answers)
+
+            graded = self.grade(questions=questions, answers=answers)
+            right_answers = sum(1 for item in graded if item['is_correct'] == 'correct')
+
+            values = self.get_result_values(
+                previous_result=previous_result,
+                questions_total=len(questions),
+                right_answers=right_answers,
+                taken_on_day=taken_on_day
+            )
+            query = QuizResults.__table__.insert().values(
+                user_id=user.id,
+                company_id=company_id,
+                quiz_id=quiz_id,
+                **values
+            ).returning(QuizResults.id)
+            result_id = await self.db.fetch_val(query)
+
+            await self.db.execute(self.get_summary_upsert(
+                user_id=user.id,
+                company_id=company_id,
+                quiz_id=quiz_id,
+                result_id=result_id,
+                attempts=previous_result['attempts'] + 1 if previous_result else 1,
+                values=values
+            ))
+            await self.stats_rollup_service.add_attempt(
+                company_id=company_id,
+                quiz_id=quiz_id,
+                user_id=user.id,
+                day=taken_on_day,
+                values=values
+            )
+
+        await quiz_answer_store.save(
+            user_id=user.id,
+            company_id=company_id,
+            quiz_id=quiz_id,
+            content=content,
+            answers=answers
+        )
+        await cooldown_gate.rebuild(
+            user_id=user.id,
+            quiz_id=quiz_id,
+            last_date=taken_on_day,
+            cooldown_in_days=cooldown_in_days
+        )
+        await leaderboard_store.update(
+            company_id=company_id,
+            quiz_id=quiz_id,
+            user_id=user.id,
+            rating=values['summary_correct_answers_percentage'],
+            result_id=result_id
+        )
+
+        return TakenQuizStats(
+            questions_total=len(questions),
+            right_answers=right_answers,
+            taken_on_day=taken_on_day
+        )
@@ -0,0 +1,134 @@
+from datetime import date, timedelta
+from typing import Optional
+
+from databases import Database
+from sqlalchemy import select, func, delete, union
+from sqlalchemy.dialects.postgresql import insert
+
+from app.models.models import QuizResults, CompanyQuizDailyStats, CompanyUserDailyStats
+from system_config import system_config
+
+# Advisory locks, one per company, taken shared by submissions and exclusively by reconciliation.
+# The company id goes into the low 32 bits of a single bigint key: the two-int form of the advisory locks
+# is already used per (user, quiz) by submissions.
+ROLLUP_LOCK_KEY = 7_301_024
+# Rollup table and the quiz_results column it is grouped by, besides company and day
+ROLLUPS = (
+    (CompanyQuizDailyStats, QuizResults.quiz_id),
+    (CompanyUserDailyStats, QuizResults.user_id),
+)
+
+
+class StatsRollupService:
+    """
+    Per-day totals of quiz attempts by (company, quiz) and by (company, user).
+
+    Every submission adds its attempt to both rollups inside its own transaction, and a nightly task
+    recomputes the most recent days from quiz_results. Because submissions hold their company's rollup lock
+    shared and reconciliation holds it exclusively, an attempt is never counted twice or lost while its day
+    is recomputed. Companies are reconciled one at a time, so only one company's submissions wait at once.
+    """
+
+    def __init__(self, db: Database):
+        self.db = db
+
+    # Helper methods
+    @staticmethod
+    def get_lock_key(company_id: int) -> int:
+        return (ROLLUP_LOCK_KEY << 32) | company_id
+
+    @staticmethod
+    def get_increment_upsert(table, key: dict, questions_total: int, correct_answers: int, percentage: float):
+        query = insert(table).values(
+            **key,
+            attempts=1,
+            questions_total=questions_total,
+            correct_answers=correct_answers,
+            percentage_sum=percentage,
+        )
+        excluded = query.excluded
+        return query.on_conflict_do_update(
+            index_elements=list(table.__table__.primary_key),
+            set_={
+                'attempts': table.attempts + 1,
+                'questions_total': table.questions_total + excluded.questions_total,
+                'correct_answers': table.correct_answers + excluded.correct_answers,
+                'percentage_sum': table.percentage_sum + excluded.percentage_sum,
+            }
+        )
+
+    @staticmethod
+    def get_rollup_select(column, company_id: int, date_from: date, date_to: date):
+        return select(
+            QuizResults.company_id,
+            column,
+            QuizResults.date_of_quiz,
+            func.count(),
+            func.coalesce(func.sum(QuizResults.quiz_questions_total), 0),
+            func.coalesce(func.sum(QuizResults.quiz_correct_answers), 0),
+            func.coalesce(func.sum(QuizResults.quiz_correct_answers_percentage), 0),
+        ).where(
+            QuizResults.company_id == company_id,
+            column.isnot(None),
+            QuizResults.date_of_quiz.between(date_from, date_to)
+        ).group_by(QuizResults.company_id, column, QuizResults.date_of_quiz)
+
+    # Main methods
+    async def add_attempt(
+            self,
+            company_id: int,
+            quiz_id: int,
+            user_id: int,
+            day: date,
+            values: dict
+    ) -> None:
+        """Adds one attempt to both rollups. Must run in the transaction that inserts the result."""
+        await self.db.execute(select(func.pg_advisory_xact_lock_shared(self.get_lock_key(company_id))))
+
+        for table, key in (
+                (CompanyQuizDailyStats, dict(company_id=company_id, quiz_id=quiz_id, day=day)),
+                (CompanyUserDailyStats, dict(company_id=company_id, user_id=user_id, day=day)),
+        ):
+            await self.db.execute(self.get_increment_upsert(
+                table=table,
+                key=key,
+                questions_total=values['quiz_questions_total'],
+                correct_answers=values['quiz_correct_answers'],
+                percentage=values['quiz_correct_answers_percentage']
+            ))
+
+    async def get_company_ids(self, date_from: date, date_to: date) -> list[int]:
+        """Companies with results or rollup rows in the days from `date_from` to `date_to`."""
+        query = union(
+            select(QuizResults.company_id).where(
+                QuizResults.company_id.isnot(None),
+                QuizResults.date_of_quiz.between(date_from, date_to)
+            ),
+            *[select(table.company_id).where(table.day.between(date_from, date_to)) for table, _ in ROLLUPS]
+        )
+        return sorted(row[0] for row in await self.db.fetch_all(query))
+
+    async def reconcile_company(self, company_id: int, date_from: date, date_to: date) -> None:
+        async with self.db.transaction():
+            # Waits for the company's submissions in flight, and holds new ones until the days are rewritten
+            await self.db.execute(select(func.pg_advisory_xact_lock(self.get_lock_key(company_id))))
+
+            for table, column in ROLLUPS:
+                await self.db.execute(delete(table).where(
+                    table.company_id == company_id,
+                    table.day.between(date_from, date_to)
+                ))
+                await self.db.execute(insert(table).from_select(
+                    ['company_id', column.key, 'day', 'attempts', 'questions_total', 'correct_answers', 'percentage_sum'],
+                    self.get_rollup_select(column=column, company_id=company_id, date_from=date_from, date_to=date_to)
+                ))
+
+    async def reconcile(self, date_from: date, date_to: date) -> None:
+        """Recomputes both rollups for the days from `date_from` to `date_to` inclusive, a company at a time."""
+        for company_id in await self.get_company_ids(date_from=date_from, date_to=date_to):
+            await self.reconcile_company(company_id=company_id, date_from=date_from, date_to=date_to)
+
+    async def reconcile_recent(self, days: Optional[int] = None) -> None:
+        days = days or system_config.stats_rollup_reconcile_days
+        today = date.today()
+        await self.reconcile(date_from=today - timedelta(days=days - 1), date_to=today)
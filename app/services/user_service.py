@@ -4,20 +4,23 @@ from typing import Optional
 from databases import Database
 from databases.backends.postgres import Record
 from fastapi import HTTPException
-from passlib.context import CryptContext
-from sqlalchemy import select, update, delete
+from sqlalchemy import select, delete
 
+from app.db.repository import Repository
 from app.models.models import Users
 from app.schemas.user_schemas import SignUpRequest, UserUpdateRequest, UserListResponse, UserResponse
+from app.utils.password_hasher import password_hasher
+from app.utils.principal_cache import principal_cache
 
 
 class UserService:
     def __init__(self, db: Database):
         self.db = db
-        self.bcrypt_context = CryptContext(schemes=['bcrypt'], deprecated='auto')
+        self.user_repository = Repository(db=db, model=Users)
 
-    def get_password_hash(self, password: str) -> str:
-        return self.bcrypt_context.hash(password)
+    @staticmethod
+    async def get_password_hash(password: str) -> str:
+        return await password_hasher.hash(password=password)
 
     @staticmethod
     def validate_password(password: str, repeat_password: str) -> None:
@@ -65,7 +68,7 @@ class UserService:
         await self.check_existing_email(create_user)
 
         create_user_model = Users(
-            user_password=self.get_password_hash(create_user.user_password),
+            user_password=await self.get_password_hash(create_user.user_password),
             user_name=create_user.user_name,
             user_email=create_user.user_email,
 
@@ -76,21 +79,20 @@ class UserService:
             update_datetime=datetime.now(),
         )
 
-        query = Users.__table__.insert().values(
-            user_name=create_user_model.user_name,
-            user_email=create_user_model.user_email,
-            user_password=create_user_model.user_password,
+        created_user = await self.user_repository.insert(
+            values=dict(
+                user_name=create_user_model.user_name,
+                user_email=create_user_model.user_email,
+                user_password=create_user_model.user_password,
 
-            is_superuser=create_user_model.is_superuser,
-            is_active=create_user_model.is_active,
+                is_superuser=create_user_model.is_superuser,
+                is_active=create_user_model.is_active,
 
-            registration_datetime=create_user_model.registration_datetime,
-            update_datetime=create_user_model.update_datetime,
+                registration_datetime=create_user_model.registration_datetime,
+                update_datetime=create_user_model.update_datetime,
+            ),
+            schema=UserResponse
         )
-        await self.db.execute(query)
-
-        user_query = select(Users).where(Users.user_email == create_user.user_email)
-        created_user = await self.db.fetch_one(user_query)
         return created_user
 
     async def update_user(
@@ -103,15 +105,17 @@ class UserService:
 
         update_data = update_user.dict(exclude_unset=True)
         if update_data.get('user_password'):
-            update_data['user_password'] = self.get_password_hash(update_data['user_password'])
-            print(update_data['user_password'])
+            update_data['user_password'] = await self.get_password_hash(update_data['user_password'])
         update_data['update_datetime'] = datetime.now()
 
-        update_query = update(Users).where(Users.id == user_id).values(**update_data)
-        await self.db.execute(update_query)
+        updated_user = await self.user_repository.update(
+            where=Users.id == user_id,
+            values=update_data,
+            schema=UserResponse
+        )
+        await principal_cache.invalidate_user(user_id=user_id)
 
-        user_query = select(Users).where(Users.id == user_id)
-        updated_user = await self.db.fetch_one(user_query)
+        self.check_user_exists_or_404(user=updated_user)
         return updated_user
 
     async def delete_user(self, user_id: int) -> None:
@@ -120,3 +124,4 @@ class UserService:
 
         delete_query = delete(Users).where(Users.id == user_id)
         await self.db.execute(delete_query)
+        await principal_cache.invalidate_user(user_id=user_id)
@@ -4,6 +4,8 @@ from apscheduler.schedulers.asyncio import AsyncIOScheduler
 
 from app.db.connections import get_db
 from app.services.notifications_service import NotificationsService
+from app.services.stats_rollup_service import StatsRollupService
+from app.utils.export_jobs import export_runner
 
 
 async def create_quiz_cooldown_notifications() -> None:
@@ -12,6 +14,12 @@ async def create_quiz_cooldown_notifications() -> None:
     await notification_service.create_notifications_for_quiz_cooldowns()
 
 
+async def reconcile_daily_stats() -> None:
+    db: Database = await get_db()
+    stats_rollup_service = StatsRollupService(db=db)
+    await stats_rollup_service.reconcile_recent()
+
+
 scheduler = AsyncIOScheduler(timezone=timezone('Europe/Kiev'))
 
 scheduler.add_job(
@@ -20,3 +28,16 @@ scheduler.add_job(
     hour=0,
     minute=0
 )
+
+scheduler.add_job(
+    reconcile_daily_stats,
+    "cron",
+    hour=3,
+    minute=0
+)
+
+scheduler.add_job(
+    export_runner.cleanup,
+    "interval",
+    minutes=10
+)
@@ -0,0 +1,62 @@
+from contextvars import ContextVar
+from typing import Optional
+
+from app.models.models import ActionTypeEnum
+
+# A user's role in a company is a short string of flags, e.g. 'oa' for the owner who is also an admin.
+# The same compact form is embedded into access tokens.
+OWNER = 'o'
+ADMIN = 'a'
+MEMBER = 'm'
+
+# Company roles known for the current request: user_id -> {company_id: role}
+request_company_roles: ContextVar[Optional[dict[int, dict[int, str]]]] = ContextVar(
+    'request_company_roles',
+    default=None
+)
+
+
+def encode_role(is_owner: bool, status: Optional[ActionTypeEnum]) -> str:
+    role = OWNER if is_owner else ''
+    if status == ActionTypeEnum.IS_ADMIN:
+        role += ADMIN
+    elif status == ActionTypeEnum.IS_ACTIVE:
+        role += MEMBER
+    return role
+
+
+def is_owner(role: str) -> bool:
+    return OWNER in role
+
+
+def is_admin(role: str) -> bool:
+    return ADMIN in role
+
+
+def is_member(role: str) -> bool:
+    return ADMIN in role or MEMBER in role
+
+
+def reset_request_roles() -> None:
+    request_company_roles.set({})
+
+
+def set_request_roles(user_id: int, roles: dict[int, str]) -> None:
+    known_roles = request_company_roles.get()
+    if known_roles is None:
+        known_roles = {}
+        request_company_roles.set(known_roles)
+    known_roles[user_id] = roles
+
+
+def get_request_roles(user_id: int) -> Optional[dict[int, str]]:
+    known_roles = request_company_roles.get()
+    if not known_roles:
+        return None
+    return known_roles.get(user_id)
+
+
+def drop_request_roles(user_id: int) -> None:
+    known_roles = request_company_roles.get()
+    if known_roles:
+        known_roles.pop(user_id, None)
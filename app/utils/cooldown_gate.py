@@ -0,0 +1,80 @@
+from datetime import date, datetime, time, timedelta
+from typing import Iterable, Optional
+
+from redis import RedisError
+
+from app.db.connections import redis_conn
+
+BLOCKED = b'1'
+CLEAR = b'0'
+# A "no cooldown" answer is remembered for a while too, so users who never took a quiz don't hit the DB
+CLEAR_TTL = 3600
+
+
+class CooldownGate:
+    """
+    Redis key per (user, quiz) that lives exactly as long as the user's cooldown for the quiz.
+
+    A blocked gate expires at the start of the day the quiz may be retaken, so its PTTL is the remaining wait.
+    A miss means Redis doesn't know: the caller rebuilds the gate from Postgres.
+    """
+
+    @staticmethod
+    def get_key(user_id: int, quiz_id: int) -> str:
+        return f'quiz_cooldown:{user_id}:{quiz_id}'
+
+    @staticmethod
+    def get_release_at(last_date: date, cooldown_in_days: int) -> datetime:
+        return datetime.combine(last_date + timedelta(days=cooldown_in_days), time.min)
+
+    async def get_remaining_ms(self, user_id: int, quiz_id: int) -> Optional[int]:
+        key = self.get_key(user_id, quiz_id)
+        try:
+            pipe = redis_conn.pipeline(transaction=False)
+            pipe.get(key)
+            pipe.pttl(key)
+            value, pttl = await pipe.execute()
+        except RedisError:
+            return None
+
+        if value is None:
+            return None
+        if value == CLEAR or pttl <= 0:
+            return 0
+        return pttl
+
+    def close(self, pipe, user_id: int, quiz_id: int, last_date: Optional[date], cooldown_in_days: int) -> int:
+        """Queues the gate for (user, quiz) on `pipe` and returns the remaining wait in ms."""
+        key = self.get_key(user_id, quiz_id)
+
+        remaining_ms = 0
+        if last_date and cooldown_in_days:
+            release_at = self.get_release_at(last_date, cooldown_in_days)
+            remaining_ms = int((release_at - datetime.now()).total_seconds() * 1000)
+
+        if remaining_ms > 0:
+            pipe.set(key, BLOCKED, px=remaining_ms)
+        else:
+            pipe.set(key, CLEAR, ex=CLEAR_TTL)
+        return max(remaining_ms, 0)
+
+    async def rebuild(self, user_id: int, quiz_id: int, last_date: Optional[date], cooldown_in_days: int) -> int:
+        pipe = redis_conn.pipeline(transaction=False)
+        remaining_ms = self.close(pipe, user_id, quiz_id, last_date, cooldown_in_days)
+        try:
+            await pipe.execute()
+        except RedisError:
+            pass
+        return remaining_ms
+
+    async def rebuild_many(self, quiz_id: int, last_dates: Iterable[tuple[int, date]], cooldown_in_days: int) -> None:
+        pipe = redis_conn.pipeline(transaction=False)
+        for user_id, last_date in last_dates:
+            self.close(pipe, user_id, quiz_id, last_date, cooldown_in_days)
+        try:
+            await pipe.execute()
+        except RedisError:
+            pass
+
+
+cooldown_gate = CooldownGate()
@@ -1,31 +1,31 @@
 import csv
-import os
+import io
+from typing import AsyncIterator
 
-from app.schemas.quiz_schemas import RedisQuizResults
+FIELDNAMES = ['user_id', 'quiz_id', 'question_text', 'user_answer', 'is_correct']
+# Rows are encoded into a buffer and sent once it holds about this many characters
+CHUNK_SIZE = 64 * 1024
 
 
-def write_to_csv(results: RedisQuizResults, filename):
-    path = os.path.abspath(os.path.dirname(__file__))
-    filename = filename
-    file_path = os.path.join(path, filename)
+async def csv_chunks(results: AsyncIterator[dict]) -> AsyncIterator[bytes]:
+    """One CSV row per answered question, encoded in chunks as results arrive."""
+    buffer = io.StringIO()
+    writer = csv.DictWriter(buffer, fieldnames=FIELDNAMES)
+    writer.writeheader()
 
-    with open(file_path, 'w', newline='') as csv_file:
-        fieldnames = ['user_id', 'quiz_id', 'question_text', 'user_answer', 'is_correct']
-        writer = csv.DictWriter(csv_file, fieldnames=fieldnames)
-        writer.writeheader()
+    async for result in results:
+        for question in result['questions']:
+            writer.writerow({
+                'user_id': result['user_id'],
+                'quiz_id': result['quiz_id'],
+                'question_text': question['question_text'],
+                'user_answer': question['user_answer'],
+                'is_correct': question['is_correct']
+            })
 
-        for result in results.results:
-            user_id = result.user_id
-            quiz_id = result.quiz_id
-            questions = result.questions
+        if buffer.tell() >= CHUNK_SIZE:
+            yield buffer.getvalue().encode()
+            buffer.seek(0)
+            buffer.truncate()
 
-            for question in questions:
-                writer.writerow({
-                    'user_id': user_id,
-                    'quiz_id': quiz_id,
-                    'question_text': question.question_text,
-                    'user_answer': question.user_answer,
-                    'is_correct': question.is_correct
-                })
-
-    return f'Data written to {file_path} successfully.'
+    yield buffer.getvalue().encode()
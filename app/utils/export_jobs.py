@@ -0,0 +1,264 @@
+import asyncio
+import logging
+import os
+import tempfile
+import time
+import uuid
+from datetime import datetime, timedelta
+from typing import AsyncIterator, NoReturn, Optional
+
+from fastapi import HTTPException
+from redis import RedisError
+
+from app.db.connections import redis_conn, get_read_db
+from app.schemas.export_schemas import ExportJob, ExportJobFormat, ExportJobStatus
+from app.schemas.metrics_schemas import ExportJobsStats
+from app.utils.csv_writer import csv_chunks
+from app.utils.quiz_answer_store import quiz_answer_store
+from app.utils.streaming import ndjson_lines, json_results_array
+from system_config import system_config
+
+logger = logging.getLogger(__name__)
+
+# Progress is saved to Redis every this many results
+PROGRESS_INTERVAL = 500
+# Encoded chunks are collected into writes of about this size
+WRITE_SIZE = 256 * 1024
+
+ENCODERS = {
+    ExportJobFormat.CSV: csv_chunks,
+    ExportJobFormat.JSON: json_results_array,
+    ExportJobFormat.NDJSON: ndjson_lines,
+}
+
+
+class ExportJobRunner:
+    """
+    Builds company result exports in background tasks of this worker and keeps them as files for `ttl` seconds.
+
+    Job state lives in Redis, so it can be polled from any worker; files live in `directory`,
+    which must be shared between workers and nodes for downloads to work from all of them.
+    At most `max_workers` exports run at once and at most `max_per_company` of them for one company,
+    so one tenant's exports queue behind each other instead of taking every slot.
+    """
+
+    def __init__(self, directory: str, max_workers: int, max_per_company: int, max_queue: int, ttl: int):
+        self.directory = directory
+        self.max_workers = max_workers
+        self.max_per_company = max_per_company
+        self.max_queue = max_queue
+        self.ttl = ttl
+
+        self._workers = asyncio.Semaphore(max_workers)
+        # company_id -> (slot semaphore, jobs running or waiting on it); removed when the company has no jobs
+        self._company_slots: dict[int, tuple[asyncio.Semaphore, int]] = {}
+        self._tasks: set[asyncio.Task] = set()
+
+        self.running = 0
+        self.completed = 0
+        self.failed = 0
+        self.rejected = 0
+
+    @staticmethod
+    def get_key(job_id: str) -> str:
+        return f'export_job:{job_id}'
+
+    @staticmethod
+    def raise_unavailable(error: RedisError) -> NoReturn:
+        raise HTTPException(
+            status_code=503,
+            detail='Exports are temporarily unavailable',
+            headers={'Retry-After': '5'}
+        ) from error
+
+    def get_path(self, job: ExportJob) -> str:
+        return os.path.join(self.directory, f'{job.id}.{job.export_format.value}')
+
+    # Job state
+    async def save(self, job: ExportJob) -> None:
+        try:
+            await redis_conn.set(self.get_key(job.id), job.json(), ex=self.ttl)
+        except RedisError as error:
+            logger.warning('Export job %s state not saved: %r', job.id, error)
+
+    async def get(self, job_id: str) -> Optional[ExportJob]:
+        try:
+            value = await redis_conn.get(self.get_key(job_id))
+        except RedisError as error:
+            self.raise_unavailable(error)
+        return ExportJob.parse_raw(value) if value else None
+
+    # Running
+    async def submit(self, user_id: int, company_id: int, export_format: ExportJobFormat) -> ExportJob:
+        if len(self._tasks) >= self.max_workers + self.max_queue:
+            self.rejected += 1
+            raise HTTPException(
+                status_code=503,
+                detail='Too many exports in progress, try again later',
+                headers={'Retry-After': '60'}
+            )
+
+        job = ExportJob(
+            id=uuid.uuid4().hex,
+            user_id=user_id,
+            company_id=company_id,
+            export_format=export_format,
+            status=ExportJobStatus.QUEUED,
+            results_written=0,
+            created_at=datetime.utcnow()
+        )
+        try:
+            await redis_conn.set(self.get_key(job.id), job.json(), ex=self.ttl)
+        except RedisError as error:
+            self.raise_unavailable(error)
+
+        task = asyncio.create_task(self._run(job))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+        return job
+
+    def _acquire_company_slot(self, company_id: int) -> asyncio.Semaphore:
+        company_slot, jobs = self._company_slots.get(company_id) or (asyncio.Semaphore(self.max_per_company), 0)
+        self._company_slots[company_id] = (company_slot, jobs + 1)
+        return company_slot
+
+    def _release_company_slot(self, company_id: int) -> None:
+        company_slot, jobs = self._company_slots[company_id]
+        if jobs > 1:
+            self._company_slots[company_id] = (company_slot, jobs - 1)
+        else:
+            del self._company_slots[company_id]
+
+    async def _run(self, job: ExportJob) -> None:
+        company_slot = self._acquire_company_slot(job.company_id)
+        try:
+            async with company_slot, self._workers:
+                await self._run_job(job)
+        except asyncio.CancelledError:
+            if job.status == ExportJobStatus.QUEUED:
+                job.status = ExportJobStatus.FAILED
+                job.error = 'Export was interrupted'
+                await self.save(job)
+            raise
+        finally:
+            self._release_company_slot(job.company_id)
+
+    async def _run_job(self, job: ExportJob) -> None:
+        self.running += 1
+        job.status = ExportJobStatus.RUNNING
+        await self.save(job)
+        try:
+            await self._build(job)
+        except asyncio.CancelledError:
+            job.status = ExportJobStatus.FAILED
+            job.error = 'Export was interrupted'
+            await self.save(job)
+            raise
+        except Exception as error:
+            logger.exception('Export job %s failed: %r', job.id, error)
+            self.failed += 1
+            job.status = ExportJobStatus.FAILED
+            job.error = 'Export failed'
+        else:
+            self.completed += 1
+            job.status = ExportJobStatus.DONE
+            job.finished_at = datetime.utcnow()
+            job.expires_at = job.finished_at + timedelta(seconds=self.ttl)
+            job.download_url = f'/exports/{job.id}/download'
+        finally:
+            self.running -= 1
+        await self.save(job)
+
+    async def _count(self, job: ExportJob, results: AsyncIterator[dict]) -> AsyncIterator[dict]:
+        async for result in results:
+            yield result
+            job.results_written += 1
+            if job.results_written % PROGRESS_INTERVAL == 0:
+                await self.save(job)
+
+    async def _build(self, job: ExportJob) -> None:
+        results = self._count(job, quiz_answer_store.iter_results(quiz_answer_store.get_company_index(job.company_id)))
+
+        path = self.get_path(job)
+        part_path = f'{path}.part'
+        await asyncio.to_thread(os.makedirs, self.directory, exist_ok=True)
+
+        if job.export_format == ExportJobFormat.PARQUET:
+            await self._build_parquet(job, results, part_path)
+        else:
+            await self._build_chunks(job, results, part_path)
+        # The file appears under its final name only when complete
+        await asyncio.to_thread(os.replace, part_path, path)
+
+    @staticmethod
+    async def _build_parquet(job: ExportJob, results: AsyncIterator[dict], part_path: str) -> None:
+        # Imported here: a broken pyarrow install then fails parquet exports only, not the app's startup
+        from app.utils.parquet_writer import write_parquet
+
+        try:
+            await write_parquet(results=results, path=part_path, db=await get_read_db(), company_id=job.company_id)
+        except BaseException:
+            if os.path.exists(part_path):
+                await asyncio.to_thread(os.remove, part_path)
+            raise
+
+    @staticmethod
+    async def _build_chunks(job: ExportJob, results: AsyncIterator[dict], part_path: str) -> None:
+        chunks = ENCODERS[job.export_format](results)
+        file = await asyncio.to_thread(open, part_path, 'wb')
+        try:
+            buffer = bytearray()
+            async for chunk in chunks:
+                buffer += chunk
+                if len(buffer) >= WRITE_SIZE:
+                    await asyncio.to_thread(file.write, bytes(buffer))
+                    buffer.clear()
+            await asyncio.to_thread(file.write, bytes(buffer))
+        except BaseException:
+            await asyncio.to_thread(file.close)
+            await asyncio.to_thread(os.remove, part_path)
+            raise
+        await asyncio.to_thread(file.close)
+
+    def remove_expired_files(self) -> int:
+        if not os.path.isdir(self.directory):
+            return 0
+
+        removed = 0
+        expired_before = time.time() - self.ttl
+        for entry in os.scandir(self.directory):
+            if entry.is_file() and entry.stat().st_mtime < expired_before:
+                os.remove(entry.path)
+                removed += 1
+        return removed
+
+    async def cleanup(self) -> int:
+        return await asyncio.to_thread(self.remove_expired_files)
+
+    async def shutdown(self) -> None:
+        # Waits for the cancelled jobs to save their interrupted state, so call it before Redis is closed
+        tasks = list(self._tasks)
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+    def stats(self) -> ExportJobsStats:
+        return ExportJobsStats(
+            max_workers=self.max_workers,
+            max_per_company=self.max_per_company,
+            max_queue=self.max_queue,
+            running=self.running,
+            queued=len(self._tasks) - self.running,
+            completed=self.completed,
+            failed=self.failed,
+            rejected=self.rejected
+        )
+
+
+export_runner = ExportJobRunner(
+    directory=system_config.export_dir or os.path.join(tempfile.gettempdir(), 'quiz_exports'),
+    max_workers=system_config.export_workers,
+    max_per_company=system_config.export_max_per_company,
+    max_queue=system_config.export_max_queue,
+    ttl=system_config.export_ttl
+)
@@ -0,0 +1,31 @@
+from typing import Dict, Sequence
+
+
+class LatencyHistogram:
+    """Non-cumulative latency histogram: each observation is counted in the first bucket it fits."""
+
+    def __init__(self, buckets_ms: Sequence[float]):
+        self.buckets_ms = tuple(buckets_ms)
+        self.counts = [0] * (len(self.buckets_ms) + 1)
+        self.count = 0
+        self.sum_ms = 0.0
+        self.max_ms = 0.0
+
+    def observe(self, latency_ms: float) -> None:
+        self.count += 1
+        self.sum_ms += latency_ms
+        self.max_ms = max(self.max_ms, latency_ms)
+
+        for i, bucket in enumerate(self.buckets_ms):
+            if latency_ms <= bucket:
+                self.counts[i] += 1
+                return
+        self.counts[-1] += 1
+
+    def avg_ms(self) -> float:
+        return round(self.sum_ms / self.count, 2) if self.count else 0.0
+
+    def as_dict(self) -> Dict[str, int]:
+        buckets = {f'le_{bucket}': count for bucket, count in zip(self.buckets_ms, self.counts)}
+        buckets['inf'] = self.counts[-1]
+        return buckets
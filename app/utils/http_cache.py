@@ -0,0 +1,46 @@
+from typing import Optional
+
+from fastapi import Header, HTTPException, Response
+
+# Responses depend on the caller's role, so only the caller's own cache may keep them, and must revalidate each time
+CACHE_CONTROL = 'private, no-cache'
+
+
+def make_etag(content_hash: str) -> str:
+    return f'"{content_hash}"'
+
+
+def etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    if not if_none_match:
+        return False
+
+    for candidate in if_none_match.split(','):
+        candidate = candidate.strip()
+        # If-None-Match uses weak comparison
+        if candidate == '*' or candidate.removeprefix('W/') == etag:
+            return True
+    return False
+
+
+class ConditionalGet:
+    """
+    Dependency for GET routes with an ETag: `check()` raises 304 if the client already has the content,
+    otherwise puts the validators on the response.
+    """
+
+    def __init__(self, response: Response, if_none_match: Optional[str] = Header(None)):
+        self.response = response
+        self.if_none_match = if_none_match
+        self.headers: dict[str, str] = {}
+
+    def check(self, content_hash: str) -> None:
+        etag = make_etag(content_hash)
+        self.headers = {
+            'ETag': etag,
+            'Cache-Control': CACHE_CONTROL,
+            'Vary': 'Authorization',
+        }
+
+        if etag_matches(self.if_none_match, etag):
+            raise HTTPException(status_code=304, headers=self.headers)
+        self.response.headers.update(self.headers)
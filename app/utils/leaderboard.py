@@ -0,0 +1,243 @@
+import logging
+from typing import Iterable, Optional
+
+from redis import RedisError, WatchError
+
+from app.db.connections import redis_conn
+from app.schemas.leaderboard_schemas import Leaderboard, LeaderboardEntry
+
+logger = logging.getLogger(__name__)
+
+# Rebuilding a company's boards is given up after this many updates land in the middle of it
+REPLACE_ATTEMPTS = 10
+
+# KEYS: quiz board, company board, company totals. ARGV: user id, quiz id, the user's cumulative percentage
+# in the quiz, id of the result it was computed from.
+# The company rating is the average of the user's quiz percentages, as in QuizService.get_rating_by_company:
+# the totals hash keeps their sum and count, and a quiz already on the board only moves the sum by the difference.
+# Boards are updated after the submission's transaction commits, so two submissions can arrive out of order:
+# the totals hash also keeps the id of the result applied per (user, quiz), and older or repeated results are ignored.
+UPDATE_SCRIPT = """
+local user_id = ARGV[1]
+local rating = tonumber(ARGV[3])
+local result_id = tonumber(ARGV[4])
+local result_field = user_id .. ':' .. ARGV[2] .. ':rid'
+local applied = tonumber(redis.call('HGET', KEYS[3], result_field) or '0')
+if applied >= result_id then
+    return 0
+end
+redis.call('HSET', KEYS[3], result_field, result_id)
+
+local previous = redis.call('ZSCORE', KEYS[1], user_id)
+redis.call('ZADD', KEYS[1], rating, user_id)
+
+local delta = rating
+local new_quiz = 1
+if previous then
+    delta = rating - tonumber(previous)
+    new_quiz = 0
+end
+local quizzes = redis.call('HINCRBY', KEYS[3], user_id .. ':quizzes', new_quiz)
+if quizzes < 1 then
+    quizzes = redis.call('HINCRBY', KEYS[3], user_id .. ':quizzes', 1)
+end
+local total = tonumber(redis.call('HINCRBYFLOAT', KEYS[3], user_id .. ':sum', delta))
+redis.call('ZADD', KEYS[2], string.format('%.2f', total / quizzes), user_id)
+return quizzes
+"""
+
+
+class LeaderboardStore:
+    """
+    Sorted sets of users by rating: one per company and one per quiz, with the rating as the score.
+
+    Every submission updates the quiz board and the company board in one Lua script, so both move together;
+    updates and reads are O(log N) in the size of the board. Boards have no TTL and are repopulated from
+    quiz_user_summary by 'python -m app.commands.rebuild_leaderboards'.
+    Keys of one company share a hash tag, so the script also runs on Redis Cluster.
+    """
+
+    def __init__(self):
+        self._update = redis_conn.register_script(UPDATE_SCRIPT)
+
+    @staticmethod
+    def get_company_key(company_id: int) -> str:
+        return f'leaderboard:{{{company_id}}}:company'
+
+    @staticmethod
+    def get_quiz_key(company_id: int, quiz_id: int) -> str:
+        return f'leaderboard:{{{company_id}}}:quiz:{quiz_id}'
+
+    @staticmethod
+    def get_totals_key(company_id: int) -> str:
+        return f'leaderboard:{{{company_id}}}:totals'
+
+    @staticmethod
+    def to_entries(members: list[tuple[bytes, float]], start: int) -> list[LeaderboardEntry]:
+        return [
+            LeaderboardEntry(rank=start + position + 1, user_id=int(member), rating=score)
+            for position, (member, score) in enumerate(members)
+        ]
+
+    # Writing
+    @staticmethod
+    def get_result_field(user_id: int, quiz_id: int) -> str:
+        return f'{user_id}:{quiz_id}:rid'
+
+    async def update(self, company_id: int, quiz_id: int, user_id: int, rating: float, result_id: int) -> bool:
+        """Applies the rating computed from `result_id`; False if a later result was already applied."""
+        try:
+            return bool(await self._update(
+                keys=[
+                    self.get_quiz_key(company_id, quiz_id),
+                    self.get_company_key(company_id),
+                    self.get_totals_key(company_id)
+                ],
+                args=[user_id, quiz_id, rating, result_id]
+            ))
+        except RedisError as error:
+            # The result is already committed; the boards catch up on the user's next submission or a rebuild
+            logger.warning('Leaderboards of company %s not updated: %r', company_id, error)
+            return False
+
+    async def replace_company(
+            self,
+            company_id: int,
+            ratings: Iterable[tuple[int, int, float, int]],
+            read_up_to: int
+    ) -> bool:
+        """
+        Replaces all boards of a company with (quiz_id, user_id, cumulative percentage, result id) ratings
+        read from Postgres when the latest result id was `read_up_to`.
+
+        Submissions keep updating the boards while the ratings are read, so a rating already on a board
+        that comes from a later result than the one read (or than `read_up_to`, for pairs not read at all)
+        is kept. The boards are rewritten in a MULTI that is retried up to REPLACE_ATTEMPTS times
+        if an update lands in between; False if every attempt lost that race.
+        """
+        ratings = {(quiz_id, user_id): (rating, result_id) for quiz_id, user_id, rating, result_id in ratings}
+        totals_key = self.get_totals_key(company_id)
+
+        async with redis_conn.pipeline(transaction=True) as pipe:
+            for _ in range(REPLACE_ATTEMPTS):
+                try:
+                    # Every update writes the totals hash, so watching it is enough
+                    await pipe.watch(totals_key)
+                    applied = self.get_result_ids(await pipe.hgetall(totals_key))
+                    current = await self.get_newer_ratings(pipe, company_id, applied, ratings, read_up_to)
+
+                    # Every rating on a quiz board has its result id in the totals hash; no keyspace scan needed
+                    quiz_ids = {quiz_id for quiz_id, _ in applied} | {quiz_id for quiz_id, _ in ratings}
+                    pipe.multi()
+                    pipe.delete(
+                        self.get_company_key(company_id),
+                        totals_key,
+                        *[self.get_quiz_key(company_id, quiz_id) for quiz_id in quiz_ids]
+                    )
+                    self.queue_boards(pipe, company_id, {**ratings, **current})
+                    await pipe.execute()
+                    return True
+                except WatchError:
+                    continue
+
+        logger.warning(
+            'Leaderboards of company %s not replaced: updated concurrently %s times', company_id, REPLACE_ATTEMPTS
+        )
+        return False
+
+    @staticmethod
+    def get_result_ids(totals: dict[bytes, bytes]) -> dict[tuple[int, int], int]:
+        """(quiz_id, user_id) -> id of the result applied, from the fields of a totals hash."""
+        result_ids = {}
+        for field, value in totals.items():
+            # Besides the result ids the hash holds '<user>:quizzes' and '<user>:sum'
+            parts = field.decode().split(':')
+            if len(parts) == 3:
+                result_ids[(int(parts[1]), int(parts[0]))] = int(value)
+        return result_ids
+
+    async def get_newer_ratings(
+            self,
+            pipe,
+            company_id: int,
+            applied: dict[tuple[int, int], int],
+            ratings: dict[tuple[int, int], tuple[float, int]],
+            read_up_to: int
+    ) -> dict[tuple[int, int], tuple[float, int]]:
+        """Ratings on the boards that come from later results than `ratings` has for the same (quiz, user)."""
+        newer = {}
+        for (quiz_id, user_id), result_id in applied.items():
+            read = ratings.get((quiz_id, user_id))
+            if result_id > (read[1] if read else read_up_to):
+                rating = await pipe.zscore(self.get_quiz_key(company_id, quiz_id), user_id)
+                if rating is not None:
+                    newer[(quiz_id, user_id)] = (rating, result_id)
+        return newer
+
+    def queue_boards(self, pipe, company_id: int, ratings: dict[tuple[int, int], tuple[float, int]]) -> None:
+        quiz_boards: dict[int, dict[int, float]] = {}
+        totals: dict[int, list[float]] = {}
+        for (quiz_id, user_id), (rating, _) in ratings.items():
+            quiz_boards.setdefault(quiz_id, {})[user_id] = rating
+            totals.setdefault(user_id, []).append(rating)
+
+        for quiz_id, board in quiz_boards.items():
+            pipe.zadd(self.get_quiz_key(company_id, quiz_id), board)
+        if totals:
+            pipe.zadd(self.get_company_key(company_id), {
+                user_id: round(sum(user_ratings) / len(user_ratings), 2)
+                for user_id, user_ratings in totals.items()
+            })
+            pipe.hset(self.get_totals_key(company_id), mapping={
+                **{
+                    field: value
+                    for user_id, user_ratings in totals.items()
+                    for field, value in (
+                        (f'{user_id}:quizzes', len(user_ratings)),
+                        (f'{user_id}:sum', sum(user_ratings))
+                    )
+                },
+                **{
+                    self.get_result_field(user_id, quiz_id): result_id
+                    for (quiz_id, user_id), (_, result_id) in ratings.items()
+                }
+            })
+
+    async def get_company_ids(self) -> set[int]:
+        """Companies that have any board in Redis."""
+        return {
+            int(key.decode().split('{', 1)[1].split('}', 1)[0])
+            async for key in redis_conn.scan_iter(match='leaderboard:{*}:company')
+        }
+
+    # Reading
+    async def get_top(self, key: str, limit: int) -> Leaderboard:
+        pipe = redis_conn.pipeline(transaction=False)
+        pipe.zcard(key)
+        pipe.zrevrange(key, 0, limit - 1, withscores=True)
+        total, members = await pipe.execute()
+        return Leaderboard(total=total, entries=self.to_entries(members, start=0))
+
+    async def get_rank(self, key: str, user_id: int) -> Optional[LeaderboardEntry]:
+        pipe = redis_conn.pipeline(transaction=False)
+        pipe.zrevrank(key, user_id)
+        pipe.zscore(key, user_id)
+        rank, score = await pipe.execute()
+        if rank is None:
+            return None
+        return LeaderboardEntry(rank=rank + 1, user_id=user_id, rating=score)
+
+    async def get_around(self, key: str, user_id: int, radius: int) -> Optional[Leaderboard]:
+        rank = await redis_conn.zrevrank(key, user_id)
+        if rank is None:
+            return None
+
+        start = max(rank - radius, 0)
+        pipe = redis_conn.pipeline(transaction=False)
+        pipe.zcard(key)
+        pipe.zrevrange(key, start, rank + radius, withscores=True)
+        total, members = await pipe.execute()
+        return Leaderboard(total=total, entries=self.to_entries(members, start=start))
+
+
+leaderboard_store = LeaderboardStore()
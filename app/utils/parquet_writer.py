@@ -0,0 +1,120 @@
+import asyncio
+from typing import AsyncIterator, Union
+
+import pyarrow as pa
+import pyarrow.parquet as pq
+from databases import Database
+from sqlalchemy import select, tuple_
+
+from app.db.replica import ReplicaRouter
+from app.models.models import QuizUserSummary
+
+SCHEMA = pa.schema([
+    ('user_id', pa.int64()),
+    ('quiz_id', pa.int64()),
+    ('result_id', pa.int64()),
+    ('date_of_quiz', pa.date32()),
+    ('correct_answers_percentage', pa.float64()),
+    ('attempts', pa.int32()),
+    ('question_number', pa.int16()),
+    ('question_text', pa.dictionary(pa.int32(), pa.string())),
+    ('user_answer', pa.dictionary(pa.int32(), pa.string())),
+    ('is_correct', pa.bool_()),
+])
+# Rows per record batch and row group (a batch is closed at the first attempt that reaches it):
+# about the most the writer holds in memory at once
+BATCH_ROWS = 16384
+
+
+async def load_attempts(
+        db: Union[ReplicaRouter, Database],
+        company_id: int,
+        pairs: list[tuple[int, int]]
+) -> dict[tuple[int, int], dict]:
+    """Latest attempt details per (user_id, quiz_id), the same attempt the answer store holds answers for."""
+    query = select(
+        QuizUserSummary.user_id,
+        QuizUserSummary.quiz_id,
+        QuizUserSummary.last_result_id,
+        QuizUserSummary.last_date,
+        QuizUserSummary.last_correct_answers_percentage,
+        QuizUserSummary.attempts
+    ).where(
+        QuizUserSummary.company_id == company_id,
+        tuple_(QuizUserSummary.user_id, QuizUserSummary.quiz_id).in_(pairs)
+    )
+    rows = await db.fetch_all(query)
+    return {(row.__getitem__('user_id'), row.__getitem__('quiz_id')): dict(row) for row in rows}
+
+
+def to_record_batch(columns: dict[str, list]) -> pa.RecordBatch:
+    arrays = []
+    for field in SCHEMA:
+        if pa.types.is_dictionary(field.type):
+            # Question texts and answers repeat for every attempt: stored once per row group
+            arrays.append(pa.array(columns[field.name], pa.string()).dictionary_encode())
+        else:
+            arrays.append(pa.array(columns[field.name], field.type))
+    return pa.RecordBatch.from_arrays(arrays, schema=SCHEMA)
+
+
+def write_record_batch(writer: pq.ParquetWriter, columns: dict[str, list]) -> None:
+    batch = to_record_batch(columns)
+    # One row group per batch, even when it is a little over BATCH_ROWS
+    writer.write_batch(batch, row_group_size=batch.num_rows)
+
+
+async def write_parquet(
+        results: AsyncIterator[dict],
+        path: str,
+        db: Union[ReplicaRouter, Database],
+        company_id: int
+) -> None:
+    """
+    One row per answered question, written in record batches of at most BATCH_ROWS rows.
+    Encoding and writing run in a thread, reading the next results runs on the event loop.
+    """
+    writer = await asyncio.to_thread(pq.ParquetWriter, path, SCHEMA, compression='zstd')
+    try:
+        pending = []
+        pending_rows = 0
+        async for result in results:
+            pending.append(result)
+            pending_rows += len(result['questions'])
+            if pending_rows >= BATCH_ROWS:
+                await write_batch(writer, pending, db, company_id)
+                pending = []
+                pending_rows = 0
+
+        if pending:
+            await write_batch(writer, pending, db, company_id)
+    finally:
+        await asyncio.to_thread(writer.close)
+
+
+async def write_batch(writer: pq.ParquetWriter, results: list[dict], db, company_id: int) -> None:
+    attempts = await load_attempts(
+        db=db,
+        company_id=company_id,
+        pairs=list({(int(result['user_id']), int(result['quiz_id'])) for result in results})
+    )
+
+    columns = {field.name: [] for field in SCHEMA}
+    for result in results:
+        user_id, quiz_id = int(result['user_id']), int(result['quiz_id'])
+        # Missing only for attempts made before the summary table was backfilled
+        attempt = attempts.get((user_id, quiz_id), {})
+
+        for number, question in enumerate(result['questions'], start=1):
+            columns['user_id'].append(user_id)
+            columns['quiz_id'].append(quiz_id)
+            columns['result_id'].append(attempt.get('last_result_id'))
+            columns['date_of_quiz'].append(attempt.get('last_date'))
+            columns['correct_answers_percentage'].append(attempt.get('last_correct_answers_percentage'))
+            columns['attempts'].append(attempt.get('attempts'))
+            columns['question_number'].append(number)
+            columns['question_text'].append(question['question_text'])
+            columns['user_answer'].append(question['user_answer'])
+            columns['is_correct'].append(question['is_correct'] == 'correct')
+
+    await asyncio.to_thread(write_record_batch, writer, columns)
@@ -0,0 +1,142 @@
+import asyncio
+import logging
+import time
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from functools import lru_cache
+from typing import Callable, Coroutine, Optional
+
+from fastapi import HTTPException
+from passlib.context import CryptContext
+
+from app.schemas.metrics_schemas import PasswordHasherStats
+from app.utils.histogram import LatencyHistogram
+from system_config import system_config
+
+logger = logging.getLogger(__name__)
+
+LATENCY_BUCKETS_MS = (10, 25, 50, 100, 250, 500, 1000, 2500, 5000)
+
+
+# Module level so that the functions below can be pickled into a process pool
+@lru_cache
+def get_bcrypt_context(rounds: int) -> CryptContext:
+    # Hashes made with any other cost are reported by needs_update() as out of policy
+    return CryptContext(
+        schemes=['bcrypt'],
+        deprecated='auto',
+        bcrypt__default_rounds=rounds,
+        bcrypt__min_rounds=rounds,
+        bcrypt__max_rounds=rounds
+    )
+
+
+def hash_password(password: str, rounds: int) -> str:
+    return get_bcrypt_context(rounds).hash(password)
+
+
+def verify_password(password: str, hashed_password: str, rounds: int) -> bool:
+    return get_bcrypt_context(rounds).verify(password, hashed_password)
+
+
+class PasswordHasher:
+    """
+    Runs bcrypt in a dedicated thread or process pool so it never blocks the event loop.
+
+    At most `max_workers` operations run at once and at most `max_queue` more wait for a worker.
+    Anything above that is rejected with 503 straight away instead of piling up.
+    """
+
+    def __init__(self, pool_type: str, max_workers: int, max_queue: int, rounds: int):
+        if pool_type not in ('thread', 'process'):
+            raise ValueError(f"Unknown password hasher pool type '{pool_type}'")
+
+        self.rounds = rounds
+        self.pool_type = pool_type
+        self.max_workers = max_workers
+        self.max_queue = max_queue
+        self._executor: Optional[Executor] = None
+        self._background_tasks: set[asyncio.Task] = set()
+
+        self.in_flight = 0
+        self.rejected = 0
+        self.rehashed = 0
+        self.latency = LatencyHistogram(LATENCY_BUCKETS_MS)
+
+    def _get_executor(self) -> Executor:
+        if self._executor is None:
+            if self.pool_type == 'process':
+                self._executor = ProcessPoolExecutor(max_workers=self.max_workers)
+            else:
+                self._executor = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix='bcrypt')
+        return self._executor
+
+    async def _run(self, func: Callable, *args):
+        if self.in_flight >= self.max_workers + self.max_queue:
+            self.rejected += 1
+            raise HTTPException(
+                status_code=503,
+                detail='Too many password operations in progress, try again later',
+                headers={'Retry-After': '1'}
+            )
+
+        self.in_flight += 1
+        started = time.perf_counter()
+        try:
+            loop = asyncio.get_running_loop()
+            return await loop.run_in_executor(self._get_executor(), func, *args)
+        finally:
+            self.in_flight -= 1
+            self.latency.observe((time.perf_counter() - started) * 1000)
+
+    async def hash(self, password: str) -> str:
+        return await self._run(hash_password, password, self.rounds)
+
+    async def verify(self, password: str, hashed_password: str) -> bool:
+        return await self._run(verify_password, password, hashed_password, self.rounds)
+
+    def needs_rehash(self, hashed_password: str) -> bool:
+        return get_bcrypt_context(self.rounds).needs_update(hashed_password)
+
+    def run_rehash(self, rehash: Coroutine) -> None:
+        task = asyncio.create_task(self._rehash(rehash))
+        self._background_tasks.add(task)
+        task.add_done_callback(self._background_tasks.discard)
+
+    async def _rehash(self, rehash: Coroutine) -> None:
+        try:
+            await rehash
+            self.rehashed += 1
+        except HTTPException:
+            # Pool is saturated, the hash will be upgraded on one of the next logins
+            pass
+        except Exception as error:
+            # Nobody awaits this task: a DB or pool error would otherwise only surface as an unretrieved exception
+            logger.warning('Password rehash failed, retried on a later login: %r', error)
+
+    def shutdown(self) -> None:
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+
+    def stats(self) -> PasswordHasherStats:
+        return PasswordHasherStats(
+            rounds=self.rounds,
+            pool_type=self.pool_type,
+            max_workers=self.max_workers,
+            max_queue=self.max_queue,
+            in_flight=self.in_flight,
+            queued=max(self.in_flight - self.max_workers, 0),
+            completed=self.latency.count,
+            rejected=self.rejected,
+            rehashed=self.rehashed,
+            latency_avg_ms=self.latency.avg_ms(),
+            latency_buckets_ms=self.latency.as_dict()
+        )
+
+
+password_hasher = PasswordHasher(
+    pool_type=system_config.password_hasher_pool,
+    max_workers=system_config.password_hasher_workers,
+    max_queue=system_config.password_hasher_max_queue,
+    rounds=system_config.bcrypt_rounds
+)
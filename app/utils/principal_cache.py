@@ -0,0 +1,239 @@
+import asyncio
+import hashlib
+import logging
+import time
+from collections import OrderedDict
+from typing import Optional
+
+from redis import RedisError
+
+from app.db.connections import redis_conn
+from app.schemas.metrics_schemas import PrincipalCacheStats
+from app.schemas.user_schemas import UserResponse
+from system_config import system_config
+
+logger = logging.getLogger(__name__)
+
+# Invalidations are published here, so every worker drops the user from its local tier
+INVALIDATION_CHANNEL = 'principal_invalidations'
+# How long the listener waits for a message before checking again, and before resubscribing after an error
+LISTEN_TIMEOUT = 1.0
+RESUBSCRIBE_DELAY = 1.0
+
+
+class PrincipalCache:
+    """
+    Caches authenticated users by the digest of the token they came with.
+
+    Local tier is a per-worker TTL/LRU dict, Redis tier is shared between workers and is optional.
+    An entry never outlives the token's `exp`.
+
+    `invalidate_user` is broadcast over Redis pub/sub to the listener that `start()` runs in every worker.
+    Whenever the listener (re)subscribes it clears the local tier, since invalidations sent while it was not
+    subscribed are lost: a worker cut off from Redis serves stale principals for at most `local_ttl`.
+    """
+
+    def __init__(self, max_size: int, local_ttl: int, redis_ttl: int, use_redis: bool):
+        self.max_size = max_size
+        self.local_ttl = local_ttl
+        self.redis_ttl = redis_ttl
+        self.use_redis = use_redis
+
+        self._entries: OrderedDict[str, tuple[float, UserResponse]] = OrderedDict()
+        self._user_digests: dict[int, set[str]] = {}
+        self._listener_task: Optional[asyncio.Task] = None
+
+        self.local_hits = 0
+        self.redis_hits = 0
+        self.misses = 0
+        self.invalidations = 0
+
+    @staticmethod
+    def get_digest(token: str) -> str:
+        return hashlib.sha256(token.encode()).hexdigest()
+
+    @staticmethod
+    def get_redis_key(digest: str) -> str:
+        return f'principal:{digest}'
+
+    @staticmethod
+    def get_redis_user_key(user_id: int) -> str:
+        return f'principal_user:{user_id}'
+
+    # Local tier
+    def _get_local(self, digest: str) -> Optional[UserResponse]:
+        entry = self._entries.get(digest)
+        if not entry:
+            return None
+
+        expires_at, user = entry
+        if expires_at <= time.time():
+            self._drop_local(digest)
+            return None
+
+        self._entries.move_to_end(digest)
+        return user
+
+    def _set_local(self, digest: str, user: UserResponse, expires_at: float) -> None:
+        self._entries[digest] = (expires_at, user)
+        self._entries.move_to_end(digest)
+        self._user_digests.setdefault(user.id, set()).add(digest)
+
+        while len(self._entries) > self.max_size:
+            oldest_digest = next(iter(self._entries))
+            self._drop_local(oldest_digest)
+
+    def _drop_local(self, digest: str) -> None:
+        entry = self._entries.pop(digest, None)
+        if not entry:
+            return
+
+        user_digests = self._user_digests.get(entry[1].id)
+        if user_digests is not None:
+            user_digests.discard(digest)
+            if not user_digests:
+                del self._user_digests[entry[1].id]
+
+    def _drop_user_local(self, user_id: int) -> None:
+        for digest in list(self._user_digests.get(user_id, ())):
+            self._drop_local(digest)
+
+    def _clear_local(self) -> None:
+        self._entries.clear()
+        self._user_digests.clear()
+
+    # Redis tier
+    async def _get_redis(self, digest: str) -> Optional[tuple[UserResponse, float]]:
+        try:
+            pipe = redis_conn.pipeline(transaction=False)
+            pipe.get(self.get_redis_key(digest))
+            pipe.ttl(self.get_redis_key(digest))
+            value, ttl = await pipe.execute()
+        except RedisError:
+            return None
+
+        if not value or ttl <= 0:
+            return None
+
+        return UserResponse.parse_raw(value), time.time() + ttl
+
+    async def _set_redis(self, digest: str, user: UserResponse, ttl: int) -> None:
+        user_key = self.get_redis_user_key(user.id)
+        try:
+            pipe = redis_conn.pipeline()
+            pipe.set(self.get_redis_key(digest), user.json(), ex=ttl)
+            pipe.sadd(user_key, digest)
+            pipe.expire(user_key, self.redis_ttl)
+            await pipe.execute()
+        except RedisError:
+            pass
+
+    async def _invalidate_redis(self, user_id: int) -> None:
+        user_key = self.get_redis_user_key(user_id)
+        try:
+            digests = await redis_conn.smembers(user_key)
+            keys = [self.get_redis_key(digest.decode()) for digest in digests]
+            await redis_conn.delete(user_key, *keys)
+        except RedisError:
+            pass
+
+    # Invalidation broadcast
+    async def _publish_invalidation(self, user_id: int) -> None:
+        try:
+            await redis_conn.publish(INVALIDATION_CHANNEL, user_id)
+        except RedisError as error:
+            logger.warning('Invalidation of user %s not broadcast: %r', user_id, error)
+
+    async def _listen(self) -> None:
+        while True:
+            pubsub = redis_conn.pubsub(ignore_subscribe_messages=True)
+            try:
+                await pubsub.subscribe(INVALIDATION_CHANNEL)
+                self._clear_local()
+
+                while True:
+                    # Polled with a timeout, as a blocking read would run into the pool's socket_timeout
+                    message = await pubsub.get_message(ignore_subscribe_messages=True, timeout=LISTEN_TIMEOUT)
+                    if message and message['type'] == 'message':
+                        self._drop_user_local(int(message['data']))
+            except (RedisError, OSError) as error:
+                logger.warning('Principal invalidation listener lost Redis: %r', error)
+            finally:
+                await pubsub.reset()
+
+            await asyncio.sleep(RESUBSCRIBE_DELAY)
+
+    async def start(self) -> None:
+        if self._listener_task is None:
+            self._listener_task = asyncio.create_task(self._listen())
+
+    async def stop(self) -> None:
+        if self._listener_task is not None:
+            self._listener_task.cancel()
+            await asyncio.gather(self._listener_task, return_exceptions=True)
+            self._listener_task = None
+
+    # Public interface
+    async def get(self, token: str) -> Optional[UserResponse]:
+        digest = self.get_digest(token)
+
+        user = self._get_local(digest)
+        if user:
+            self.local_hits += 1
+            return user.copy()
+
+        if self.use_redis:
+            redis_entry = await self._get_redis(digest)
+            if redis_entry:
+                user, expires_at = redis_entry
+                self._set_local(digest, user, min(expires_at, time.time() + self.local_ttl))
+                self.redis_hits += 1
+                return user.copy()
+
+        self.misses += 1
+        return None
+
+    async def set(self, token: str, user: UserResponse, expires_at: Optional[int]) -> None:
+        now = time.time()
+        if expires_at is None or expires_at <= now:
+            return
+
+        digest = self.get_digest(token)
+        self._set_local(digest, user.copy(), min(expires_at, now + self.local_ttl))
+
+        if self.use_redis:
+            ttl = int(min(expires_at - now, self.redis_ttl))
+            if ttl > 0:
+                await self._set_redis(digest, user, ttl)
+
+    async def invalidate_user(self, user_id: int) -> None:
+        self._drop_user_local(user_id)
+
+        if self.use_redis:
+            await self._invalidate_redis(user_id)
+        await self._publish_invalidation(user_id)
+
+        self.invalidations += 1
+
+    def stats(self) -> PrincipalCacheStats:
+        hits = self.local_hits + self.redis_hits
+        lookups = hits + self.misses
+
+        return PrincipalCacheStats(
+            size=len(self._entries),
+            max_size=self.max_size,
+            use_redis=self.use_redis,
+            local_hits=self.local_hits,
+            redis_hits=self.redis_hits,
+            misses=self.misses,
+            invalidations=self.invalidations,
+            hit_ratio=round(hits / lookups, 4) if lookups else 0.0
+        )
+
+
+principal_cache = PrincipalCache(
+    max_size=system_config.principal_cache_size,
+    local_ttl=system_config.principal_cache_local_ttl,
+    redis_ttl=system_config.principal_cache_redis_ttl,
+    use_redis=system_config.principal_cache_use_redis
+)
@@ -0,0 +1,256 @@
+import json
+import logging
+import time
+import zlib
+from typing import AsyncIterator, Iterable, Optional
+
+import orjson
+
+from app.db.connections import redis_conn
+from app.utils.quiz_content_cache import QuizContent
+from system_config import system_config
+
+logger = logging.getLogger(__name__)
+
+REDIS_RESULT_TTL = 3600 * 48
+MGET_CHUNK_SIZE = 500
+
+# First byte of an encoded value. Values written before encoding existed are plain JSON text and start with '['
+FORMAT_ORJSON = b'\x01'
+FORMAT_ORJSON_ZLIB = b'\x02'
+
+# A question snapshot is rewritten at most this often per quiz version, and outlives the answers that refer to it
+SNAPSHOT_REFRESH_INTERVAL = 3600
+SNAPSHOT_TTL = REDIS_RESULT_TTL + SNAPSHOT_REFRESH_INTERVAL
+
+# KEYS: payload key, then its index sets. The key is dropped from the indexes only if it still doesn't exist:
+# a resubmit between the export's MGET and the prune has already re-added it and must stay indexed.
+PRUNE_SCRIPT = """
+if redis.call('EXISTS', KEYS[1]) == 1 then
+    return 0
+end
+for i = 2, #KEYS do
+    redis.call('SREM', KEYS[i], KEYS[1])
+end
+return 1
+"""
+
+
+def encode(value, compression: str) -> bytes:
+    data = orjson.dumps(value)
+    if compression == 'zlib':
+        return FORMAT_ORJSON_ZLIB + zlib.compress(data)
+    return FORMAT_ORJSON + data
+
+
+def decode(data: bytes):
+    marker = data[:1]
+    if marker == FORMAT_ORJSON_ZLIB:
+        return orjson.loads(zlib.decompress(data[1:]))
+    if marker == FORMAT_ORJSON:
+        return orjson.loads(data[1:])
+    return json.loads(data)
+
+
+def value_is_legacy(payload) -> bool:
+    # Legacy values are the rendered answers themselves: a list of dicts
+    return not payload or isinstance(payload[0], dict)
+
+
+class QuizAnswerStore:
+    """
+    Answers of the latest attempt per (user, company, quiz), kept in Redis for REDIS_RESULT_TTL.
+
+    An attempt is stored as the quiz content version and (question id, answer index) pairs.
+    Question texts are stored once per quiz version in a snapshot and joined back in when answers are read.
+
+    Each payload key is also a member of three index sets (by user, by company, by quiz), so exports read
+    exactly their keys instead of scanning the keyspace. Index sets live as long as their newest member;
+    members whose payload has expired are removed from the sets when an export runs into them.
+    """
+
+    def __init__(self, compression: str):
+        self.compression = compression
+        self._prune = redis_conn.register_script(PRUNE_SCRIPT)
+        # quiz_id -> (content version, time its snapshot was last written by this worker)
+        self._snapshots_written: dict[int, tuple[int, float]] = {}
+
+    @staticmethod
+    def get_key(user_id: int, company_id: int, quiz_id: int) -> str:
+        return f'{user_id}-{company_id}-{quiz_id}'
+
+    @staticmethod
+    def get_snapshot_key(quiz_id: int, version: int) -> str:
+        return f'quiz_answers:questions:{quiz_id}:{version}'
+
+    @staticmethod
+    def get_user_index(user_id: int) -> str:
+        return f'quiz_answers:user:{user_id}'
+
+    @staticmethod
+    def get_company_index(company_id: int) -> str:
+        return f'quiz_answers:company:{company_id}'
+
+    @staticmethod
+    def get_quiz_index(quiz_id: int) -> str:
+        return f'quiz_answers:quiz:{quiz_id}'
+
+    def get_indexes(self, key: str) -> list[str]:
+        user_id, company_id, quiz_id = key.split('-')
+        return [self.get_user_index(user_id), self.get_company_index(company_id), self.get_quiz_index(quiz_id)]
+
+    def snapshot_is_fresh(self, quiz_id: int, version: int) -> bool:
+        written = self._snapshots_written.get(quiz_id)
+        return bool(written) and written[0] == version and time.time() - written[1] < SNAPSHOT_REFRESH_INTERVAL
+
+    # Writing
+    async def save(self, user_id: int, company_id: int, quiz_id: int, content: QuizContent, answers: list[int]) -> None:
+        key = self.get_key(user_id, company_id, quiz_id)
+        payload = [content.version, [[question['id'], answer] for question, answer in zip(content.questions, answers)]]
+
+        # MULTI: an export never sees the payload without its index entries or its questions
+        pipe = redis_conn.pipeline(transaction=True)
+        pipe.set(key, encode(payload, self.compression), ex=REDIS_RESULT_TTL)
+        for index in self.get_indexes(key):
+            pipe.sadd(index, key)
+            pipe.expire(index, REDIS_RESULT_TTL)
+
+        snapshot_key = self.get_snapshot_key(quiz_id, content.version)
+        refresh_snapshot = not self.snapshot_is_fresh(quiz_id, content.version)
+        if refresh_snapshot:
+            self.set_snapshot(pipe, snapshot_key, content)
+        else:
+            # Also tells whether the snapshot is still there: Redis may have been flushed or evicted it since
+            pipe.expire(snapshot_key, SNAPSHOT_TTL)
+        results = await pipe.execute()
+
+        snapshot_missing = not refresh_snapshot and not results[-1]
+        if snapshot_missing:
+            pipe = redis_conn.pipeline(transaction=False)
+            self.set_snapshot(pipe, snapshot_key, content)
+            await pipe.execute()
+
+        if refresh_snapshot or snapshot_missing:
+            self._snapshots_written[quiz_id] = (content.version, time.time())
+
+    def set_snapshot(self, pipe, snapshot_key: str, content: QuizContent) -> None:
+        snapshot = [
+            [question['id'], question['name'], question['answer_variants'], question['right_answer']]
+            for question in content.questions
+        ]
+        pipe.set(snapshot_key, encode(snapshot, self.compression), ex=SNAPSHOT_TTL)
+
+    # Reading
+    async def prune(self, keys: Iterable[str]) -> None:
+        pipe = redis_conn.pipeline(transaction=False)
+        for key in keys:
+            await self._prune(keys=[key, *self.get_indexes(key)], client=pipe)
+        await pipe.execute()
+
+    async def get_snapshots(self, snapshot_keys: set[str]) -> dict[str, dict[int, list]]:
+        """Question id -> [name, answer variants, right answer] for each snapshot key that still exists."""
+        snapshot_keys = list(snapshot_keys)
+        snapshots = {}
+        for start in range(0, len(snapshot_keys), MGET_CHUNK_SIZE):
+            chunk = snapshot_keys[start:start + MGET_CHUNK_SIZE]
+
+            for snapshot_key, value in zip(chunk, await redis_conn.mget(chunk)):
+                if value is not None:
+                    snapshots[snapshot_key] = {question[0]: question[1:] for question in decode(value)}
+        return snapshots
+
+    @staticmethod
+    def render(answers: list, questions: dict[int, list]) -> Optional[list[dict]]:
+        graded = []
+        for question_id, answer in answers:
+            question = questions.get(question_id)
+            if question is None:
+                return None
+
+            name, answer_variants, right_answer = question
+            graded.append({
+                'question_text': name,
+                'user_answer': answer_variants[answer],
+                'is_correct': 'correct' if answer == right_answer else 'incorrect'
+            })
+        return graded
+
+    async def iter_keys(self, *indexes: str) -> AsyncIterator[list[str]]:
+        """Chunks of MGET_CHUNK_SIZE keys that are in all of `indexes`."""
+        if len(indexes) > 1:
+            members = sorted(await redis_conn.sinter(*indexes))
+            for start in range(0, len(members), MGET_CHUNK_SIZE):
+                yield [member.decode() for member in members[start:start + MGET_CHUNK_SIZE]]
+            return
+
+        # A single index is walked with SSCAN, so it is never held in memory at once.
+        # SSCAN may return a member more than once (e.g. while the set is rehashed), so seen keys are remembered
+        chunk = []
+        seen = set()
+        async for member in redis_conn.sscan_iter(indexes[0], count=MGET_CHUNK_SIZE):
+            if member in seen:
+                continue
+            seen.add(member)
+            chunk.append(member.decode())
+            if len(chunk) == MGET_CHUNK_SIZE:
+                yield chunk
+                chunk = []
+        if chunk:
+            yield chunk
+
+    async def iter_results(self, *indexes: str) -> AsyncIterator[dict]:
+        """
+        Results whose keys are in all of `indexes`, read MGET_CHUNK_SIZE at a time.
+
+        The next chunk is only read once the consumer has taken the previous one,
+        so a slow client holds one chunk in memory, not the whole export.
+        """
+        snapshots = {}
+        async for keys in self.iter_keys(*indexes):
+            payloads = []
+            expired = []
+            for key, value in zip(keys, await redis_conn.mget(keys)):
+                if value is None:
+                    expired.append(key)
+                else:
+                    payloads.append((key, decode(value)))
+
+            if expired:
+                await self.prune(expired)
+
+            missing_snapshots = {
+                self.get_snapshot_key(key.split('-')[2], payload[0])
+                for key, payload in payloads
+                if not value_is_legacy(payload)
+            }.difference(snapshots)
+            if missing_snapshots:
+                fetched = await self.get_snapshots(missing_snapshots)
+                snapshots.update({snapshot_key: fetched.get(snapshot_key, {}) for snapshot_key in missing_snapshots})
+
+            dropped = 0
+            for key, payload in payloads:
+                user_id, _, quiz_id = key.split('-')
+
+                if value_is_legacy(payload):
+                    questions = payload
+                else:
+                    version, answers = payload
+                    # A snapshot can only be missing if Redis lost it; such attempts are skipped
+                    questions = self.render(answers, snapshots.get(self.get_snapshot_key(quiz_id, version), {}))
+                    if questions is None:
+                        # Written again by this worker's next submission to the quiz
+                        self._snapshots_written.pop(int(quiz_id), None)
+                        dropped += 1
+                        continue
+
+                yield {
+                    'user_id': user_id,
+                    'quiz_id': quiz_id,
+                    'questions': questions
+                }
+
+            if dropped:
+                logger.warning('Skipped %s quiz attempts whose question snapshot is missing in Redis', dropped)
+
+
+quiz_answer_store = QuizAnswerStore(compression=system_config.quiz_answers_compression)
@@ -0,0 +1,135 @@
+from collections import OrderedDict
+from typing import Optional
+
+import orjson
+from databases import Database
+from redis import RedisError
+from sqlalchemy import select
+
+from app.db.connections import redis_conn
+from app.models.models import QuizQuestions
+from app.schemas.metrics_schemas import QuizContentCacheStats
+from app.schemas.quiz_schemas import QuestionUserResponse, QuestionUserResponseList
+from system_config import system_config
+
+
+class QuizContent:
+    """Questions of one quiz version: the full rows (with the answer key) and the user-facing JSON, rendered once."""
+
+    __slots__ = ('version', 'questions', 'user_payload')
+
+    def __init__(self, version: int, questions: list[dict], user_payload: bytes):
+        self.version = version
+        self.questions = questions
+        self.user_payload = user_payload
+
+
+class QuizContentCache:
+    """
+    Quiz questions keyed by quiz id + content version.
+
+    Every change of a quiz's questions bumps `quizzes.content_version`, so a cached version never goes stale:
+    readers simply ask for the new version. The local tier keeps one version per quiz in an LRU,
+    the Redis tier shares rendered content between workers.
+    """
+
+    def __init__(self, max_size: int, redis_ttl: int):
+        self.max_size = max_size
+        self.redis_ttl = redis_ttl
+        self._entries: OrderedDict[int, QuizContent] = OrderedDict()
+
+        self.local_hits = 0
+        self.redis_hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def get_redis_key(quiz_id: int, version: int) -> str:
+        return f'quiz_content:{quiz_id}:{version}'
+
+    @staticmethod
+    def render(version: int, questions: list[dict]) -> QuizContent:
+        user_payload = QuestionUserResponseList(
+            total=len(questions),
+            question_list=[QuestionUserResponse(**question) for question in questions]
+        ).json().encode()
+        return QuizContent(version=version, questions=questions, user_payload=user_payload)
+
+    # Tiers
+    def _get_local(self, quiz_id: int, version: int) -> Optional[QuizContent]:
+        content = self._entries.get(quiz_id)
+        if not content or content.version != version:
+            return None
+
+        self._entries.move_to_end(quiz_id)
+        return content
+
+    def _set_local(self, quiz_id: int, content: QuizContent) -> None:
+        self._entries[quiz_id] = content
+        self._entries.move_to_end(quiz_id)
+
+        while len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+
+    async def _get_redis(self, quiz_id: int, version: int) -> Optional[QuizContent]:
+        try:
+            questions, user_payload = await redis_conn.hmget(self.get_redis_key(quiz_id, version), 'questions', 'user')
+        except RedisError:
+            return None
+
+        if questions is None or user_payload is None:
+            return None
+        return QuizContent(version=version, questions=orjson.loads(questions), user_payload=user_payload)
+
+    async def _set_redis(self, quiz_id: int, content: QuizContent) -> None:
+        key = self.get_redis_key(quiz_id, content.version)
+        try:
+            pipe = redis_conn.pipeline()
+            pipe.hset(key, mapping={'questions': orjson.dumps(content.questions), 'user': content.user_payload})
+            pipe.expire(key, self.redis_ttl)
+            await pipe.execute()
+        except RedisError:
+            pass
+
+    @staticmethod
+    async def _load(db: Database, quiz_id: int) -> list[dict]:
+        # Ordered by id: this is the order questions are shown in and answers are graded in
+        query = select(QuizQuestions.__table__).where(QuizQuestions.quiz_id == quiz_id).order_by(QuizQuestions.id)
+        rows = await db.fetch_all(query)
+        return [dict(row) for row in rows]
+
+    # Public interface
+    async def get(self, db: Database, quiz_id: int, version: int) -> QuizContent:
+        content = self._get_local(quiz_id, version)
+        if content:
+            self.local_hits += 1
+            return content
+
+        content = await self._get_redis(quiz_id, version)
+        if content:
+            self.redis_hits += 1
+            self._set_local(quiz_id, content)
+            return content
+
+        self.misses += 1
+        content = self.render(version=version, questions=await self._load(db=db, quiz_id=quiz_id))
+        self._set_local(quiz_id, content)
+        await self._set_redis(quiz_id, content)
+        return content
+
+    def stats(self) -> QuizContentCacheStats:
+        lookups = self.local_hits + self.redis_hits + self.misses
+
+        return QuizContentCacheStats(
+            size=len(self._entries),
+            max_size=self.max_size,
+            local_hits=self.local_hits,
+            redis_hits=self.redis_hits,
+            misses=self.misses,
+            hit_ratio=round((self.local_hits + self.redis_hits) / lookups, 4) if lookups else 0.0
+        )
+
+
+quiz_content_cache = QuizContentCache(
+    max_size=system_config.quiz_content_cache_size,
+    redis_ttl=system_config.quiz_content_cache_ttl
+)
@@ -0,0 +1,64 @@
+import zlib
+from typing import AsyncIterator, Optional
+
+import orjson
+from starlette.responses import StreamingResponse
+
+from app.schemas.quiz_schemas import ExportFormat
+from app.utils.csv_writer import csv_chunks
+
+
+async def ndjson_lines(results: AsyncIterator[dict]) -> AsyncIterator[bytes]:
+    async for result in results:
+        yield orjson.dumps(result) + b'\n'
+
+
+async def json_results_array(results: AsyncIterator[dict]) -> AsyncIterator[bytes]:
+    # Same document as RedisQuizResults.json(), written one result at a time
+    yield b'{"results": ['
+    separator = b''
+    async for result in results:
+        yield separator + orjson.dumps(result)
+        separator = b', '
+    yield b']}'
+
+
+def stream_results(results: AsyncIterator[dict], export_format: ExportFormat) -> StreamingResponse:
+    """
+    Sends results as they are read. Each chunk is written to the socket before the next one is produced,
+    so a slow client slows down the reads instead of piling up results in memory.
+    """
+    if export_format == ExportFormat.NDJSON:
+        return StreamingResponse(ndjson_lines(results), media_type='application/x-ndjson')
+    return StreamingResponse(json_results_array(results), media_type='application/json')
+
+
+async def gzip_chunks(chunks: AsyncIterator[bytes]) -> AsyncIterator[bytes]:
+    compressor = zlib.compressobj(wbits=31)  # 31: gzip container
+    async for chunk in chunks:
+        compressed = compressor.compress(chunk)
+        if compressed:
+            yield compressed
+    yield compressor.flush()
+
+
+def accepts_gzip(accept_encoding: Optional[str]) -> bool:
+    for coding in (accept_encoding or '').split(','):
+        name, _, params = coding.strip().partition(';')
+        if name.strip().lower() == 'gzip':
+            return params.replace(' ', '') not in ('q=0', 'q=0.0', 'q=0.00', 'q=0.000')
+    return False
+
+
+def stream_csv(results: AsyncIterator[dict], filename: str, accept_encoding: Optional[str] = None) -> StreamingResponse:
+    """CSV download encoded as results are read, gzipped when the client accepts it."""
+    headers = {
+        'Content-Disposition': f'attachment; filename="{filename}"',
+        'Vary': 'Accept-Encoding',
+    }
+    chunks = csv_chunks(results)
+    if accepts_gzip(accept_encoding):
+        chunks = gzip_chunks(chunks)
+        headers['Content-Encoding'] = 'gzip'
+
+    return StreamingResponse(chunks, media_type='text/csv', headers=headers)
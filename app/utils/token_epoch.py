@@ -0,0 +1,36 @@
+import time
+from typing import Optional
+
+from redis import RedisError
+
+from app.db.connections import redis_conn
+from system_config import system_config
+
+
+def get_token_epoch_key(user_id: int) -> str:
+    return f'token_epoch:{user_id}'
+
+
+async def get_token_epoch(user_id: int) -> Optional[int]:
+    """
+    Current epoch of the user's tokens: roles embedded into a token are trusted only while it matches.
+    Returns None if Redis is unavailable, in which case embedded roles must not be trusted.
+    """
+    try:
+        epoch = await redis_conn.get(get_token_epoch_key(user_id))
+    except RedisError:
+        return None
+    return int(epoch) if epoch else 0
+
+
+async def bump_token_epoch(user_id: int) -> None:
+    # A timestamp instead of a counter, so the epoch never repeats even if Redis loses the key
+    try:
+        await redis_conn.set(
+            get_token_epoch_key(user_id),
+            int(time.time() * 1000),
+            ex=system_config.refresh_token_expire_days * 24 * 3600
+        )
+    except RedisError:
+        # Tokens issued before the change keep their roles until they expire, access tokens are short-lived
+        pass
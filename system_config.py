@@ -8,11 +8,17 @@ db_password = os.getenv("POSTGRES_PASSWORD")
 db_host = os.getenv("POSTGRES_HOST")
 db_name = os.getenv("POSTGRES_DB")
 db_port = os.getenv("POSTGRES_PORT")
+db_replica_host = os.getenv("POSTGRES_REPLICA_HOST")
+db_replica_port = os.getenv("POSTGRES_REPLICA_PORT") or db_port
 
 redis_host = os.getenv("REDIS_HOST")
 redis_port = os.getenv("REDIS_PORT")
 redis_db = os.getenv("REDIS_DB_NUM")
 
+answers_compression = os.getenv("QUIZ_ANSWERS_COMPRESSION") or 'zlib'
+if answers_compression not in ('zlib', 'none'):
+    raise ValueError(f"QUIZ_ANSWERS_COMPRESSION must be 'zlib' or 'none', not {answers_compression!r}")
+
 test_host = os.getenv("TEST_HOST")
 test_port = os.getenv("TEST_DB_PORT")
 
@@ -22,10 +28,29 @@ class SystemConfig:
 
     database_url = f'postgresql://{db_user}:{db_password}@{db_host}:{db_port}/{db_name}'
 
+    database_replica_url = (
+        f'postgresql://{db_user}:{db_password}@{db_replica_host}:{db_replica_port}/{db_name}'
+    ) if db_replica_host else None
+    db_replica_max_lag = float(os.getenv("DB_REPLICA_MAX_LAG") or 5)
+    db_replica_check_interval = float(os.getenv("DB_REPLICA_CHECK_INTERVAL") or 5)
+
     db_url_test = f'postgresql+asyncpg://{db_user}:{db_password}@{test_host}:{test_port}/{db_name}'
 
+    db_pool_min_size = int(os.getenv("DB_POOL_MIN_SIZE") or 2)
+    db_pool_max_size = int(os.getenv("DB_POOL_MAX_SIZE") or 10)
+    db_pool_max_queries = int(os.getenv("DB_POOL_MAX_QUERIES") or 50000)
+    db_pool_max_inactive_lifetime = float(os.getenv("DB_POOL_MAX_INACTIVE_LIFETIME") or 300)
+    db_pool_acquire_timeout = float(os.getenv("DB_POOL_ACQUIRE_TIMEOUT") or 10)
+    db_statement_cache_size = int(os.getenv("DB_STATEMENT_CACHE_SIZE") or 100)
+
     redis_url = f'redis://{redis_host}:{redis_port}/{redis_db}'
 
+    redis_pool_max_connections = int(os.getenv("REDIS_POOL_MAX_CONNECTIONS") or 50)
+    redis_pool_timeout = float(os.getenv("REDIS_POOL_TIMEOUT") or 5)
+    redis_socket_timeout = float(os.getenv("REDIS_SOCKET_TIMEOUT") or 2)
+    redis_socket_connect_timeout = float(os.getenv("REDIS_SOCKET_CONNECT_TIMEOUT") or 2)
+    redis_health_check_interval = int(os.getenv("REDIS_HEALTH_CHECK_INTERVAL") or 30)
+
     app_host = os.getenv("APP_HOST")
     app_port = int(os.getenv("APP_PORT"))
     debug = os.getenv("DEBUG")
@@ -33,6 +58,10 @@ class SystemConfig:
     environment = os.getenv("ENVIRONMENT")
 
     algorithm = os.getenv("ALGORITHM")
+    access_token_expire_minutes = int(os.getenv("ACCESS_TOKEN_EXPIRE_MINUTES") or 20)
+    refresh_token_expire_days = int(os.getenv("REFRESH_TOKEN_EXPIRE_DAYS") or 7)
+    token_max_company_roles = int(os.getenv("TOKEN_MAX_COMPANY_ROLES") or 100)
+    role_cache_ttl = int(os.getenv("ROLE_CACHE_TTL") or 3600)
 
     origins = [
         "http://localhost",
@@ -45,6 +74,35 @@ class SystemConfig:
     auth0_algorithms = os.getenv("AUTH0_ALGORITHMS")
     auth0_test_token = os.getenv("AUTH0_TEST_TOKEN")
     auth0_secret = os.getenv("AUTH0_SECRET")
+    auth0_jwks_file = os.getenv("AUTH0_JWKS_FILE")
+    auth0_jwks_timeout = float(os.getenv("AUTH0_JWKS_TIMEOUT") or 5)
+    auth0_jwks_refresh_interval = int(os.getenv("AUTH0_JWKS_REFRESH_INTERVAL") or 3600)
+    auth0_jwks_min_refresh_interval = int(os.getenv("AUTH0_JWKS_MIN_REFRESH_INTERVAL") or 30)
+
+    bcrypt_rounds = int(os.getenv("BCRYPT_ROUNDS") or 12)
+    bcrypt_target_ms = int(os.getenv("BCRYPT_TARGET_MS") or 250)
+
+    password_hasher_pool = os.getenv("PASSWORD_HASHER_POOL") or 'thread'
+    password_hasher_workers = int(os.getenv("PASSWORD_HASHER_WORKERS") or 4)
+    password_hasher_max_queue = int(os.getenv("PASSWORD_HASHER_MAX_QUEUE") or 64)
+
+    principal_cache_size = int(os.getenv("PRINCIPAL_CACHE_SIZE") or 10000)
+    principal_cache_local_ttl = int(os.getenv("PRINCIPAL_CACHE_LOCAL_TTL") or 30)
+    principal_cache_redis_ttl = int(os.getenv("PRINCIPAL_CACHE_REDIS_TTL") or 300)
+    principal_cache_use_redis = os.getenv("PRINCIPAL_CACHE_USE_REDIS") == "True"
+
+    quiz_content_cache_size = int(os.getenv("QUIZ_CONTENT_CACHE_SIZE") or 1000)
+    quiz_content_cache_ttl = int(os.getenv("QUIZ_CONTENT_CACHE_TTL") or 86400)
+
+    quiz_answers_compression = answers_compression
+
+    export_dir = os.getenv("EXPORT_DIR")
+    export_workers = int(os.getenv("EXPORT_WORKERS") or 2)
+    export_max_per_company = int(os.getenv("EXPORT_MAX_PER_COMPANY") or 1)
+    export_max_queue = int(os.getenv("EXPORT_MAX_QUEUE") or 50)
+    export_ttl = int(os.getenv("EXPORT_TTL") or 3600)
+
+    stats_rollup_reconcile_days = int(os.getenv("STATS_ROLLUP_RECONCILE_DAYS") or 2)
 
 
 system_config = SystemConfig()
@@ -1,4 +1,24 @@
+import asyncio
+import json
+import threading
+import time
+from types import SimpleNamespace
+from typing import Optional
+
+import jwt
+import pytest
+from cryptography.hazmat.primitives.asymmetric import rsa
+from fastapi import HTTPException
 from httpx import AsyncClient
+from jwt.algorithms import RSAAlgorithm
+
+from app.db.connections import redis_conn
+from app.services import auth0_service
+from app.services.auth0_service import FileJWKSSource, JWKSKeyStore
+from app.schemas.user_schemas import UserResponse
+from app.utils import password_hasher as password_hasher_module
+from app.utils.password_hasher import PasswordHasher
+from app.utils.principal_cache import PrincipalCache, INVALIDATION_CHANNEL
 
 
 async def test_bad_create_user__not_password(ac: AsyncClient):
@@ -187,6 +207,40 @@ async def test_bad_auth_me(ac: AsyncClient):
     assert response.status_code == 401
 
 
+async def test_refresh_token_one(ac: AsyncClient, login_user):
+    response = await login_user("test1@test.com", "test1")
+    refresh_token = response.json().get('refresh_token')
+
+    response = await ac.post("/auth/refresh", json={"refresh_token": refresh_token})
+    assert response.status_code == 200
+    assert response.json().get('token_type') == 'Bearer'
+    assert response.json().get('refresh_token')
+
+    headers = {
+        "Authorization": f"Bearer {response.json().get('access_token')}",
+    }
+    response = await ac.get("/auth/me/", headers=headers)
+    assert response.status_code == 200
+    assert response.json().get('id') == 1
+
+
+async def test_bad_refresh_token__access_token(ac: AsyncClient, users_tokens):
+    payload = {
+        "refresh_token": users_tokens['test1@test.com'],
+    }
+    response = await ac.post("/auth/refresh", json=payload)
+    assert response.status_code == 401
+
+
+async def test_bad_auth_me__refresh_token(ac: AsyncClient, login_user):
+    response = await login_user("test2@test.com", "test2")
+    headers = {
+        "Authorization": f"Bearer {response.json().get('refresh_token')}",
+    }
+    response = await ac.get("/auth/me/", headers=headers)
+    assert response.status_code == 401
+
+
 # =====================================================
 
 
@@ -265,6 +319,52 @@ async def test_get_user_by_id_updated(ac: AsyncClient, users_tokens):
     assert response.json().get('user_password') == None
 
 
+async def test_update_user_invalidates_other_workers(ac: AsyncClient, users_tokens):
+    token = users_tokens['test1@test.com']
+    headers = {
+        "Authorization": f"Bearer {token}",
+    }
+    # Stands for the local tier of another worker
+    other_worker = PrincipalCache(max_size=10, local_ttl=300, redis_ttl=300, use_redis=False)
+    await other_worker.start()
+    try:
+        while (await redis_conn.pubsub_numsub(INVALIDATION_CHANNEL))[0][1] < 1:
+            await asyncio.sleep(0.05)
+
+        response = await ac.get("/auth/me/", headers=headers)
+        await other_worker.set(token=token, user=UserResponse(**response.json()), expires_at=int(time.time()) + 300)
+        assert await other_worker.get(token=token) is not None
+
+        response = await ac.put("/user/1/", json={"user_name": "test1NEW"}, headers=headers)
+        assert response.status_code == 200
+
+        for _ in range(40):
+            if await other_worker.get(token=token) is None:
+                break
+            await asyncio.sleep(0.05)
+        assert await other_worker.get(token=token) is None
+    finally:
+        await other_worker.stop()
+
+
+async def test_bad_refresh_token__user_updated(ac: AsyncClient, login_user):
+    response = await login_user("test1@test.com", "test1")
+    refresh_token = response.json().get('refresh_token')
+    headers = {
+        "Authorization": f"Bearer {response.json().get('access_token')}",
+    }
+
+    response = await ac.put("/user/1/", json={"user_name": "test1NEW"}, headers=headers)
+    assert response.status_code == 200
+
+    response = await ac.post("/auth/refresh", json={"refresh_token": refresh_token})
+    assert response.status_code == 401
+
+    response = await login_user("test1@test.com", "test1")
+    response = await ac.post("/auth/refresh", json={"refresh_token": response.json().get('refresh_token')})
+    assert response.status_code == 200
+
+
 async def test_bad_delete_user_five__not_your_acc(ac: AsyncClient, users_tokens):
     headers = {
         "Authorization": f"Bearer {users_tokens['test1@test.com']}",
@@ -288,4 +388,125 @@ async def test_get_users_list_after_delete(ac: AsyncClient, users_tokens):
     }
     response = await ac.get("/users/", headers=headers)
     assert response.status_code == 200
-    assert len(response.json().get("users")) == 4
\ No newline at end of file
+    assert len(response.json().get("users")) == 4
+
+# auth0 signing keys
+
+def make_signing_key(kid: str) -> tuple[rsa.RSAPrivateKey, dict]:
+    private_key = rsa.generate_private_key(public_exponent=65537, key_size=2048)
+    jwk = json.loads(RSAAlgorithm.to_jwk(private_key.public_key()))
+    jwk.update(kid=kid, use='sig', alg='RS256')
+    return private_key, jwk
+
+
+def write_jwks(path, *jwks: dict) -> None:
+    with open(path, 'w') as jwks_file:
+        json.dump({'keys': list(jwks)}, jwks_file)
+
+
+class CountingJWKSSource(FileJWKSSource):
+    def __init__(self, path: str):
+        super().__init__(path=path)
+        self.fetches = 0
+        self.release: Optional[asyncio.Event] = None
+
+    async def fetch(self) -> dict:
+        self.fetches += 1
+        if self.release:
+            await self.release.wait()
+        return await super().fetch()
+
+
+async def test_jwks_known_kid(tmp_path):
+    private_key, jwk = make_signing_key('first')
+    write_jwks(tmp_path / 'jwks.json', jwk)
+    key_store = JWKSKeyStore(source=FileJWKSSource(str(tmp_path / 'jwks.json')), refresh_interval=3600, min_refresh_interval=30)
+    await key_store.refresh()
+
+    token = jwt.encode({'sub': 'auth0|1'}, private_key, algorithm='RS256', headers={'kid': 'first'})
+    await key_store.ensure_key_for_jwt(token)
+    signing_key = key_store.get_signing_key_from_jwt(token)
+    assert jwt.decode(token, signing_key.key, algorithms=['RS256']) == {'sub': 'auth0|1'}
+
+
+async def test_jwks_unknown_kid_refreshes_once(tmp_path, monkeypatch):
+    _, first = make_signing_key('first')
+    rotated_key, rotated = make_signing_key('rotated')
+    write_jwks(tmp_path / 'jwks.json', first)
+    source = CountingJWKSSource(str(tmp_path / 'jwks.json'))
+    key_store = JWKSKeyStore(source=source, refresh_interval=3600, min_refresh_interval=30)
+    await key_store.refresh()
+    assert source.fetches == 1
+
+    # The keys were rotated after the last refresh, longer than min_refresh_interval ago
+    write_jwks(tmp_path / 'jwks.json', first, rotated)
+    now = time.monotonic() + 31
+    monkeypatch.setattr(auth0_service, 'time', SimpleNamespace(monotonic=lambda: now))
+
+    token = jwt.encode({'sub': 'auth0|1'}, rotated_key, algorithm='RS256', headers={'kid': 'rotated'})
+    await key_store.ensure_key_for_jwt(token)
+    assert source.fetches == 2
+    assert key_store.get_signing_key_from_jwt(token).key_id == 'rotated'
+
+    # Within min_refresh_interval of that refresh, unknown kids don't fetch again
+    unknown = jwt.encode({'sub': 'auth0|1'}, rotated_key, algorithm='RS256', headers={'kid': 'unknown'})
+    for _ in range(3):
+        await key_store.ensure_key_for_jwt(unknown)
+    assert source.fetches == 2
+    with pytest.raises(jwt.exceptions.PyJWKClientError):
+        key_store.get_signing_key_from_jwt(unknown)
+
+
+async def test_jwks_concurrent_lookups_share_fetch(tmp_path):
+    private_key, jwk = make_signing_key('first')
+    write_jwks(tmp_path / 'jwks.json', jwk)
+    source = CountingJWKSSource(str(tmp_path / 'jwks.json'))
+    source.release = asyncio.Event()
+    key_store = JWKSKeyStore(source=source, refresh_interval=3600, min_refresh_interval=30)
+
+    token = jwt.encode({'sub': 'auth0|1'}, private_key, algorithm='RS256', headers={'kid': 'first'})
+    lookups = asyncio.gather(*(key_store.ensure_key_for_jwt(token) for _ in range(5)))
+    await asyncio.sleep(0)
+    source.release.set()
+    await lookups
+
+    assert source.fetches == 1
+    assert key_store.get_signing_key_from_jwt(token).key_id == 'first'
+
+
+# password hasher
+
+async def test_password_hasher_rejects_over_capacity(monkeypatch):
+    release = threading.Event()
+
+    def slow_hash_password(password: str, rounds: int) -> str:
+        release.wait(timeout=5)
+        return f'hashed {password}'
+
+    monkeypatch.setattr(password_hasher_module, 'hash_password', slow_hash_password)
+    hasher = PasswordHasher(pool_type='thread', max_workers=1, max_queue=1, rounds=4)
+    try:
+        # One hash holds the only worker, the next one waits for it
+        hashes = [asyncio.create_task(hasher.hash(password)) for password in ('first', 'second')]
+        await asyncio.sleep(0)
+        stats = hasher.stats()
+        assert (stats.in_flight, stats.queued, stats.completed) == (2, 1, 0)
+
+        with pytest.raises(HTTPException) as error:
+            await hasher.hash('third')
+        assert error.value.status_code == 503
+        assert error.value.headers == {'Retry-After': '1'}
+        assert hasher.stats().rejected == 1
+
+        await asyncio.sleep(0.1)
+        release.set()
+        assert await asyncio.gather(*hashes) == ['hashed first', 'hashed second']
+    finally:
+        release.set()
+        hasher.shutdown()
+
+    stats = hasher.stats()
+    assert (stats.in_flight, stats.queued, stats.completed, stats.rejected) == (0, 0, 2, 1)
+    # Both waited for the held worker, the rejected call isn't measured
+    assert stats.latency_avg_ms >= 100
+    assert sum(stats.latency_buckets_ms.values()) == 2
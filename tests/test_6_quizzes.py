@@ -0,0 +1,1308 @@
+import asyncio
+import gzip
+import json
+import logging
+import os
+import subprocess
+import sys
+import time
+from datetime import date
+from typing import Optional
+
+import httpx
+import pytest
+from databases import Database
+from httpx import AsyncClient
+from redis import RedisError
+from sqlalchemy import delete, func, insert, select
+
+from app.commands.backfill_quiz_summary import backfill_summary
+from app.commands.rebuild_leaderboards import rebuild_boards
+from app.db.connections import postgre_db, redis_conn
+from app.models.models import CompanyQuizDailyStats, CompanyUserDailyStats, QuizResults, Quizzes, QuizUserSummary
+from app.schemas.export_schemas import ExportJobFormat, ExportJobStatus
+from app.services.permission_service import PermissionService
+from app.services.stats_rollup_service import ROLLUPS, StatsRollupService
+from app.utils.cooldown_gate import BLOCKED, CLEAR, CLEAR_TTL, cooldown_gate
+from app.utils.csv_writer import FIELDNAMES
+from app.utils.export_jobs import ExportJobRunner
+from app.utils.http_cache import etag_matches
+from app.utils.leaderboard import REPLACE_ATTEMPTS, leaderboard_store
+from app.utils.quiz_answer_store import quiz_answer_store
+from app.utils.token_epoch import get_token_epoch
+from system_config import system_config
+
+# Ids of the objects created below, shared by the tests of this module in order
+created = {}
+
+
+def auth(users_tokens, email: str) -> dict:
+    return {
+        "Authorization": f"Bearer {users_tokens[email]}",
+    }
+
+
+# setup: quiz owner with a company, a member of it and an outsider with a company of their own
+
+async def test_quiz_setup_users(ac: AsyncClient, login_user):
+    for name in ('quiz_owner', 'quiz_member', 'quiz_outsider'):
+        payload = {
+            "user_password": name,
+            "user_password_repeat": name,
+            "user_email": f"{name}@test.com",
+            "user_name": name,
+        }
+        response = await ac.post("/user/", json=payload)
+        assert response.status_code == 200
+        created[name] = response.json().get('id')
+
+        response = await login_user(f"{name}@test.com", name)
+        assert response.status_code == 200
+
+
+async def test_quiz_setup_companies(ac: AsyncClient, users_tokens):
+    for name in ('quiz_owner', 'quiz_outsider'):
+        payload = {
+            "company_name": f"{name}_company",
+            "description": "quizzes",
+        }
+        response = await ac.post("/company/", json=payload, headers=auth(users_tokens, f"{name}@test.com"))
+        assert response.status_code == 201
+        created[f'{name}_company'] = response.json().get('id')
+
+
+async def test_quiz_setup_member(ac: AsyncClient, users_tokens):
+    payload = {
+        "user_id": created['quiz_member'],
+        "company_id": created['quiz_owner_company'],
+    }
+    response = await ac.post("/invite/", json=payload, headers=auth(users_tokens, "quiz_owner@test.com"))
+    assert response.status_code == 201
+
+    response = await ac.get("/invite/my", headers=auth(users_tokens, "quiz_member@test.com"))
+    invite_id = response.json().get('list')[0].get('id')
+    response = await ac.get(f"/invite/{invite_id}/accept/", headers=auth(users_tokens, "quiz_member@test.com"))
+    assert response.status_code == 200
+
+
+async def test_quiz_setup_quizzes(ac: AsyncClient, users_tokens):
+    quizzes = (
+        ('quiz', 'quiz_owner', 0),
+        ('empty_quiz', 'quiz_owner', 0),
+        ('cooldown_quiz', 'quiz_owner', 1),
+        ('outsider_quiz', 'quiz_outsider', 0),
+    )
+    for quiz_name, owner, cooldown in quizzes:
+        payload = {
+            "company_id": created[f'{owner}_company'],
+            "name": quiz_name,
+            "description": "test",
+            "cooldown_in_days": cooldown,
+        }
+        response = await ac.post("/quizzes", json=payload, headers=auth(users_tokens, f"{owner}@test.com"))
+        assert response.status_code == 200
+        created[quiz_name] = response.json().get('id')
+
+
+async def test_quiz_setup_questions(ac: AsyncClient, users_tokens):
+    questions = (
+        ('quiz', 'quiz_owner', 'first'),
+        ('quiz', 'quiz_owner', 'second'),
+        ('cooldown_quiz', 'quiz_owner', 'first'),
+        ('outsider_quiz', 'quiz_outsider', 'first'),
+    )
+    for quiz_name, owner, question_name in questions:
+        payload = {
+            "quiz_id": created[quiz_name],
+            "name": question_name,
+            "answer_variants": ["right", "wrong", "also wrong"],
+            "right_answer": 0,
+        }
+        response = await ac.post(
+            f"/quizzes/question?quiz_id={created[quiz_name]}",
+            json=payload,
+            headers=auth(users_tokens, f"{owner}@test.com")
+        )
+        assert response.status_code == 200
+
+
+# submit
+
+async def test_submit_not_member(ac: AsyncClient, users_tokens):
+    response = await ac.post(
+        f"/quizzes/quiz/{created['quiz']}/result/",
+        json={"results": [0, 0]},
+        headers=auth(users_tokens, "quiz_outsider@test.com")
+    )
+    assert response.status_code == 403
+    assert response.json().get('detail') == 'Not a member of the company'
+
+
+async def test_submit_quiz_not_found(ac: AsyncClient, users_tokens):
+    response = await ac.post(
+        "/quizzes/quiz/100000/result/",
+        json={"results": [0]},
+        headers=auth(users_tokens, "quiz_member@test.com")
+    )
+    assert response.status_code == 404
+
+
+async def test_submit_empty_quiz(ac: AsyncClient, users_tokens):
+    response = await ac.post(
+        f"/quizzes/quiz/{created['empty_quiz']}/result/",
+        json={"results": []},
+        headers=auth(users_tokens, "quiz_member@test.com")
+    )
+    assert response.status_code == 422
+    assert response.json().get('detail') == 'This quiz has no questions yet.'
+
+
+async def test_submit_wrong_answers_count(ac: AsyncClient, users_tokens):
+    response = await ac.post(
+        f"/quizzes/quiz/{created['quiz']}/result/",
+        json={"results": [0]},
+        headers=auth(users_tokens, "quiz_member@test.com")
+    )
+    assert response.status_code == 422
+    assert response.json().get('detail') == 'Quantity of answers must be equal to that of questions.'
+
+
+async def test_submit_answer_out_of_range(ac: AsyncClient, users_tokens):
+    for answers in ([0, 3], [-1, 0]):
+        response = await ac.post(
+            f"/quizzes/quiz/{created['quiz']}/result/",
+            json={"results": answers},
+            headers=auth(users_tokens, "quiz_member@test.com")
+        )
+        assert response.status_code == 422
+        assert response.json().get('detail') == 'Answer index is out of range of answer variants.'
+
+
+async def test_submit_rejected_attempts_not_saved(ac: AsyncClient, users_tokens):
+    response = await ac.get(
+        f"/quizzes/quiz_rating/quiz/{created['quiz']}/{created['quiz_member']}/",
+        headers=auth(users_tokens, "quiz_member@test.com")
+    )
+    assert response.status_code == 404
+
+
+async def test_submit_success(ac: AsyncClient, users_tokens):
+    response = await ac.post(
+        f"/quizzes/quiz/{created['quiz']}/result/",
+        json={"results": [0, 1]},
+        headers=auth(users_tokens, "quiz_member@test.com")
+    )
+    assert response.status_code == 200
+    assert response.json().get('questions_total') == 2
+    assert response.json().get('right_answers') == 1
+
+
+async def test_submit_success_second_attempt(ac: AsyncClient, users_tokens):
+    response = await ac.post(
+        f"/quizzes/quiz/{created['quiz']}/result/",
+        json={"results": [0, 0]},
+        headers=auth(users_tokens, "quiz_member@test.com")
+    )
+    assert response.status_code == 200
+    assert response.json().get('right_answers') == 2
+
+
+async def test_submit_rating_after_attempts(ac: AsyncClient, users_tokens):
+    response = await ac.get(
+        f"/quizzes/quiz_rating/quiz/{created['quiz']}/{created['quiz_member']}/",
+        headers=auth(users_tokens, "quiz_member@test.com")
+    )
+    assert response.status_code == 200
+    assert response.json().get('total_answers') == 4
+    assert response.json().get('right_answers') == 3
+    assert response.json().get('rating_percent') == 75.0
+
+
+async def test_submit_answers_saved_to_redis(ac: AsyncClient, users_tokens):
+    response = await ac.get(
+        "/quizzes/quiz_rating/json_export/my/",
+        headers=auth(users_tokens, "quiz_member@test.com")
+    )
+    assert response.status_code == 200
+    results = [result for result in response.json().get('results') if result['quiz_id'] == str(created['quiz'])]
+    assert len(results) == 1
+    # The latest attempt only
+    assert [question['is_correct'] for question in results[0]['questions']] == ['correct', 'correct']
+    assert [question['question_text'] for question in results[0]['questions']] == ['first', 'second']
+
+
+async def test_submit_cooldown_rejected(ac: AsyncClient, users_tokens):
+    response = await ac.post(
+        f"/quizzes/quiz/{created['cooldown_quiz']}/result/",
+        json={"results": [0]},
+        headers=auth(users_tokens, "quiz_member@test.com")
+    )
+    assert response.status_code == 200
+
+    response = await ac.post(
+        f"/quizzes/quiz/{created['cooldown_quiz']}/result/",
+        json={"results": [0]},
+        headers=auth(users_tokens, "quiz_member@test.com")
+    )
+    assert response.status_code == 403
+    assert response.json().get('detail') == 'You must wait for 1 days since last attempt'
+    assert 0 < int(response.headers['Retry-After']) <= 24 * 3600
+
+
+# quiz_user_summary
+
+async def get_summary(user_id: int) -> dict:
+    query = select(QuizUserSummary).where(QuizUserSummary.user_id == user_id)
+    return {row.__getitem__('quiz_id'): dict(row) for row in await postgre_db.fetch_all(query)}
+
+
+async def test_summary_matches_history():
+    query = select(QuizResults).where(QuizResults.user_id == created['quiz_member']).order_by(QuizResults.id)
+    results = await postgre_db.fetch_all(query)
+
+    history = {}
+    for result in results:
+        totals = history.setdefault(result.__getitem__('quiz_id'), {'attempts': 0, 'questions': 0, 'correct': 0})
+        totals['attempts'] += 1
+        totals['questions'] += result.__getitem__('quiz_questions_total')
+        totals['correct'] += result.__getitem__('quiz_correct_answers')
+        totals['last'] = result
+
+    summary = await get_summary(user_id=created['quiz_member'])
+    assert set(summary) == {created['quiz'], created['cooldown_quiz']}
+    for quiz_id, totals in history.items():
+        row = summary[quiz_id]
+        assert row['company_id'] == created['quiz_owner_company']
+        assert row['attempts'] == totals['attempts']
+        assert row['summary_questions_total'] == totals['questions']
+        assert row['summary_correct_answers'] == totals['correct']
+        assert row['summary_correct_answers_percentage'] == round(totals['correct'] / totals['questions'] * 100, 2)
+        assert row['last_result_id'] == totals['last'].__getitem__('id')
+        assert row['last_correct_answers'] == totals['last'].__getitem__('quiz_correct_answers')
+        assert row['last_date'] == totals['last'].__getitem__('date_of_quiz')
+
+
+async def test_backfill_summary_idempotent():
+    summary = await get_summary(user_id=created['quiz_member'])
+
+    await postgre_db.execute(delete(QuizUserSummary).where(QuizUserSummary.user_id == created['quiz_member']))
+    await backfill_summary(db=postgre_db)
+    assert await get_summary(user_id=created['quiz_member']) == summary
+
+    rows = await backfill_summary(db=postgre_db)
+    assert await get_summary(user_id=created['quiz_member']) == summary
+    assert rows == await postgre_db.fetch_val(select(func.count()).select_from(QuizUserSummary))
+
+
+async def test_summary_seeded_from_history(ac: AsyncClient, users_tokens):
+    # A pair with results from before the summary table, not backfilled yet
+    await postgre_db.execute(delete(QuizUserSummary).where(
+        QuizUserSummary.user_id == created['quiz_member'],
+        QuizUserSummary.quiz_id == created['quiz']
+    ))
+
+    response = await ac.post(
+        f"/quizzes/quiz/{created['quiz']}/result/",
+        json={"results": [0, 0]},
+        headers=auth(users_tokens, "quiz_member@test.com")
+    )
+    assert response.status_code == 200
+
+    results = await postgre_db.fetch_val(select(func.count()).select_from(QuizResults).where(
+        QuizResults.user_id == created['quiz_member'],
+        QuizResults.quiz_id == created['quiz']
+    ))
+    summary = await get_summary(user_id=created['quiz_member'])
+    assert results > 1
+    assert summary[created['quiz']]['attempts'] == results
+
+
+# cooldown gate
+
+async def get_gate(quiz_name: str) -> tuple:
+    key = cooldown_gate.get_key(user_id=created['quiz_member'], quiz_id=created[quiz_name])
+    return await redis_conn.get(key), await redis_conn.pttl(key)
+
+
+async def submit_cooldown_quiz(ac: AsyncClient, users_tokens):
+    return await ac.post(
+        f"/quizzes/quiz/{created['cooldown_quiz']}/result/",
+        json={"results": [0]},
+        headers=auth(users_tokens, "quiz_member@test.com")
+    )
+
+
+async def test_cooldown_gate_clear_without_cooldown():
+    value, pttl = await get_gate('quiz')
+    assert value == CLEAR
+    assert 0 < pttl <= CLEAR_TTL * 1000
+
+
+async def test_cooldown_gate_blocked():
+    value, pttl = await get_gate('cooldown_quiz')
+    assert value == BLOCKED
+    assert 0 < pttl <= 24 * 3600 * 1000
+
+
+async def test_cooldown_gate_retry_after(ac: AsyncClient, users_tokens):
+    response = await submit_cooldown_quiz(ac, users_tokens)
+    assert response.status_code == 403
+
+    _, pttl = await get_gate('cooldown_quiz')
+    # Retry-After is the gate's PTTL rounded up to seconds
+    assert abs(int(response.headers['Retry-After']) - pttl / 1000) <= 2
+
+
+async def test_cooldown_gate_rebuilt_when_missing(ac: AsyncClient, users_tokens):
+    await redis_conn.delete(cooldown_gate.get_key(user_id=created['quiz_member'], quiz_id=created['cooldown_quiz']))
+
+    response = await submit_cooldown_quiz(ac, users_tokens)
+    assert response.status_code == 403
+    assert response.json().get('detail') == 'You must wait for 1 days since last attempt'
+
+    value, pttl = await get_gate('cooldown_quiz')
+    assert value == BLOCKED
+    assert 0 < pttl <= 24 * 3600 * 1000
+
+
+async def test_cooldown_gate_try_blocked(ac: AsyncClient, users_tokens):
+    response = await ac.get(
+        f"/quizzes/quiz/{created['cooldown_quiz']}/try",
+        headers=auth(users_tokens, "quiz_member@test.com")
+    )
+    assert response.status_code == 403
+    assert 'Retry-After' in response.headers
+
+
+async def test_cooldown_gate_rewritten_on_longer_cooldown(ac: AsyncClient, users_tokens):
+    response = await ac.put(
+        f"/quizzes/{created['cooldown_quiz']}",
+        json={"cooldown_in_days": 2},
+        headers=auth(users_tokens, "quiz_owner@test.com")
+    )
+    assert response.status_code == 200
+
+    value, pttl = await get_gate('cooldown_quiz')
+    assert value == BLOCKED
+    assert 24 * 3600 * 1000 < pttl <= 2 * 24 * 3600 * 1000
+
+    response = await submit_cooldown_quiz(ac, users_tokens)
+    assert response.status_code == 403
+    assert response.json().get('detail') == 'You must wait for 2 days since last attempt'
+
+
+async def test_cooldown_gate_rewritten_on_cooldown_removed(ac: AsyncClient, users_tokens):
+    response = await ac.put(
+        f"/quizzes/{created['cooldown_quiz']}",
+        json={"cooldown_in_days": 0},
+        headers=auth(users_tokens, "quiz_owner@test.com")
+    )
+    assert response.status_code == 200
+
+    value, pttl = await get_gate('cooldown_quiz')
+    assert value == CLEAR
+    assert 0 < pttl <= CLEAR_TTL * 1000
+
+    response = await submit_cooldown_quiz(ac, users_tokens)
+    assert response.status_code == 200
+
+
+async def test_cooldown_gate_rewritten_on_cooldown_restored(ac: AsyncClient, users_tokens):
+    response = await ac.put(
+        f"/quizzes/{created['cooldown_quiz']}",
+        json={"cooldown_in_days": 1},
+        headers=auth(users_tokens, "quiz_owner@test.com")
+    )
+    assert response.status_code == 200
+
+    value, _ = await get_gate('cooldown_quiz')
+    assert value == BLOCKED
+
+    response = await submit_cooldown_quiz(ac, users_tokens)
+    assert response.status_code == 403
+
+
+# content_version
+
+async def get_content_version(quiz_name: str) -> int:
+    return await postgre_db.fetch_val(select(Quizzes.content_version).where(Quizzes.id == created[quiz_name]))
+
+
+async def try_quiz(ac: AsyncClient, users_tokens, quiz_name: str) -> list:
+    response = await ac.get(
+        f"/quizzes/quiz/{created[quiz_name]}/try",
+        headers=auth(users_tokens, "quiz_member@test.com")
+    )
+    assert response.status_code == 200
+    return response.json().get('question_list')
+
+
+async def test_content_version_new_quiz(ac: AsyncClient, users_tokens):
+    payload = {
+        "company_id": created['quiz_owner_company'],
+        "name": "content_quiz",
+        "description": "test",
+        "cooldown_in_days": 0,
+    }
+    response = await ac.post("/quizzes", json=payload, headers=auth(users_tokens, "quiz_owner@test.com"))
+    assert response.status_code == 200
+    created['content_quiz'] = response.json().get('id')
+
+    assert await get_content_version('content_quiz') == 1
+    assert await try_quiz(ac, users_tokens, 'content_quiz') == []
+
+
+async def test_content_version_question_created(ac: AsyncClient, users_tokens):
+    payload = {
+        "quiz_id": created['content_quiz'],
+        "name": "created",
+        "answer_variants": ["right", "wrong"],
+        "right_answer": 0,
+    }
+    response = await ac.post(
+        f"/quizzes/question?quiz_id={created['content_quiz']}",
+        json=payload,
+        headers=auth(users_tokens, "quiz_owner@test.com")
+    )
+    assert response.status_code == 200
+    created['content_question'] = response.json().get('id')
+
+    assert await get_content_version('content_quiz') == 2
+    assert [question['name'] for question in await try_quiz(ac, users_tokens, 'content_quiz')] == ['created']
+
+
+async def test_content_version_question_updated(ac: AsyncClient, users_tokens):
+    payload = {
+        "name": "updated",
+        "answer_variants": ["wrong", "right"],
+        "right_answer": 1,
+    }
+    response = await ac.put(
+        f"/quizzes/question/update/{created['content_question']}",
+        json=payload,
+        headers=auth(users_tokens, "quiz_owner@test.com")
+    )
+    assert response.status_code == 200
+
+    assert await get_content_version('content_quiz') == 3
+    questions = await try_quiz(ac, users_tokens, 'content_quiz')
+    assert [(question['name'], question['answer_variants']) for question in questions] == [
+        ('updated', ['wrong', 'right'])
+    ]
+
+    # Graded against the new right answer
+    response = await ac.post(
+        f"/quizzes/quiz/{created['content_quiz']}/result/",
+        json={"results": [1]},
+        headers=auth(users_tokens, "quiz_member@test.com")
+    )
+    assert response.status_code == 200
+    assert response.json().get('right_answers') == 1
+
+
+async def test_content_version_question_moved_without_target_rights(ac: AsyncClient, users_tokens):
+    response = await ac.put(
+        f"/quizzes/question/update/{created['content_question']}",
+        json={"quiz_id": created['outsider_quiz']},
+        headers=auth(users_tokens, "quiz_owner@test.com")
+    )
+    assert response.status_code == 403
+
+    assert await get_content_version('content_quiz') == 3
+    assert len(await try_quiz(ac, users_tokens, 'content_quiz')) == 1
+
+
+async def test_content_version_question_moved(ac: AsyncClient, users_tokens):
+    target_version = await get_content_version('empty_quiz')
+
+    response = await ac.put(
+        f"/quizzes/question/update/{created['content_question']}",
+        json={"quiz_id": created['empty_quiz']},
+        headers=auth(users_tokens, "quiz_owner@test.com")
+    )
+    assert response.status_code == 200
+
+    # Both the source and the target quiz change
+    assert await get_content_version('content_quiz') == 4
+    assert await get_content_version('empty_quiz') == target_version + 1
+    assert await try_quiz(ac, users_tokens, 'content_quiz') == []
+    assert [question['name'] for question in await try_quiz(ac, users_tokens, 'empty_quiz')] == ['updated']
+
+    response = await ac.put(
+        f"/quizzes/question/update/{created['content_question']}",
+        json={"quiz_id": created['content_quiz']},
+        headers=auth(users_tokens, "quiz_owner@test.com")
+    )
+    assert response.status_code == 200
+    assert await get_content_version('content_quiz') == 5
+    assert await get_content_version('empty_quiz') == target_version + 2
+    assert await try_quiz(ac, users_tokens, 'empty_quiz') == []
+
+
+async def test_content_version_question_deleted(ac: AsyncClient, users_tokens):
+    response = await ac.delete(
+        f"/quizzes/question/delete/{created['content_question']}",
+        headers=auth(users_tokens, "quiz_owner@test.com")
+    )
+    assert response.status_code == 200
+
+    assert await get_content_version('content_quiz') == 6
+    assert await try_quiz(ac, users_tokens, 'content_quiz') == []
+
+    response = await ac.post(
+        f"/quizzes/quiz/{created['content_quiz']}/result/",
+        json={"results": [1]},
+        headers=auth(users_tokens, "quiz_member@test.com")
+    )
+    assert response.status_code == 422
+    assert response.json().get('detail') == 'This quiz has no questions yet.'
+
+
+# quiz answer store
+
+async def test_answer_store_prune():
+    expired = quiz_answer_store.get_key(user_id=100000, company_id=100000, quiz_id=100000)
+    resubmitted = quiz_answer_store.get_key(user_id=100001, company_id=100000, quiz_id=100000)
+    for key in (expired, resubmitted):
+        for index in quiz_answer_store.get_indexes(key):
+            await redis_conn.sadd(index, key)
+    # Written again after the export's MGET found it missing
+    await redis_conn.set(resubmitted, b'[]')
+
+    await quiz_answer_store.prune([expired, resubmitted])
+
+    for index in quiz_answer_store.get_indexes(expired):
+        assert not await redis_conn.sismember(index, expired)
+    for index in quiz_answer_store.get_indexes(resubmitted):
+        assert await redis_conn.sismember(index, resubmitted)
+    await redis_conn.delete(resubmitted, *quiz_answer_store.get_indexes(resubmitted))
+
+
+async def export_my_quiz(ac: AsyncClient, users_tokens, quiz_name: str) -> list:
+    response = await ac.get(
+        "/quizzes/quiz_rating/json_export/my/",
+        headers=auth(users_tokens, "quiz_member@test.com")
+    )
+    assert response.status_code == 200
+    return [result for result in response.json().get('results') if result['quiz_id'] == str(created[quiz_name])]
+
+
+async def test_answer_store_snapshot_missing(ac: AsyncClient, users_tokens, caplog):
+    version = await get_content_version('quiz')
+    await redis_conn.delete(quiz_answer_store.get_snapshot_key(quiz_id=created['quiz'], version=version))
+
+    with caplog.at_level(logging.WARNING, logger='app.utils.quiz_answer_store'):
+        assert await export_my_quiz(ac, users_tokens, 'quiz') == []
+    assert 'Skipped 1 quiz attempts whose question snapshot is missing in Redis' in caplog.text
+
+
+async def test_answer_store_snapshot_rewritten(ac: AsyncClient, users_tokens):
+    # The snapshot was written by this worker less than SNAPSHOT_REFRESH_INTERVAL ago
+    quiz_answer_store._snapshots_written[created['quiz']] = (await get_content_version('quiz'), time.time())
+
+    response = await ac.post(
+        f"/quizzes/quiz/{created['quiz']}/result/",
+        json={"results": [0, 0]},
+        headers=auth(users_tokens, "quiz_member@test.com")
+    )
+    assert response.status_code == 200
+
+    results = await export_my_quiz(ac, users_tokens, 'quiz')
+    assert [question['question_text'] for question in results[0]['questions']] == ['first', 'second']
+
+
+def test_answer_store_unknown_compression():
+    result = subprocess.run(
+        [sys.executable, '-c', 'import system_config'],
+        env={**os.environ, 'QUIZ_ANSWERS_COMPRESSION': 'zstd'},
+        capture_output=True
+    )
+    assert result.returncode != 0
+    assert b"QUIZ_ANSWERS_COMPRESSION must be 'zlib' or 'none', not 'zstd'" in result.stderr
+
+
+async def test_answer_store_iter_keys_deduplicated(monkeypatch):
+    async def sscan_iter(name, count=None):
+        # SSCAN guarantees every member is returned, not that it is returned once
+        for member in (b'1-2-3', b'1-2-4', b'1-2-3', b'1-2-4', b'1-2-5'):
+            yield member
+
+    monkeypatch.setattr(redis_conn, 'sscan_iter', sscan_iter)
+    chunks = [chunk async for chunk in quiz_answer_store.iter_keys(quiz_answer_store.get_user_index(1))]
+    assert chunks == [['1-2-3', '1-2-4', '1-2-5']]
+
+
+# export jobs
+
+def get_export_runner(tmp_path) -> ExportJobRunner:
+    return ExportJobRunner(directory=str(tmp_path), max_workers=2, max_per_company=1, max_queue=10, ttl=60)
+
+
+async def test_export_runner_company_slot_removed(tmp_path, monkeypatch):
+    export_runner = get_export_runner(tmp_path)
+    release = asyncio.Event()
+
+    async def build(job):
+        await release.wait()
+
+    monkeypatch.setattr(export_runner, '_build', build)
+    for company_id in (1, 1, 2):
+        await export_runner.submit(user_id=1, company_id=company_id, export_format=ExportJobFormat.JSON)
+    await asyncio.sleep(0)
+    assert {company_id: jobs for company_id, (_, jobs) in export_runner._company_slots.items()} == {1: 2, 2: 1}
+
+    release.set()
+    await asyncio.gather(*export_runner._tasks)
+    assert export_runner._company_slots == {}
+    assert export_runner.completed == 3
+
+
+async def test_export_runner_shutdown(tmp_path, monkeypatch):
+    export_runner = get_export_runner(tmp_path)
+
+    async def build(job):
+        await asyncio.Event().wait()
+
+    monkeypatch.setattr(export_runner, '_build', build)
+    running = await export_runner.submit(user_id=1, company_id=1, export_format=ExportJobFormat.JSON)
+    queued = await export_runner.submit(user_id=1, company_id=1, export_format=ExportJobFormat.JSON)
+    await asyncio.sleep(0)
+
+    await export_runner.shutdown()
+    # Both jobs saved their state before shutdown returned
+    assert not export_runner._tasks
+    assert export_runner._company_slots == {}
+    for job in (running, queued):
+        saved = await export_runner.get(job.id)
+        assert saved.status == ExportJobStatus.FAILED
+        assert saved.error == 'Export was interrupted'
+        await redis_conn.delete(export_runner.get_key(job.id))
+
+
+async def test_export_redis_unavailable(ac: AsyncClient, users_tokens, monkeypatch):
+    class UnavailableRedis:
+        async def get(self, *args, **kwargs):
+            raise RedisError('Connection refused')
+
+        async def set(self, *args, **kwargs):
+            raise RedisError('Connection refused')
+
+    monkeypatch.setattr('app.utils.export_jobs.redis_conn', UnavailableRedis())
+    headers = auth(users_tokens, "quiz_owner@test.com")
+    response = await ac.post(f"/exports/company/{created['quiz_owner_company']}/", headers=headers)
+    assert response.status_code == 503
+    assert response.headers['Retry-After'] == '5'
+
+    response = await ac.get("/exports/missing/", headers=headers)
+    assert response.status_code == 503
+    assert response.headers['Retry-After'] == '5'
+
+
+def test_export_pyarrow_imported_lazily():
+    result = subprocess.run(
+        [sys.executable, '-c', "import sys, app.main; assert 'pyarrow' not in sys.modules"],
+        capture_output=True
+    )
+    assert result.returncode == 0, result.stderr
+
+
+# daily stats rollups
+
+async def get_rollups() -> dict:
+    rollups = {}
+    for table, column in ROLLUPS:
+        query = select(table).where(table.company_id == created['quiz_owner_company'])
+        rollups[table.__tablename__] = {
+            (row.__getitem__(column.key), row.__getitem__('day')): (
+                row.__getitem__('attempts'),
+                row.__getitem__('questions_total'),
+                row.__getitem__('correct_answers'),
+                round(row.__getitem__('percentage_sum'), 6),
+            )
+            for row in await postgre_db.fetch_all(query)
+        }
+    return rollups
+
+
+async def test_rollups_increments_match_reconcile():
+    incremented = await get_rollups()
+    assert incremented[CompanyQuizDailyStats.__tablename__]
+    assert incremented[CompanyUserDailyStats.__tablename__]
+
+    today = date.today()
+    await StatsRollupService(db=postgre_db).reconcile(date_from=today, date_to=today)
+    assert await get_rollups() == incremented
+
+
+async def test_rollups_reconcile_restores_lost_rows():
+    incremented = await get_rollups()
+    await postgre_db.execute(
+        delete(CompanyQuizDailyStats).where(CompanyQuizDailyStats.company_id == created['quiz_owner_company'])
+    )
+
+    today = date.today()
+    await StatsRollupService(db=postgre_db).reconcile(date_from=today, date_to=today)
+    assert await get_rollups() == incremented
+
+
+async def test_rollups_lock_is_per_company(ac: AsyncClient, users_tokens):
+    other_db = Database(system_config.db_url_test)
+    await other_db.connect()
+    try:
+        async with other_db.transaction():
+            # Reconciliation of the outsider's company in progress. The test connection still holds the owner
+            # company's locks of this module's submissions (its transaction is only rolled back at the end)
+            lock_key = StatsRollupService.get_lock_key(created['quiz_outsider_company'])
+            assert await other_db.fetch_val(select(func.pg_try_advisory_xact_lock(lock_key)))
+
+            for company, available in (('quiz_owner_company', True), ('quiz_outsider_company', False)):
+                lock_key = StatsRollupService.get_lock_key(created[company])
+                assert await postgre_db.fetch_val(select(func.pg_try_advisory_xact_lock_shared(lock_key))) is available
+
+            # Submissions to other companies go on; bounded, so a regression fails instead of hanging
+            await postgre_db.execute("SET LOCAL lock_timeout = '5s'")
+            response = await ac.post(
+                f"/quizzes/quiz/{created['quiz']}/result/",
+                json={"results": [0, 0]},
+                headers=auth(users_tokens, "quiz_member@test.com")
+            )
+            assert response.status_code == 200
+    finally:
+        await postgre_db.execute("SET LOCAL lock_timeout = 0")
+        await other_db.disconnect()
+
+
+# leaderboards
+
+async def test_leaderboard_update_script():
+    company_id, user_id = 900000, 900001
+    quiz_key = leaderboard_store.get_quiz_key(company_id, 1)
+    company_key = leaderboard_store.get_company_key(company_id)
+
+    assert await leaderboard_store.update(company_id=company_id, quiz_id=1, user_id=user_id, rating=50, result_id=2)
+    # An older result arriving late and a repeated one are both ignored
+    assert not await leaderboard_store.update(company_id=company_id, quiz_id=1, user_id=user_id, rating=100, result_id=1)
+    assert not await leaderboard_store.update(company_id=company_id, quiz_id=1, user_id=user_id, rating=50, result_id=2)
+    assert await redis_conn.zscore(quiz_key, user_id) == 50
+    assert await redis_conn.zscore(company_key, user_id) == 50
+
+    assert await leaderboard_store.update(company_id=company_id, quiz_id=1, user_id=user_id, rating=80, result_id=3)
+    assert await leaderboard_store.update(company_id=company_id, quiz_id=2, user_id=user_id, rating=40, result_id=4)
+    assert await redis_conn.zscore(quiz_key, user_id) == 80
+    # The average of the user's quiz ratings
+    assert await redis_conn.zscore(company_key, user_id) == 60
+    assert await redis_conn.hget(leaderboard_store.get_totals_key(company_id), f'{user_id}:quizzes') == b'2'
+
+    await redis_conn.delete(
+        quiz_key,
+        leaderboard_store.get_quiz_key(company_id, 2),
+        company_key,
+        leaderboard_store.get_totals_key(company_id)
+    )
+
+
+async def test_leaderboard_setup_owner_result(ac: AsyncClient, users_tokens):
+    response = await ac.post(
+        f"/quizzes/quiz/{created['quiz']}/result/",
+        json={"results": [0, 1]},
+        headers=auth(users_tokens, "quiz_owner@test.com")
+    )
+    assert response.status_code == 200
+
+
+async def test_leaderboard_quiz_top(ac: AsyncClient, users_tokens):
+    response = await ac.get(
+        f"/leaderboards/quiz/{created['quiz']}/",
+        headers=auth(users_tokens, "quiz_owner@test.com")
+    )
+    assert response.status_code == 200
+    assert response.json().get('total') == 2
+    entries = response.json().get('entries')
+    assert [(entry['rank'], entry['user_id']) for entry in entries] == [
+        (1, created['quiz_member']),
+        (2, created['quiz_owner']),
+    ]
+    assert entries[1]['rating'] == 50.0
+
+
+async def test_leaderboard_company_matches_summary(ac: AsyncClient, users_tokens):
+    query = select(QuizUserSummary).where(QuizUserSummary.company_id == created['quiz_owner_company'])
+    ratings = {}
+    for row in await postgre_db.fetch_all(query):
+        ratings.setdefault(row.__getitem__('user_id'), []).append(row.__getitem__('summary_correct_answers_percentage'))
+
+    response = await ac.get(
+        f"/leaderboards/company/{created['quiz_owner_company']}/?limit=100",
+        headers=auth(users_tokens, "quiz_member@test.com")
+    )
+    assert response.status_code == 200
+    assert {entry['user_id']: entry['rating'] for entry in response.json().get('entries')} == {
+        user_id: round(sum(user_ratings) / len(user_ratings), 2) for user_id, user_ratings in ratings.items()
+    }
+
+
+async def test_leaderboard_my_rank(ac: AsyncClient, users_tokens):
+    response = await ac.get(
+        f"/leaderboards/quiz/{created['quiz']}/me/",
+        headers=auth(users_tokens, "quiz_owner@test.com")
+    )
+    assert response.status_code == 200
+    assert response.json().get('rank') == 2
+    assert response.json().get('user_id') == created['quiz_owner']
+
+
+async def test_leaderboard_my_rank_no_results(ac: AsyncClient, users_tokens):
+    response = await ac.get(
+        f"/leaderboards/quiz/{created['cooldown_quiz']}/me/",
+        headers=auth(users_tokens, "quiz_owner@test.com")
+    )
+    assert response.status_code == 404
+    assert response.json().get('detail') == 'You have no results on this leaderboard yet'
+
+
+async def test_leaderboard_around_me(ac: AsyncClient, users_tokens):
+    response = await ac.get(
+        f"/leaderboards/quiz/{created['quiz']}/around_me/?radius=0",
+        headers=auth(users_tokens, "quiz_owner@test.com")
+    )
+    assert response.status_code == 200
+    assert response.json().get('total') == 2
+    assert [entry['rank'] for entry in response.json().get('entries')] == [2]
+
+
+async def test_leaderboard_not_member(ac: AsyncClient, users_tokens):
+    for board, board_id in (('quiz', created['quiz']), ('company', created['quiz_owner_company'])):
+        response = await ac.get(
+            f"/leaderboards/{board}/{board_id}/",
+            headers=auth(users_tokens, "quiz_outsider@test.com")
+        )
+        assert response.status_code == 403
+        assert response.json().get('detail') == 'Not a member of the company'
+
+
+async def get_boards(company_id: int) -> dict:
+    keys = [key async for key in redis_conn.scan_iter(match=f'leaderboard:{{{company_id}}}:*')]
+    boards = {}
+    for key in keys:
+        if key.endswith(b':totals'):
+            boards[key] = await redis_conn.hgetall(key)
+        else:
+            boards[key] = await redis_conn.zrange(key, 0, -1, withscores=True)
+    return boards
+
+
+async def test_leaderboard_rebuild():
+    company_id = created['quiz_owner_company']
+    boards = await get_boards(company_id)
+
+    await redis_conn.delete(*boards)
+    assert await rebuild_boards(db=postgre_db, company_id=company_id) == 1
+    rebuilt = await get_boards(company_id)
+    assert rebuilt.keys() == boards.keys()
+    for key, board in boards.items():
+        if key.endswith(b':totals'):
+            assert {field: float(value) for field, value in rebuilt[key].items()} == pytest.approx(
+                {field: float(value) for field, value in board.items()}
+            )
+        else:
+            assert rebuilt[key] == board
+
+
+async def test_leaderboard_rebuild_keeps_newer_ratings():
+    company_id = created['quiz_owner_company']
+    read_up_to = await postgre_db.fetch_val(select(func.max(QuizResults.id)))
+
+    # Submitted while the summary was being read: a later result of a user already read, and a new user
+    await leaderboard_store.update(
+        company_id=company_id, quiz_id=created['quiz'], user_id=created['quiz_owner'], rating=10, result_id=read_up_to + 1
+    )
+    await leaderboard_store.update(
+        company_id=company_id, quiz_id=created['quiz'], user_id=900001, rating=20, result_id=read_up_to + 2
+    )
+    # Left over from a result that is no longer in the summary
+    await leaderboard_store.update(
+        company_id=company_id, quiz_id=created['quiz'], user_id=900002, rating=30, result_id=1
+    )
+
+    await rebuild_boards(db=postgre_db, company_id=company_id)
+    quiz_key = leaderboard_store.get_quiz_key(company_id, created['quiz'])
+    assert await redis_conn.zscore(quiz_key, created['quiz_owner']) == 10
+    assert await redis_conn.zscore(quiz_key, 900001) == 20
+    assert await redis_conn.zscore(quiz_key, 900002) is None
+    assert await redis_conn.zscore(leaderboard_store.get_company_key(company_id), 900001) == 20
+
+
+async def test_leaderboard_rebuild_removes_boards_of_deleted_quizzes():
+    company_id = created['quiz_owner_company']
+    await leaderboard_store.update(company_id=company_id, quiz_id=999999, user_id=900003, rating=40, result_id=1)
+
+    await rebuild_boards(db=postgre_db, company_id=company_id)
+    assert not await redis_conn.exists(leaderboard_store.get_quiz_key(company_id, 999999))
+    assert await redis_conn.zscore(leaderboard_store.get_company_key(company_id), 900003) is None
+
+
+async def test_leaderboard_rebuild_gives_up_under_updates(monkeypatch):
+    company_id = created['quiz_owner_company']
+    attempts = []
+
+    async def get_newer_ratings(pipe, company_id, applied, ratings, read_up_to):
+        # A submission lands between the read and the MULTI every time
+        attempts.append(1)
+        await redis_conn.hset(leaderboard_store.get_totals_key(company_id), 'concurrent', len(attempts))
+        return {}
+
+    monkeypatch.setattr(leaderboard_store, 'get_newer_ratings', get_newer_ratings)
+    assert not await leaderboard_store.replace_company(company_id, [], read_up_to=0)
+    assert len(attempts) == REPLACE_ATTEMPTS
+    # Nothing was replaced
+    assert await redis_conn.exists(leaderboard_store.get_company_key(company_id))
+    await redis_conn.hdel(leaderboard_store.get_totals_key(company_id), 'concurrent')
+
+
+# company progression
+
+async def get_company_progression(ac: AsyncClient, users_tokens, **params) -> dict:
+    response = await ac.get(
+        f"/stats/company_daily_stats/{created['quiz_owner_company']}/",
+        params=params,
+        headers=auth(users_tokens, "quiz_owner@test.com")
+    )
+    assert response.status_code == 200
+    return response.json()
+
+
+async def insert_result(user_id: int, company_id: int, quiz_id: int, day: date) -> int:
+    return await postgre_db.execute(insert(QuizResults).values(
+        user_id=user_id,
+        company_id=company_id,
+        quiz_id=quiz_id,
+        quiz_questions_total=1,
+        quiz_correct_answers=1,
+        quiz_correct_answers_percentage=100,
+        summary_questions_total=1,
+        summary_correct_answers=1,
+        summary_correct_answers_percentage=100,
+        date_of_quiz=day
+    ))
+
+
+async def test_company_progression_not_admin(ac: AsyncClient, users_tokens):
+    for email in ("quiz_member@test.com", "quiz_outsider@test.com"):
+        response = await ac.get(
+            f"/stats/company_daily_stats/{created['quiz_owner_company']}/",
+            headers=auth(users_tokens, email)
+        )
+        assert response.status_code == 403
+
+
+async def test_company_progression_pages(ac: AsyncClient, users_tokens):
+    everyone = await get_company_progression(ac, users_tokens)
+    assert everyone['next_after_user_id'] is None
+    assert {created['quiz_owner'], created['quiz_member']} <= {user['user_id'] for user in everyone['users']}
+
+    users, after_user_id = [], None
+    # One member per page, and the empty page after the last one
+    for _ in range(len(everyone['users']) + 1):
+        params = {'limit': 1} if after_user_id is None else {'limit': 1, 'after_user_id': after_user_id}
+        page = await get_company_progression(ac, users_tokens, **params)
+        users += page['users']
+        after_user_id = page['next_after_user_id']
+        if after_user_id is None:
+            break
+        assert after_user_id == page['users'][-1]['user_id']
+    assert after_user_id is None
+    # The pages join without gaps or overlap
+    assert users == everyone['users']
+
+
+async def test_company_progression_dates(ac: AsyncClient, users_tokens):
+    user_id = created['quiz_member']
+    result_id = await insert_result(user_id, created['quiz_owner_company'], created['quiz'], date(2020, 1, 1))
+    try:
+        page = await get_company_progression(ac, users_tokens, date_to='2020-12-31')
+        member = next(user for user in page['users'] if user['user_id'] == user_id)
+        assert member['data'] == [
+            {'quiz_id': created['quiz'], 'ratings_by_date': [{'date': '2020-01-01', 'rating': 100}]}
+        ]
+
+        page = await get_company_progression(ac, users_tokens, date_from=date.today().isoformat())
+        member = next(user for user in page['users'] if user['user_id'] == user_id)
+        dates = {rating['date'] for quiz in member['data'] for rating in quiz['ratings_by_date']}
+        assert dates == {date.today().isoformat()}
+    finally:
+        await postgre_db.execute(delete(QuizResults).where(QuizResults.id == result_id))
+
+
+async def test_company_progression_other_companies_excluded(ac: AsyncClient, users_tokens):
+    # The member's result in a company they don't belong to, and the outsider's own result
+    result_ids = [
+        await insert_result(created['quiz_member'], created['quiz_outsider_company'], created['outsider_quiz'], date.today()),
+        await insert_result(created['quiz_outsider'], created['quiz_outsider_company'], created['outsider_quiz'], date.today()),
+    ]
+    try:
+        page = await get_company_progression(ac, users_tokens)
+        assert created['quiz_outsider'] not in {user['user_id'] for user in page['users']}
+        quiz_ids = {quiz['quiz_id'] for user in page['users'] for quiz in user['data']}
+        assert created['quiz'] in quiz_ids
+        assert created['outsider_quiz'] not in quiz_ids
+    finally:
+        await postgre_db.execute(delete(QuizResults).where(QuizResults.id.in_(result_ids)))
+
+
+# conditional GET
+
+async def get_etag(ac: AsyncClient, users_tokens, url: str, email: str = "quiz_owner@test.com") -> str:
+    response = await ac.get(url, headers=auth(users_tokens, email))
+    assert response.status_code == 200
+    assert response.headers['Cache-Control'] == 'private, no-cache'
+    return response.headers['ETag']
+
+
+def get_conditional_urls() -> list[tuple[str, str]]:
+    return [
+        (f"/quizzes/{created['quiz_owner_company']}", "quiz_owner@test.com"),
+        (f"/quizzes/{created['quiz']}/questions", "quiz_owner@test.com"),
+        (f"/quizzes/quiz/{created['quiz']}/try", "quiz_member@test.com"),
+    ]
+
+
+def test_etag_matches():
+    assert etag_matches('"abc"', '"abc"')
+    assert etag_matches('W/"abc"', '"abc"')
+    assert etag_matches('"other", W/"abc"', '"abc"')
+    assert etag_matches('*', '"abc"')
+    assert not etag_matches('"other"', '"abc"')
+    assert not etag_matches(None, '"abc"')
+
+
+async def test_conditional_get_not_modified(ac: AsyncClient, users_tokens):
+    for url, email in get_conditional_urls():
+        etag = await get_etag(ac, users_tokens, url, email)
+
+        for if_none_match in (etag, f'W/{etag}', f'"other", {etag}'):
+            response = await ac.get(url, headers={**auth(users_tokens, email), 'If-None-Match': if_none_match})
+            assert response.status_code == 304
+            assert response.content == b''
+            assert response.headers['ETag'] == etag
+
+        response = await ac.get(url, headers={**auth(users_tokens, email), 'If-None-Match': '"other"'})
+        assert response.status_code == 200
+        assert response.headers['ETag'] == etag
+
+
+async def test_conditional_get_quiz_created_and_deleted(ac: AsyncClient, users_tokens):
+    list_url = f"/quizzes/{created['quiz_owner_company']}"
+    list_etag = await get_etag(ac, users_tokens, list_url)
+
+    payload = {
+        "company_id": created['quiz_owner_company'],
+        "name": "etag_empty_quiz",
+        "description": "test",
+        "cooldown_in_days": 0,
+    }
+    response = await ac.post("/quizzes", json=payload, headers=auth(users_tokens, "quiz_owner@test.com"))
+    assert response.status_code == 200
+    quiz_id = response.json().get('id')
+
+    response = await ac.get(list_url, headers={**auth(users_tokens, "quiz_owner@test.com"), 'If-None-Match': list_etag})
+    assert response.status_code == 200
+    created_etag = response.headers['ETag']
+    assert created_etag != list_etag
+
+    response = await ac.delete(
+        f"/quizzes/{created['quiz_owner_company']}/{quiz_id}",
+        headers=auth(users_tokens, "quiz_owner@test.com")
+    )
+    assert response.status_code == 200
+
+    response = await ac.get(list_url, headers={**auth(users_tokens, "quiz_owner@test.com"), 'If-None-Match': created_etag})
+    assert response.status_code == 200
+    assert response.headers['ETag'] != created_etag
+    assert quiz_id not in {quiz['id'] for quiz in response.json()['quizzes']}
+
+
+async def test_conditional_get_question_edited(ac: AsyncClient, users_tokens):
+    payload = {
+        "company_id": created['quiz_owner_company'],
+        "name": "etag_quiz",
+        "description": "test",
+        "cooldown_in_days": 0,
+    }
+    response = await ac.post("/quizzes", json=payload, headers=auth(users_tokens, "quiz_owner@test.com"))
+    assert response.status_code == 200
+    created['etag_quiz'] = response.json().get('id')
+
+    payload = {
+        "quiz_id": created['etag_quiz'],
+        "name": "etag",
+        "answer_variants": ["right", "wrong"],
+        "right_answer": 0,
+    }
+    response = await ac.post(
+        f"/quizzes/question?quiz_id={created['etag_quiz']}",
+        json=payload,
+        headers=auth(users_tokens, "quiz_owner@test.com")
+    )
+    assert response.status_code == 200
+    question_id = response.json().get('id')
+
+    urls = [
+        (f"/quizzes/{created['etag_quiz']}/questions", "quiz_owner@test.com"),
+        (f"/quizzes/quiz/{created['etag_quiz']}/try", "quiz_member@test.com"),
+    ]
+    etags = [await get_etag(ac, users_tokens, url, email) for url, email in urls]
+    other_etags = [await get_etag(ac, users_tokens, url, email) for url, email in get_conditional_urls()[1:]]
+
+    response = await ac.put(
+        f"/quizzes/question/update/{question_id}",
+        json={"name": "etag edited"},
+        headers=auth(users_tokens, "quiz_owner@test.com")
+    )
+    assert response.status_code == 200
+
+    for (url, email), etag in zip(urls, etags):
+        response = await ac.get(url, headers={**auth(users_tokens, email), 'If-None-Match': etag})
+        assert response.status_code == 200
+        assert response.headers['ETag'] != etag
+    # Other quizzes keep theirs
+    assert [await get_etag(ac, users_tokens, url, email) for url, email in get_conditional_urls()[1:]] == other_etags
+
+
+# role cache
+
+async def join_owner_company(ac: AsyncClient, users_tokens, email: str) -> None:
+    payload = {
+        "user_id": created['role_user'],
+        "company_id": created['quiz_owner_company'],
+    }
+    response = await ac.post("/invite/", json=payload, headers=auth(users_tokens, "quiz_owner@test.com"))
+    assert response.status_code == 201
+
+    response = await ac.get("/invite/my", headers=auth(users_tokens, email))
+    invite_id = response.json().get('list')[0].get('id')
+    response = await ac.get(f"/invite/{invite_id}/accept/", headers=auth(users_tokens, email))
+    assert response.status_code == 200
+
+
+async def assert_roles_cached(user_id: int) -> None:
+    cached = await redis_conn.get(PermissionService.get_roles_key(user_id))
+    assert cached is not None
+    assert json.loads(cached)['epoch'] == await get_token_epoch(user_id)
+
+
+async def test_role_cache_setup(ac: AsyncClient, login_user, users_tokens):
+    payload = {
+        "user_password": "role_user",
+        "user_password_repeat": "role_user",
+        "user_email": "role_user@test.com",
+        "user_name": "role_user",
+    }
+    response = await ac.post("/user/", json=payload)
+    assert response.status_code == 200
+    created['role_user'] = response.json().get('id')
+
+    response = await login_user("role_user@test.com", "role_user")
+    assert response.status_code == 200
+    await join_owner_company(ac, users_tokens, "role_user@test.com")
+    # Logged in again as a member: the token carries the member role
+    response = await login_user("role_user@test.com", "role_user")
+    assert response.status_code == 200
+
+
+async def test_role_cache_promotion(ac: AsyncClient, users_tokens):
+    headers = auth(users_tokens, "role_user@test.com")
+    stats_url = f"/stats/company_daily_stats/{created['quiz_owner_company']}/"
+    response = await ac.get(stats_url, headers=headers)
+    assert response.status_code == 403
+    response = await ac.get(f"/notifications/{created['role_user']}/", headers=headers)
+    assert response.status_code == 403
+    await assert_roles_cached(created['role_user'])
+
+    response = await ac.post(
+        f"/company/{created['quiz_owner_company']}/admin/",
+        json={"user_id": created['role_user']},
+        headers=auth(users_tokens, "quiz_owner@test.com")
+    )
+    assert response.status_code == 200
+
+    response = await ac.get(stats_url, headers=headers)
+    assert response.status_code == 200
+    # Past the admin check, the user just has no notifications
+    response = await ac.get(f"/notifications/{created['role_user']}/", headers=headers)
+    assert response.status_code == 404
+
+
+async def test_role_cache_kick(ac: AsyncClient, users_tokens):
+    headers = auth(users_tokens, "role_user@test.com")
+    list_url = f"/quizzes/{created['quiz_owner_company']}"
+    response = await ac.get(list_url, headers=headers)
+    assert response.status_code == 200
+    await assert_roles_cached(created['role_user'])
+
+    response = await ac.delete(
+        f"/company/{created['quiz_owner_company']}/admin/{created['role_user']}",
+        headers=auth(users_tokens, "quiz_owner@test.com")
+    )
+    assert response.status_code == 200
+
+    response = await ac.get(list_url, headers=headers)
+    assert response.status_code == 403
+    response = await ac.get(f"/notifications/{created['role_user']}/", headers=headers)
+    assert response.status_code == 403
+
+
+async def test_role_cache_leave(ac: AsyncClient, users_tokens):
+    await join_owner_company(ac, users_tokens, "role_user@test.com")
+    headers = auth(users_tokens, "role_user@test.com")
+    try_url = f"/quizzes/quiz/{created['quiz']}/try"
+    response = await ac.get(try_url, headers=headers)
+    assert response.status_code == 200
+    await assert_roles_cached(created['role_user'])
+
+    response = await ac.delete(f"/company/{created['quiz_owner_company']}/leave", headers=headers)
+    assert response.status_code == 200
+
+    response = await ac.get(try_url, headers=headers)
+    assert response.status_code == 403
+
+
+# csv downloads
+
+async def download_my_csv(ac: AsyncClient, users_tokens, accept_encoding: Optional[str]) -> tuple[httpx.Response, bytes]:
+    request = ac.build_request(
+        "POST",
+        "/quizzes/quiz_rating/write_to_scv/me/",
+        headers=auth(users_tokens, "quiz_member@test.com")
+    )
+    # httpx asks for gzip by default
+    del request.headers['Accept-Encoding']
+    if accept_encoding is not None:
+        request.headers['Accept-Encoding'] = accept_encoding
+
+    response = await ac.send(request, stream=True)
+    try:
+        assert response.status_code == 200
+        body = b''.join([chunk async for chunk in response.aiter_raw()])
+    finally:
+        await response.aclose()
+    return response, body
+
+
+async def test_csv_download_plain(ac: AsyncClient, users_tokens):
+    for accept_encoding in (None, 'gzip;q=0', 'gzip; q=0.0, identity'):
+        response, body = await download_my_csv(ac, users_tokens, accept_encoding)
+        assert 'Content-Encoding' not in response.headers
+        assert response.headers['Vary'] == 'Accept-Encoding'
+        header, *rows = body.decode().splitlines()
+        assert header.split(',') == FIELDNAMES
+        assert rows
+
+
+async def test_csv_download_gzip(ac: AsyncClient, users_tokens):
+    _, plain = await download_my_csv(ac, users_tokens, None)
+
+    for accept_encoding in ('gzip', 'br, GZIP;q=0.5'):
+        response, body = await download_my_csv(ac, users_tokens, accept_encoding)
+        assert response.headers['Content-Encoding'] == 'gzip'
+        assert response.headers['Content-Type'].startswith('text/csv')
+        assert gzip.decompress(body) == plain
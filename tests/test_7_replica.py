@@ -0,0 +1,99 @@
+from typing import Optional, Union
+
+import pytest
+from fastapi import HTTPException
+
+from app.db.replica import REPLICA_LAG_QUERY, ReplicaRouter
+
+
+class FakeDatabase:
+    """Stands for a connected `Database`: reads return its name, or raise `error` if one is set."""
+
+    def __init__(self, name: str, lag: Union[float, Exception] = 0):
+        self.name = name
+        self.lag = lag
+        self.error: Optional[Exception] = None
+        self.is_connected = True
+        self.reads = 0
+
+    async def fetch_val(self, query, values=None):
+        if query is REPLICA_LAG_QUERY:
+            if isinstance(self.lag, Exception):
+                raise self.lag
+            return self.lag
+        return await self.fetch_all(query, values)
+
+    async def fetch_all(self, query, values=None):
+        self.reads += 1
+        if self.error:
+            raise self.error
+        return self.name
+
+
+async def get_router(lag: Union[float, Exception] = 0) -> tuple[ReplicaRouter, FakeDatabase, FakeDatabase]:
+    primary, replica = FakeDatabase('primary'), FakeDatabase('replica', lag=lag)
+    router = ReplicaRouter(primary=primary, replica=replica, max_lag=5, check_interval=1)
+    await router.check()
+    return router, primary, replica
+
+
+async def test_replica_reads():
+    router, primary, _ = await get_router()
+    assert router.healthy
+    assert await router.fetch_all('SELECT 1') == 'replica'
+    assert primary.reads == 0
+    assert router.replica_reads == 1
+
+
+async def test_replica_lag_over_max():
+    router, _, replica = await get_router(lag=12)
+    assert not router.healthy
+    assert router.lag == 12
+    assert 'lag 12.0s is over 5' in router.last_error
+
+    assert await router.fetch_all('SELECT 1') == 'primary'
+    assert replica.reads == 0
+    assert router.primary_reads == 1
+
+
+async def test_replica_error_retried_on_primary():
+    router, primary, replica = await get_router()
+    replica.error = ConnectionRefusedError('replica is gone')
+
+    assert await router.fetch_all('SELECT 1') == 'primary'
+    assert not router.healthy
+    assert router.failovers == 1
+    assert 'replica is gone' in router.last_error
+
+    # Marked down: the next read doesn't try the replica at all
+    assert await router.fetch_val('SELECT 1') == 'primary'
+    assert replica.reads == 1
+    assert primary.reads == 2
+
+
+async def test_replica_pool_exhausted():
+    router, primary, replica = await get_router()
+    replica.error = HTTPException(status_code=503, detail='Database is busy, try again later')
+
+    assert await router.fetch_all('SELECT 1') == 'primary'
+    # Busy is not down: the replica keeps taking reads
+    assert router.healthy
+    assert router.failovers == 0
+
+    replica.error = HTTPException(status_code=404, detail='Not found')
+    with pytest.raises(HTTPException):
+        await router.fetch_all('SELECT 1')
+    assert primary.reads == 1
+
+
+async def test_replica_check_brings_replica_back():
+    router, _, replica = await get_router(lag=ConnectionRefusedError('replica is gone'))
+    assert not router.healthy
+    assert router.lag is None
+
+    replica.lag = 1
+    await router.check()
+    assert router.healthy
+    assert router.lag == 1
+    assert router.last_error is None
+    assert await router.fetch_all('SELECT 1') == 'replica'